@@ -1,7 +1,15 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "earninja.settings")
 app = Celery("earninja")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_up_synthesizer(**kwargs):
+    # e.g. load the soundfont once per worker process, before the first task arrives
+    from exercises.synthesizers import get_synthesizer
+    get_synthesizer().warm_up()
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'exercises.middleware.AudioFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -189,13 +190,102 @@ NUM_DB_LOUDER = 20
 FLUIDSYNTH_GAIN = 0.2
 FLUIDSYNTH_SAMPLE_RATE = 44100
 
+# how audio files are encoded by ffmpeg: container format, codec, bitrate, number of channels and sample rate
+# (None keeps ffmpeg's default bitrate, or channels and sample rate of the synthesized audio)
+# and the content type, under which the browser asks for it
+AUDIO_ENCODING_PROFILES = {
+    # 44.1 kHz stereo at 128 kbit/s
+    "mp3": {
+        "format": "mp3", "codec": "libmp3lame", "bitrate": None, "channels": None, "sample_rate": None,
+        "extension": "mp3", "content_type": "audio/mpeg",
+    },
+    # a two-note piano clip doesn't need more
+    "mp3_small": {
+        "format": "mp3", "codec": "libmp3lame", "bitrate": "48k", "channels": 1, "sample_rate": 32000,
+        "extension": "mp3", "content_type": "audio/mpeg",
+    },
+    "opus": {
+        "format": "ogg", "codec": "libopus", "bitrate": "32k", "channels": 1, "sample_rate": 48000,
+        "extension": "opus", "content_type": "audio/ogg; codecs=opus",
+    },
+    "vorbis": {
+        "format": "ogg", "codec": "libvorbis", "bitrate": "48k", "channels": 1, "sample_rate": 44100,
+        "extension": "ogg", "content_type": "audio/ogg; codecs=vorbis",
+    },
+}
+# the profile of audio files sent to every browser, it must be an mp3 profile, which all browsers can play
+# (checked at startup, other profiles can be used as extra renditions)
+AUDIO_ENCODING_PROFILE = os.getenv('AUDIO_ENCODING_PROFILE', 'mp3')
+# profiles of additional, smaller renditions of audio files (comma separated, e.g. "opus"),
+# a rendition is sent instead of the mp3 to browsers which can play it
+AUDIO_EXTRA_RENDITIONS = [name for name in os.getenv('AUDIO_EXTRA_RENDITIONS', '').split(',') if name]
+
+# how audio of intervals is synthesized
+# "fluidsynth" - runs fluidsynth program separately for every interval
+# "libfluidsynth" - renders in process with libfluidsynth shared library,
+# the soundfont is loaded only once per (gunicorn or celery) worker
+# "note_cache" - renders each note only once (with AUDIO_NOTE_CACHE_RENDERER)
+# and builds intervals from cached notes with numpy, without running any subprocess
+AUDIO_SYNTHESIZER = os.getenv('AUDIO_SYNTHESIZER', 'fluidsynth')
+AUDIO_NOTE_CACHE_RENDERER = os.getenv('AUDIO_NOTE_CACHE_RENDERER', 'fluidsynth')
+# where notes rendered by "note_cache" synthesizer are stored
+AUDIO_NOTE_CACHE_DIR = BASE_DIR / 'note_cache'
+# path to libfluidsynth shared library (e.g. /home/yourusername/fluidsynth/lib/libfluidsynth.so.3)
+# if not set, the library is looked up in standard locations
+LIBFLUIDSYNTH_PATH = os.getenv('LIBFLUIDSYNTH_PATH')
+# how many intervals are rendered with a single synthesizer invocation
+# when audio of many interval instances is generated at once
+AUDIO_BATCH_SIZE = 50
+
+# the cache keeps e.g. audio renders in progress,
+# so it should be shared by all processes rendering audio (e.g. Redis when Celery is used)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 # Celery settings
 # Celery it not supported on PythonAnywhere
 # so in production, audio file generation runs synchronously
 USE_CELERY = False
 
+# backend running tasks (e.g. audio rendering):
+# "celery" - Celery workers, "local" - background threads of the web server process, no broker needed,
+# "sync" - during the request
+# if not set, "celery" is used if USE_CELERY is True, otherwise "sync"
+TASK_BACKEND = os.getenv('TASK_BACKEND')
+
+# background threads of the web server process
+# run tasks of "local" backend, and background tasks when the backend is "sync"
+LOCAL_EXECUTOR_MAX_WORKERS = 1
+# a failed task is retried after LOCAL_EXECUTOR_RETRY_DELAY seconds (longer with every retry)
+LOCAL_EXECUTOR_MAX_RETRIES = 2
+LOCAL_EXECUTOR_RETRY_DELAY = 1
+# a render of the same audio requested again within AUDIO_RENDER_IN_FLIGHT_TTL seconds
+# is not queued again, AUDIO_RENDER_LOCK_TTL seconds is the longest expected render time
+AUDIO_RENDER_IN_FLIGHT_TTL = 600
+AUDIO_RENDER_LOCK_TTL = 120
+# the browser waits for audio which is being rendered with a request, which is answered as soon as
+# the audio is saved, or after AUDIO_READY_TIMEOUT seconds, the request checks every AUDIO_READY_POLL_INTERVAL
+# seconds if the render has finished and occupies a web server thread while waiting
+AUDIO_READY_TIMEOUT = 20
+AUDIO_READY_POLL_INTERVAL = 0.1
+# only audio of the question is rendered when the user waits for it,
+# audio of other answers is rendered in the background
+AUDIO_RENDER_ANSWERS_IN_BACKGROUND = True
+
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
+# tasks are sent with priorities (e.g. audio of the question before pre-generated audio),
+# workers take one task at a time, so a task with high priority doesn't wait behind prefetched ones
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
 # default setttings for intervals exercise
 INTERVALS_EXERCISE_DEFAULT_LOWEST_OCTAVE = 2
@@ -203,3 +293,35 @@ INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE = 5
 INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS = ["1", "b3", "3", "4", "5"]
 # 0 - harmonic, 1 - melodic ascending, 2 - melodic descending
 INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE = 0
+
+# number of upcoming questions of intervals exercise prepared in advance, with audio of their answers,
+# 0 disables the queue, so every question is generated when it's requested
+INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH = 3
+# refills of the queue of the same exercise run one at a time,
+# INTERVALS_EXERCISE_QUESTION_QUEUE_REFILL_LOCK_TTL seconds is the longest expected refill time
+INTERVALS_EXERCISE_QUESTION_QUEUE_REFILL_LOCK_TTL = 120
+
+# when enabled, the question of intervals exercise is stored as values on the exercise row,
+# so generating a new question is a single UPDATE instead of saving interval instances and answers,
+# the question queue is not used in this mode
+INTERVALS_EXERCISE_STATELESS_QUESTIONS = os.environ.get('INTERVALS_EXERCISE_STATELESS_QUESTIONS', 'False') == 'True'
+
+# when enabled, audio of all intervals of one type from one start note is also rendered to a single file
+# (sprite pack), so the browser downloads audio of a question and all its answers at once
+AUDIO_SPRITE_PACKS = os.environ.get('AUDIO_SPRITE_PACKS', 'False') == 'True'
+
+# when enabled, audio is not rendered when a question is generated, but when the browser downloads it
+# for the first time, so audio of answers which are never played is never rendered
+AUDIO_RENDER_ON_DEMAND = os.environ.get('AUDIO_RENDER_ON_DEMAND', 'False') == 'True'
+# when enabled (together with AUDIO_RENDER_ON_DEMAND), audio rendered during the request is sent to the browser
+# in chunks of AUDIO_STREAM_CHUNK_SIZE bytes while it's being encoded, instead of after the whole file is saved
+AUDIO_STREAM_RENDERS = os.environ.get('AUDIO_STREAM_RENDERS', 'False') == 'True'
+AUDIO_STREAM_CHUNK_SIZE = 4096
+
+# audio files are named after their content, so browsers can cache them for a long time (in seconds)
+AUDIO_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+# audio files are served by the app (with caching headers, ETag and range requests), also when DEBUG is False,
+# it can be disabled if the web server serves the media directory itself
+AUDIO_SERVE_FILES = os.environ.get('AUDIO_SERVE_FILES', 'True') == 'True'
+# how many audio files are kept by the audio service worker in the browser, across page loads
+AUDIO_CLIENT_CACHE_MAX_FILES = 500
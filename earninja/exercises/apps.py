@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ExercisesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exercises'
+
+    def ready(self):
+        # system checks are registered on import
+        from exercises import checks  # noqa: F401
+        from exercises.interval_catalogue import IntervalCatalogue
+        # the database is not queried during app initialization,
+        # so intervals are loaded to memory by the first request which needs them
+        IntervalCatalogue.connect_signals()
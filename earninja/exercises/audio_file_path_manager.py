@@ -1,16 +1,118 @@
+import functools
+import hashlib
+import json
 from pathlib import Path
 
 from django.conf import settings
+from django.urls import get_script_prefix
 
 
 class AudioFilePathManager:
+    # audio files are named after what they contain (interval and settings used to render it),
+    # not after database ids, so:
+    # - the same files can be shared between databases and environments,
+    # - files rendered with different settings are stored in a different directory,
+    #   so they are recognized as stale,
+    # - the url of an interval can be computed without querying the database
     @classmethod
     def get_interval_instance_audio_path(cls, interval_instance, filename=None):
         # keep filename arg unused to avoid circularity
-        return Path('audio') / f"interval_instance_{interval_instance.id}.mp3"
-    
-    # base path for intermediate files (wav, midi, mp3) created by AudioSaver class
+        return cls.get_interval_audio_path(
+            interval_instance.start_note,
+            interval_instance.interval.num_semitones,
+            interval_instance.interval.interval_type,
+        )
+
+    @classmethod
+    def get_interval_audio_path(cls, start_note, num_semitones, interval_type):
+        return cls.get_audio_dir() / f"interval_{start_note}_{num_semitones}_{interval_type}.mp3"
+
+    @classmethod
+    def get_sprite_pack_audio_path(cls, start_note, interval_type):
+        # audio of all intervals of given type from given start note, in a single file
+        return cls.get_audio_dir() / f"sprites_{start_note}_{interval_type}.mp3"
+
+    @classmethod
+    def get_sprite_pack_index_path(cls, start_note, interval_type):
+        # offsets of intervals in the sprite pack audio file
+        return cls.get_audio_dir() / f"sprites_{start_note}_{interval_type}.json"
+
+    @classmethod
+    def get_rendition_path(cls, audio_path, profile_name):
+        # another rendition of the same audio, encoded with given profile,
+        # e.g. "interval_48_3_0.opus.opus" next to "interval_48_3_0.mp3"
+        extension = settings.AUDIO_ENCODING_PROFILES[profile_name]["extension"]
+        return audio_path.with_name(f"{audio_path.stem}.{profile_name}.{extension}")
+
+    @classmethod
+    def get_renditions(cls, audio_path):
+        # (content type, path) of every extra rendition of the audio, which may exist
+        return [
+            (settings.AUDIO_ENCODING_PROFILES[profile_name]["content_type"], cls.get_rendition_path(audio_path, profile_name))
+            for profile_name in settings.AUDIO_EXTRA_RENDITIONS
+        ]
+
+    @classmethod
+    def get_audio_dir(cls):
+        return Path('audio') / cls.get_render_config_hash()
+
     @classmethod
-    def get_intermediate_base_path(cls, audio_path):
-        audio_path = Path(audio_path)
-        return Path(settings.MEDIA_ROOT) / audio_path.parent / f'intermediate_{audio_path.stem}'
+    def get_audio_dir_url(cls):
+        return f"{settings.MEDIA_URL}{cls.get_audio_dir().as_posix()}/"
+
+    @classmethod
+    def get_render_through_audio_dir_url(cls):
+        # prefix of urls of "exercises:interval_audio" view, which renders audio on the first request
+        return f"{get_script_prefix()}audio/{cls.get_render_config_hash()}/"
+
+    @classmethod
+    def is_audio_up_to_date(cls, interval_instance):
+        return interval_instance.audio.name == str(cls.get_interval_instance_audio_path(interval_instance))
+
+    @classmethod
+    def get_render_config_hash(cls):
+        return _get_render_config_hash(
+            settings.AUDIO_SYNTHESIZER,
+            settings.SOUNDFONT_PATH,
+            settings.FLUIDSYNTH_GAIN,
+            settings.FLUIDSYNTH_SAMPLE_RATE,
+            settings.NUM_DB_LOUDER,
+            cls._get_encoding_config(),
+        )
+
+    @classmethod
+    def get_legacy_render_config_hash(cls):
+        # audio files named after database ids were rendered by fluidsynth program and saved as default mp3,
+        # other render settings weren't recorded, so they are assumed to be unchanged
+        return _get_render_config_hash(
+            "fluidsynth",
+            settings.SOUNDFONT_PATH,
+            settings.FLUIDSYNTH_GAIN,
+            settings.FLUIDSYNTH_SAMPLE_RATE,
+            settings.NUM_DB_LOUDER,
+            cls._get_encoding_config("mp3", []),
+        )
+
+    @classmethod
+    def _get_encoding_config(cls, main_profile_name=None, extra_profile_names=None):
+        # profiles used to encode audio files, as a hashable string
+        if main_profile_name is None:
+            main_profile_name = settings.AUDIO_ENCODING_PROFILE
+        if extra_profile_names is None:
+            extra_profile_names = settings.AUDIO_EXTRA_RENDITIONS
+        profile_names = [main_profile_name] + sorted(extra_profile_names)
+        return json.dumps(
+            [(profile_name, settings.AUDIO_ENCODING_PROFILES[profile_name]) for profile_name in profile_names],
+            sort_keys=True,
+        )
+
+
+@functools.lru_cache
+def _get_render_config_hash(synthesizer_name, soundfont_path, gain, sample_rate, num_db_louder, encoding_config):
+    # the soundfont is identified by its name and size, not by its location,
+    # which is different in every environment
+    soundfont_path = Path(soundfont_path or "")
+    soundfont_size = soundfont_path.stat().st_size if soundfont_path.is_file() else None
+    # synthesizers render the same notes differently, e.g. the note cache mixes separately rendered notes
+    config = f"{synthesizer_name}|{soundfont_path.name}|{soundfont_size}|{gain}|{sample_rate}|{num_db_louder}|{encoding_config}"
+    return hashlib.sha1(config.encode()).hexdigest()[:10]
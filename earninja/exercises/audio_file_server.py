@@ -0,0 +1,154 @@
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+ZERO_QUALITY_PATTERN = re.compile(r"q=0(\.0*)?")
+
+
+def get_media_type_params(media_type):
+    # e.g. ("audio/ogg", "codecs=opus") for "audio/ogg; codecs=opus", quality is returned too
+    return tuple(param.replace(" ", "").lower() for param in media_type.split(";") if param.strip())
+
+
+def get_accepted_media_types(accept_header):
+    # media types with their parameters (except quality), which are not refused with zero quality
+    accepted_media_types = set()
+    for media_type in accept_header.split(","):
+        params = get_media_type_params(media_type)
+        if params and not any(ZERO_QUALITY_PATTERN.fullmatch(param) for param in params):
+            accepted_media_types.add(tuple(param for param in params if not param.startswith("q=")))
+    return accepted_media_types
+
+
+class AudioFileServer:
+    # serves audio files (and indexes of sprite packs) in the same way as WhiteNoise serves static files:
+    # - files are named after their content and render settings, so browsers cache them forever,
+    # - conditional requests are answered with 304 by comparing ETag (or modification time),
+    # - a single byte range can be requested, e.g. when the browser seeks in the audio or resumes a download,
+    # - a precompressed variant of the file (with ".br" or ".gz" suffix) is served if the browser accepts it,
+    # - an extra rendition of the audio (e.g. Opus) is served if the browser asks for its content type
+    ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+    BLOCK_SIZE = 64 * 1024
+
+    @classmethod
+    def serve(cls, request, path):
+        # returns None if the file doesn't exist
+        path = Path(path)
+        if not path.is_file():
+            return None
+        renditions = [
+            (content_type, rendition_path)
+            for content_type, rendition_path in AudioFilePathManager.get_renditions(path)
+            if rendition_path.is_file()
+        ]
+        content_type, path = cls._choose_rendition(request, path, renditions)
+        variants = [(encoding, path.with_name(path.name + suffix)) for encoding, suffix in cls.ENCODINGS]
+        variants = [(encoding, variant_path) for encoding, variant_path in variants if variant_path.is_file()]
+        encoding, served_path = cls._choose_variant(request, path, variants)
+        stat = served_path.stat()
+        # the same as ETag of WhiteNoise, files are never changed once written, only replaced
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = cls._get_file_response(request, served_path, content_type, stat.st_size, etag)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if variants:
+            patch_vary_headers(response, ["Accept-Encoding"])
+        if renditions:
+            patch_vary_headers(response, ["Accept"])
+        patch_cache_control(response, public=True, max_age=settings.AUDIO_CACHE_MAX_AGE, immutable=True)
+        return response
+
+    @classmethod
+    def _choose_rendition(cls, request, path, renditions):
+        # browsers accept any content type (*/*) by default,
+        # so a rendition is served only to a browser which asks for it explicitly
+        accepted_media_types = get_accepted_media_types(request.headers.get("Accept", ""))
+        for content_type, rendition_path in renditions:
+            if get_media_type_params(content_type) in accepted_media_types:
+                return content_type, rendition_path
+        return mimetypes.guess_type(path.name)[0] or "application/octet-stream", path
+
+    @classmethod
+    def _choose_variant(cls, request, path, variants):
+        accepted_encodings = {
+            encoding.split(";")[0].strip()
+            for encoding in request.headers.get("Accept-Encoding", "").split(",")
+            if not encoding.replace(" ", "").endswith(";q=0")
+        }
+        for encoding, variant_path in variants:
+            if encoding in accepted_encodings:
+                return encoding, variant_path
+        return None, path
+
+    @classmethod
+    def _get_file_response(cls, request, served_path, content_type, size, etag):
+        byte_range = cls._get_byte_range(request, size, etag)
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if request.method == "HEAD":
+            response = HttpResponse(content_type=content_type)
+            response["Content-Length"] = size
+        elif byte_range is None:
+            # sent with sendfile if the server supports it
+            response = FileResponse(served_path.open("rb"), content_type=content_type)
+            # the file is played, not downloaded
+            del response["Content-Disposition"]
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                cls._read_range(served_path, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    @classmethod
+    def _get_byte_range(cls, request, size, etag):
+        # returns (start, end) of the requested range, both inclusive, None if the whole file should be sent
+        # (no range, several ranges or an invalid range), or "unsatisfiable"
+        if_range = request.headers.get("If-Range")
+        if if_range is not None and if_range != etag:
+            # the browser has a different version of the file
+            return None
+        match = RANGE_PATTERN.fullmatch(request.headers.get("Range", "").replace(" ", ""))
+        if match is None or match.groups() == ("", ""):
+            return None
+        start, end = match.groups()
+        if not start:
+            # the last bytes of the file
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        if start > end or start >= size:
+            return "unsatisfiable"
+        return start, end
+
+    @classmethod
+    def _read_range(cls, path, start, length):
+        with path.open("rb") as f:
+            f.seek(start)
+            while length > 0:
+                block = f.read(min(cls.BLOCK_SIZE, length))
+                if not block:
+                    return
+                length -= len(block)
+                yield block
@@ -0,0 +1,105 @@
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRenderRegistry:
+    # makes sure that audio of an interval instance is rendered once,
+    # even if many requests or workers ask for it at the same time
+    # - an interval instance is marked as in flight when its render is requested,
+    #   further requests are collapsed until the render finishes or fails,
+    #   the mark expires on its own only if the render is lost (e.g. its worker is killed),
+    #   marks are kept per render settings, so a render with new settings is never collapsed into an old one
+    # - the render itself runs under a lock, so concurrent renders of the same audio are collapsed too
+    # - requests waiting for an audio file are woken up by the render, when the file is saved
+    # state is kept in the default cache, which should be shared by all processes
+    STATS_NAMES = ["num_requested", "num_collapsed_requests", "num_renders", "num_collapsed_renders"]
+
+    @classmethod
+    def request_render(cls, interval_instance_id):
+        # returns False if the render has been already requested
+        cls._increment("num_requested")
+        if cache.add(cls._get_in_flight_key(interval_instance_id), True, timeout=settings.AUDIO_RENDER_IN_FLIGHT_TTL):
+            return True
+        cls._increment("num_collapsed_requests")
+        logger.debug("Render of audio of interval instance %s has been already requested", interval_instance_id)
+        return False
+
+    @classmethod
+    def cancel_render_request(cls, interval_instance_id):
+        cache.delete(cls._get_in_flight_key(interval_instance_id))
+
+    @classmethod
+    @contextmanager
+    def render_lock(cls, interval_instance_id):
+        # yields False if the audio is being rendered by someone else
+        acquired = cls.acquire_render_lock(interval_instance_id)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cls.release_render_lock(interval_instance_id)
+
+    @classmethod
+    def acquire_render_lock(cls, interval_instance_id):
+        # for renders which outlive the block of render_lock, e.g. streamed to the browser
+        acquired = cache.add(cls._get_lock_key(interval_instance_id), True, timeout=settings.AUDIO_RENDER_LOCK_TTL)
+        cls._increment("num_renders" if acquired else "num_collapsed_renders")
+        return acquired
+
+    @classmethod
+    def release_render_lock(cls, interval_instance_id):
+        cache.delete(cls._get_lock_key(interval_instance_id))
+
+    @classmethod
+    def notify_ready(cls, relative_audio_path):
+        cache.set(cls._get_ready_key(relative_audio_path), True, timeout=settings.AUDIO_RENDER_IN_FLIGHT_TTL)
+
+    @classmethod
+    def wait_until_ready(cls, relative_audio_path, storage, timeout):
+        # returns True as soon as the audio file exists, False if it still doesn't exist after timeout seconds
+        # the storage is checked in every poll, the signal in the cache is only a shortcut,
+        # which is not seen by other processes if the cache is local to the process (e.g. LocMemCache)
+        ready_key = cls._get_ready_key(relative_audio_path)
+        deadline = time.monotonic() + timeout
+        while True:
+            if cache.get(ready_key) or storage.exists(relative_audio_path):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(settings.AUDIO_READY_POLL_INTERVAL)
+
+    @classmethod
+    def get_stats(cls):
+        return {name: cache.get(f"audio_render_stats_{name}", 0) for name in cls.STATS_NAMES}
+
+    @classmethod
+    def _increment(cls, name):
+        key = f"audio_render_stats_{name}"
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the counter has been evicted in the meantime
+            cache.set(key, 1, timeout=None)
+
+    @staticmethod
+    def _get_in_flight_key(interval_instance_id):
+        return f"audio_render_in_flight_{AudioFilePathManager.get_render_config_hash()}_{interval_instance_id}"
+
+    @staticmethod
+    def _get_lock_key(interval_instance_id):
+        return f"audio_render_lock_{interval_instance_id}"
+
+    @staticmethod
+    def _get_ready_key(relative_audio_path):
+        return f"audio_ready_{Path(relative_audio_path).as_posix()}"
@@ -1,77 +1,152 @@
+import os
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
 
+import numpy as np
 from django.conf import settings
 
-from mingus.containers import NoteContainer, Note, Bar
-from mingus.midi.midi_file_out import write_NoteContainer, write_Bar
 from pydub import AudioSegment
 
-from exercises.music_theory_utils import get_interval_container
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.synthesizers import get_synthesizer
 
 
 class AudioSaver:
-    def __init__(self, audio_path):
+    # audio passes through memory and pipes only,
+    # the mp3 file is written once, atomically, directly to audio_path
+    # extra renditions (e.g. Opus) are written next to it, before it, so they exist once it exists,
+    # except for streamed audio, whose renditions are saved afterwards (see save_interval_instance_renditions)
+    def __init__(self, audio_path, synthesizer=None):
         self.audio_path = Path(audio_path)
         self._load_settings()
-    
+        self.synthesizer = synthesizer or get_synthesizer(self.synthesizer_name)
+
     def save_interval_instance_audio(self, start_note, interval_name, interval_type):
+        samples = self.synthesizer.render_interval(start_note, interval_name, interval_type)
+        self.save_samples(samples)
+
+    def save_samples(self, samples):
+        self._ensure_audio_dir_exists()
+        self._save_extra_renditions(samples)
+        self._save_atomically(self.encode_audio(samples))
+
+    def save_interval_instance_renditions(self, start_note, interval_name, interval_type):
+        # extra renditions only, the mp3 file is left as it is
+        samples = self.synthesizer.render_interval(start_note, interval_name, interval_type)
+        self._ensure_audio_dir_exists()
+        self._save_extra_renditions(samples)
+
+    def save_data(self, data):
+        self._ensure_audio_dir_exists()
+        self._save_atomically(data)
+
+    def stream_interval_instance_audio(self, start_note, interval_name, interval_type):
+        samples = self.synthesizer.render_interval(start_note, interval_name, interval_type)
+        return self.stream_samples(samples)
+
+    def stream_samples(self, samples):
+        # yields the mp3 chunk by chunk, as soon as the encoder outputs it,
+        # and saves it to audio_path (atomically) when the encoder finishes
+        # if the generator is closed early (e.g. the client has disconnected), nothing is saved
+        # extra renditions are not saved, so that the stream ends as soon as the mp3 is encoded
         self._ensure_audio_dir_exists()
-        if interval_type == 0:
-            interval_mingus_object = self._get_harmonic_interval(start_note, interval_name)
-        elif interval_type == 1:
-            interval_mingus_object = self._get_melodic_interval(start_note, interval_name, ascending=True)
-        elif interval_type == 2:
-            interval_mingus_object = self._get_melodic_interval(start_note, interval_name, ascending=False)
-        self._save_midi(interval_mingus_object)
-        self._midi_to_wav()
-        self._wav_to_mp3()
-    
-    def delete_files(self):
-        for suffix in [".mid", ".wav", ".mp3"]:
-            self.audio_path.with_suffix(suffix).unlink(missing_ok=True)
+        command = self._get_encoder_command(samples.shape[1])
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # samples are written in a separate thread, so the encoder never waits for its output to be read
+        writer = threading.Thread(target=self._write_encoder_input, args=(process.stdin, self._make_louder(samples).tobytes()))
+        writer.start()
+        with tempfile.NamedTemporaryFile(dir=self.audio_path.parent, prefix=".", suffix=".part", delete=False) as f:
+            temporary_path = Path(f.name)
+            try:
+                while True:
+                    chunk = process.stdout.read1(self.stream_chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    yield chunk
+                writer.join()
+                if process.wait():
+                    raise subprocess.CalledProcessError(process.returncode, command)
+            except BaseException:
+                process.kill()
+                process.wait()
+                writer.join()
+                temporary_path.unlink()
+                raise
+            finally:
+                process.stdout.close()
+        os.chmod(temporary_path, self.file_permissions)
+        temporary_path.replace(self.audio_path)
+
+    def encode_audio(self, samples, profile_name=None):
+        result = subprocess.run(
+            self._get_encoder_command(samples.shape[1], profile_name),
+            input=self._make_louder(samples).tobytes(),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        return result.stdout
+
+    def _get_encoder_command(self, num_channels, profile_name=None):
+        profile = self.encoding_profiles[profile_name or self.encoding_profile]
+        command = [
+            AudioSegment.converter, '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(self.sample_rate), '-ac', str(num_channels), '-i', 'pipe:0',
+            '-c:a', profile["codec"],
+        ]
+        if profile["bitrate"]:
+            command += ['-b:a', profile["bitrate"]]
+        if profile["channels"]:
+            command += ['-ac', str(profile["channels"])]
+        if profile["sample_rate"]:
+            command += ['-ar', str(profile["sample_rate"])]
+        return command + ['-f', profile["format"], 'pipe:1']
+
+    def _save_extra_renditions(self, samples):
+        for profile_name in self.extra_renditions:
+            rendition_path = AudioFilePathManager.get_rendition_path(self.audio_path, profile_name)
+            self._save_atomically(self.encode_audio(samples, profile_name), rendition_path)
+
+    def _write_encoder_input(self, stdin, data):
+        try:
+            stdin.write(data)
+        except BrokenPipeError:
+            # the encoder has been killed
+            pass
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
 
     def _load_settings(self):
         self.num_db_louder = settings.NUM_DB_LOUDER
-        self.gain = settings.FLUIDSYNTH_GAIN
         self.sample_rate = settings.FLUIDSYNTH_SAMPLE_RATE
-        self.soundfont_path = settings.SOUNDFONT_PATH
-        self.fluidsynth_path = settings.FLUIDSYNTH_PATH
-    
+        self.synthesizer_name = settings.AUDIO_SYNTHESIZER
+        self.file_permissions = settings.FILE_UPLOAD_PERMISSIONS or 0o644
+        self.stream_chunk_size = settings.AUDIO_STREAM_CHUNK_SIZE
+        self.encoding_profiles = settings.AUDIO_ENCODING_PROFILES
+        self.encoding_profile = settings.AUDIO_ENCODING_PROFILE
+        self.extra_renditions = settings.AUDIO_EXTRA_RENDITIONS
+
     def _ensure_audio_dir_exists(self):
         self.audio_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    def _get_harmonic_interval(self, start_note, interval_name):
-        return get_interval_container(start_note, interval_name)
-    
-    def _get_melodic_interval(self, start_note, interval_name, ascending):
-        container = get_interval_container(start_note, interval_name)
-        if len(container.notes) == 1:
-            note_1, note_2 = container.notes[0], container.notes[0]
-        elif ascending:
-            note_1, note_2 = container.notes
-        else:
-            note_2, note_1 = container.notes
-        bar = Bar()
-        bar.place_notes(note_1, 4)
-        bar.place_notes(note_2, 4)
-        return bar
-    
-    def _save_midi(self, interval_mingus_object):
-        path = self.audio_path.with_suffix(".mid")
-        if isinstance(interval_mingus_object, NoteContainer):
-            write_NoteContainer(path, interval_mingus_object)
-        elif isinstance(interval_mingus_object, Bar):
-            write_Bar(path, interval_mingus_object)
-    
-    def _midi_to_wav(self):
-        midi_file = self.audio_path.with_suffix(".mid")
-        wav_file = self.audio_path.with_suffix(".wav")
-        subprocess.call(
-            [self.fluidsynth_path, '-niq', '-g', str(self.gain), self.soundfont_path, midi_file, '-F', wav_file, '-r', str(self.sample_rate)], 
-        )
-    
-    def _wav_to_mp3(self):
-        sound = AudioSegment.from_file(self.audio_path.with_suffix(".wav"), format="wav")
-        sound += self.num_db_louder
-        sound.export(self.audio_path.with_suffix(".mp3"), format='mp3')
+
+    def _make_louder(self, samples):
+        louder_samples = samples.astype(np.float64) * 10 ** (self.num_db_louder / 20)
+        return np.clip(louder_samples, -2**15, 2**15 - 1).astype(np.int16)
+
+    def _save_atomically(self, data, path=None):
+        # readers never see a partially written file, even if the file is being replaced
+        path = path or self.audio_path
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=".", suffix=".part", delete=False) as f:
+            temporary_path = Path(f.name)
+            try:
+                f.write(data)
+            except BaseException:
+                temporary_path.unlink()
+                raise
+        os.chmod(temporary_path, self.file_permissions)
+        temporary_path.replace(path)
@@ -0,0 +1,49 @@
+import json
+
+import numpy as np
+
+from exercises.audio_saver import AudioSaver
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.music_theory_utils import INTERVAL_NAMES, get_num_semitones
+from exercises.synthesizers import get_synthesizer
+
+
+# seconds of silence between intervals in a sprite pack,
+# so that a slice played a bit too long doesn't include the next interval
+SPRITE_PACK_GAP = 0.5
+
+
+class AudioSpritePackRenderer:
+    # renders all intervals of one type from one start note with a single synthesizer invocation
+    # and saves them back-to-back as a single mp3 file, so the client downloads audio of a question
+    # and all its possible answers at once
+    # the index file maps numbers of semitones of intervals to [offset, duration] in seconds
+    def __init__(self, storage, synthesizer=None):
+        self.storage = storage
+        self.synthesizer = synthesizer or get_synthesizer()
+
+    def save_sprite_pack(self, start_note, interval_type):
+        relative_index_path = AudioFilePathManager.get_sprite_pack_index_path(start_note, interval_type)
+        if self.storage.exists(relative_index_path):
+            return
+        samples = self.synthesizer.render_intervals(
+            [(start_note, interval_name, interval_type) for interval_name in INTERVAL_NAMES]
+        )
+        relative_audio_path = AudioFilePathManager.get_sprite_pack_audio_path(start_note, interval_type)
+        audio_saver = AudioSaver(self.storage.path(relative_audio_path), self.synthesizer)
+        sprite_samples, index = self._join_samples(samples, audio_saver.sample_rate)
+        audio_saver.save_samples(sprite_samples)
+        # the index is saved last, so the sprite pack is used only when its audio is complete
+        index_saver = AudioSaver(self.storage.path(relative_index_path), self.synthesizer)
+        index_saver.save_data(json.dumps(index).encode())
+
+    def _join_samples(self, samples, sample_rate):
+        gap = np.zeros((int(SPRITE_PACK_GAP * sample_rate), samples[0].shape[1]), dtype=samples[0].dtype)
+        parts = []
+        index = {}
+        offset = 0
+        for interval_name, interval_samples in zip(INTERVAL_NAMES, samples):
+            index[get_num_semitones(interval_name)] = [offset / sample_rate, len(interval_samples) / sample_rate]
+            parts.extend([interval_samples, gap])
+            offset += len(interval_samples) + len(gap)
+        return np.concatenate(parts), index
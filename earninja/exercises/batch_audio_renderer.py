@@ -0,0 +1,46 @@
+from django.conf import settings
+
+from exercises.audio_saver import AudioSaver
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.synthesizers import get_synthesizer
+
+
+class BatchAudioRenderer:
+    # renders audio of many interval instances with a single synthesizer invocation per batch,
+    # then slices the result into separate audio files
+    def __init__(self, synthesizer=None, batch_size=None):
+        self.synthesizer = synthesizer or get_synthesizer()
+        self.batch_size = batch_size or settings.AUDIO_BATCH_SIZE
+
+    def save_interval_instances_audio(self, interval_instances):
+        # audio files which already exist (e.g. rendered for another database) are reused
+        # returns the number of interval instances whose audio has been rendered
+        interval_instances_to_render = []
+        for interval_instance in interval_instances:
+            relative_audio_path = AudioFilePathManager.get_interval_instance_audio_path(interval_instance)
+            if interval_instance.audio.storage.exists(relative_audio_path):
+                self._set_audio(interval_instance, relative_audio_path)
+            else:
+                interval_instances_to_render.append(interval_instance)
+        for i in range(0, len(interval_instances_to_render), self.batch_size):
+            self._save_batch(interval_instances_to_render[i:i + self.batch_size])
+        return len(interval_instances_to_render)
+
+    def _save_batch(self, interval_instances):
+        samples = self.synthesizer.render_intervals([
+            (interval_instance.start_note, interval_instance.interval.name, interval_instance.interval.interval_type)
+            for interval_instance in interval_instances
+        ])
+        for interval_instance, interval_instance_samples in zip(interval_instances, samples):
+            relative_audio_path = AudioFilePathManager.get_interval_instance_audio_path(interval_instance)
+            audio_saver = AudioSaver(interval_instance.audio.storage.path(relative_audio_path), self.synthesizer)
+            audio_saver.save_samples(interval_instance_samples)
+            self._set_audio(interval_instance, relative_audio_path)
+
+    def _set_audio(self, interval_instance, relative_audio_path):
+        # thanks to django-cleanup app,
+        # a different file previously associated with the audio field is deleted here
+        interval_instance.audio.name = str(relative_audio_path)
+        interval_instance.save(update_fields=["audio"])
+        AudioRenderRegistry.notify_ready(relative_audio_path)
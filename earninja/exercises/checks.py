@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_audio_encoding_profiles(app_configs, **kwargs):
+    # audio files are named *.mp3 and served as audio/mpeg, which every browser can play,
+    # other formats are only served as extra renditions
+    errors = []
+    profile = settings.AUDIO_ENCODING_PROFILES.get(settings.AUDIO_ENCODING_PROFILE)
+    if profile is None:
+        errors.append(Error(
+            f"Unknown audio encoding profile: {settings.AUDIO_ENCODING_PROFILE}",
+            hint=f"Available profiles: {', '.join(settings.AUDIO_ENCODING_PROFILES)}",
+            id="exercises.E001",
+        ))
+    elif profile["content_type"] != "audio/mpeg":
+        errors.append(Error(
+            f"Audio encoding profile {settings.AUDIO_ENCODING_PROFILE} is not an mp3 profile",
+            hint="Add it to AUDIO_EXTRA_RENDITIONS instead.",
+            id="exercises.E002",
+        ))
+    for profile_name in settings.AUDIO_EXTRA_RENDITIONS:
+        if profile_name not in settings.AUDIO_ENCODING_PROFILES:
+            errors.append(Error(
+                f"Unknown audio encoding profile in AUDIO_EXTRA_RENDITIONS: {profile_name}",
+                hint=f"Available profiles: {', '.join(settings.AUDIO_ENCODING_PROFILES)}",
+                id="exercises.E001",
+            ))
+    return errors
@@ -0,0 +1,9 @@
+class SignedIntConverter:
+    # start notes of the lowest octave (-1) are negative
+    regex = "-?[0-9]+"
+
+    def to_python(self, value):
+        return int(value)
+
+    def to_url(self, value):
+        return str(value)
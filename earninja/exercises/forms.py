@@ -3,6 +3,7 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
 from exercises.models import IntervalsExerciseSettings
+from exercises.interval_catalogue import IntervalCatalogue
 from exercises.music_theory_utils import (
     get_interval_choices,
     get_interval_type_choices,
@@ -24,8 +25,12 @@ class IntervalsExerciseSettingsForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['allowed_intervals'].initial = self._get_allowed_intervals()
-        self.fields['interval_type'].initial = self._get_interval_type()
+        # intervals come from the catalogue in memory, only their ids are queried
+        allowed_intervals = IntervalCatalogue.get_intervals(
+            self.instance.allowed_intervals.order_by("id").values_list("id", flat=True)
+        )
+        self.fields['allowed_intervals'].initial = self._get_allowed_intervals(allowed_intervals)
+        self.fields['interval_type'].initial = self._get_interval_type(allowed_intervals)
     
     def clean(self):
         cleaned_data = super().clean()
@@ -38,11 +43,11 @@ class IntervalsExerciseSettingsForm(forms.ModelForm):
                 code="lowest_octave_larger_than_highest_octave"
             )
     
-    def _get_interval_type(self):
+    def _get_interval_type(self, allowed_intervals):
         # currently only one interval type at a time is supported
-        return self.instance.allowed_intervals.first().interval_type
+        return allowed_intervals[0].interval_type
 
-    def _get_allowed_intervals(self):
+    def _get_allowed_intervals(self, allowed_intervals):
         # this assumes that names of intervals in the database
         # match names of intervals from music_theory_utils.get_interval_choices()
-        return [interval.name for interval in self.instance.allowed_intervals.all()]
+        return [interval.name for interval in allowed_intervals]
@@ -0,0 +1,122 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from exercises.models import Interval, IntervalInstance
+from exercises.music_theory_utils import get_num_semitones
+
+
+class IntervalCatalogue:
+    # creates missing rows with a single bulk insert per table
+    # and reads all requested rows back with a single query
+    # there are only a few dozens of intervals, so all of them are also kept in memory of the process,
+    # loaded with a single query when they are first needed and loaded again after any of them changes
+    # intervals are never changed by the app once created, so intervals missing in memory
+    # (e.g. created by another process) are the only reason to load them again
+    _registry = None
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def connect_signals(cls):
+        post_save.connect(cls._on_interval_changed, sender=Interval, dispatch_uid="interval_catalogue_post_save")
+        post_delete.connect(cls._on_interval_changed, sender=Interval, dispatch_uid="interval_catalogue_post_delete")
+
+    @classmethod
+    def clear(cls):
+        cls._registry = None
+
+    @classmethod
+    def get_interval(cls, interval_id):
+        return cls.get_intervals([interval_id])[0]
+
+    @classmethod
+    def get_intervals(cls, interval_ids):
+        # returns intervals in the order of given ids
+        interval_ids = [int(interval_id) for interval_id in interval_ids]
+        intervals_by_id, _ = cls._get_registry()
+        if any(interval_id not in intervals_by_id for interval_id in interval_ids):
+            intervals_by_id, _ = cls._get_registry(reload=True)
+        try:
+            return [intervals_by_id[interval_id] for interval_id in interval_ids]
+        except KeyError as error:
+            raise Interval.DoesNotExist(f"Interval {error.args[0]} does not exist")
+
+    @classmethod
+    def get_or_create_intervals(cls, interval_names, interval_types):
+        # intervals are defined by number of semitones and type,
+        # so for names with the same number of semitones (e.g. "#4" and "b5")
+        # the name of an already existing interval is kept
+        # interval types may come from form data as strings
+        interval_types = [int(interval_type) for interval_type in interval_types]
+        names = {
+            (get_num_semitones(interval_name), interval_type): interval_name
+            for interval_type in interval_types
+            for interval_name in interval_names
+        }
+        _, intervals_by_key = cls._get_registry()
+        if all(key in intervals_by_key for key in names):
+            return [intervals_by_key[key] for key in names]
+        with transaction.atomic():
+            Interval.objects.bulk_create(
+                [
+                    Interval(num_semitones=num_semitones, interval_type=interval_type, name=name)
+                    for (num_semitones, interval_type), name in names.items()
+                ],
+                ignore_conflicts=True,
+            )
+            intervals = Interval.objects.filter(
+                num_semitones__in={num_semitones for num_semitones, _ in names},
+                interval_type__in=set(interval_types),
+            )
+        intervals = {(interval.num_semitones, interval.interval_type): interval for interval in intervals}
+        # created intervals are loaded to memory when they are needed next time
+        cls.clear()
+        return [intervals[key] for key in names]
+
+    @classmethod
+    def get_or_create_interval_instances(cls, intervals, start_notes):
+        start_notes = list(start_notes)
+        with transaction.atomic():
+            IntervalInstance.objects.bulk_create(
+                [
+                    IntervalInstance(start_note=start_note, interval=interval)
+                    for interval in intervals
+                    for start_note in start_notes
+                ],
+                ignore_conflicts=True,
+            )
+            interval_instances = IntervalInstance.objects.filter(
+                interval__in=intervals,
+                start_note__gte=min(start_notes),
+                start_note__lte=max(start_notes),
+            )
+        interval_instances = {
+            (interval_instance.interval_id, interval_instance.start_note): interval_instance
+            for interval_instance in interval_instances
+        }
+        result = []
+        for interval in intervals:
+            for start_note in start_notes:
+                interval_instance = interval_instances[(interval.id, start_note)]
+                # avoid querying for intervals which are already known
+                interval_instance.interval = interval
+                result.append(interval_instance)
+        return result
+
+    @classmethod
+    def _get_registry(cls, reload=False):
+        registry = cls._registry
+        if registry is None or reload:
+            with cls._registry_lock:
+                intervals = list(Interval.objects.all())
+                registry = (
+                    {interval.id: interval for interval in intervals},
+                    {(interval.num_semitones, interval.interval_type): interval for interval in intervals},
+                )
+                cls._registry = registry
+        return registry
+
+    @classmethod
+    def _on_interval_changed(cls, **kwargs):
+        cls.clear()
@@ -1,40 +1,56 @@
 import random
 
 from django.conf import settings
+from django.db.models import F
 
 from exercises.models import (
     IntervalsExerciseSettings,
     ExerciseScore,
-    Interval,
     IntervalInstance,
     IntervalAnswer,
 )
-from exercises.music_theory_utils import (
-    NUM_NOTES_IN_OCTAVE,
-    get_num_semitones,
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.interval_catalogue import IntervalCatalogue
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.intervals_question_queue import IntervalsQuestionQueue
+from exercises.task_backends import run_task, run_task_in_background
+from exercises.tasks import (
+    update_interval_instance_audio,
+    update_interval_audio,
+    update_sprite_pack_audio,
+    refill_intervals_question_queue,
 )
-from exercises.tasks import update_interval_instance_audio
 
 
 class IntervalsExerciseUpdater:
+    # with INTERVALS_EXERCISE_STATELESS_QUESTIONS setting, the question is kept
+    # as start note, question interval and answer intervals on the exercise row,
+    # so a new question is a single UPDATE, without saving interval instances and answers
+    # interval instances are then created only when their audio is rendered,
+    # and question and answers are returned as interval instances not saved in the database
     def __init__(self, exercise):
         self.exercise = exercise
+        self.question_queue = IntervalsQuestionQueue(exercise)
+        self.stateless = settings.INTERVALS_EXERCISE_STATELESS_QUESTIONS
+        self._allowed_intervals = None
 
     def generate_new_question(self):
-        start_note = self._get_random_start_note()
-        question_interval =  self._get_random_question_interval()
-        self.exercise.question = IntervalInstance.objects.get_or_create(
-            start_note=start_note,
-            interval=question_interval
-        )[0]
+        if self.stateless:
+            self._generate_new_stateless_question()
+            return
+        # a question prepared in advance is used if there is one,
+        # otherwise a random question is generated now
+        queued_question = self.question_queue.pop()
+        if queued_question is not None:
+            start_note = queued_question.start_note
+            question_interval = queued_question.interval
+        else:
+            start_note = self._get_random_start_note()
+            question_interval = self._get_random_question_interval()
+        answers = IntervalCatalogue.get_or_create_interval_instances(self._get_allowed_intervals(), [start_note])
+        self.exercise.question = next(answer for answer in answers if answer.interval == question_interval)
+        self.exercise.question_number += 1
         self.exercise.save()
-        answers = [
-            IntervalInstance.objects.get_or_create(
-                start_note=start_note,
-                interval=interval
-            )[0]
-            for interval in self.exercise.settings.allowed_intervals.all()
-        ]
         self.exercise.answers.set(answers, clear=True)
         self._set_correct_answer()
 
@@ -51,25 +67,125 @@ class IntervalsExerciseUpdater:
         )
         self.exercise.settings = default_settings
         self.exercise.save()
+        self.question_queue.clear()
     
     def save_audio_files(self):
         # question interval should be among answers
         # so it's not necessary to update audio file for it separately
-        for answer in self.exercise.answers.all():
-            if not answer.audio:
-                if settings.USE_CELERY:
-                    update_interval_instance_audio.delay(answer.id)
-                else:
-                    update_interval_instance_audio(answer.id)
+        if settings.AUDIO_RENDER_ON_DEMAND:
+            # audio is rendered when the browser downloads it
+            return
+        question = self.get_question()
+        question_interval_id = question.interval_id if question else None
+        if question and settings.AUDIO_SPRITE_PACKS:
+            if self.get_sprite_pack():
+                # audio of the question and all answers is already in the sprite pack
+                return
+            self._request_sprite_pack_render(question)
+        answers_without_audio = [answer for answer in self.get_answers() if not answer.has_up_to_date_audio()]
+        # audio of the question is needed first
+        answers_without_audio.sort(key=lambda answer: answer.interval_id != question_interval_id)
+        for answer in answers_without_audio:
+            if self.stateless:
+                render_key = f"interval_{answer.start_note}_{answer.interval_id}"
+                task, args = update_interval_audio, (answer.start_note, answer.interval_id)
+            else:
+                render_key = answer.id
+                task, args = update_interval_instance_audio, (answer.id,)
+            if not AudioRenderRegistry.request_render(render_key):
+                # the audio is already being rendered for another request
+                continue
+            # the user is waiting for audio of the question right now,
+            # but listens to other answers only after answering the question
+            is_question = answer.interval_id == question_interval_id
+            priority = "high" if is_question else "normal"
+            if settings.AUDIO_RENDER_ANSWERS_IN_BACKGROUND and not is_question:
+                run_task_in_background(task, *args, priority=priority)
+            else:
+                run_task(task, *args, priority=priority)
+
+    def get_question(self):
+        if not self.stateless:
+            return self.exercise.question
+        if self.exercise.question_interval_id is None:
+            return None
+        return self._get_stateless_interval_instance(IntervalCatalogue.get_interval(self.exercise.question_interval_id))
+
+    def get_sprite_pack(self):
+        # urls of the sprite pack with audio of the question and all its answers,
+        # None if sprite packs are disabled or the sprite pack is not rendered yet
+        question = self.get_question()
+        if question is None or not settings.AUDIO_SPRITE_PACKS:
+            return None
+        storage = question.audio.field.storage
+        interval_type = question.interval.interval_type
+        index_path = AudioFilePathManager.get_sprite_pack_index_path(question.start_note, interval_type)
+        if not storage.exists(index_path):
+            return None
+        return {
+            "audio_url": storage.url(AudioFilePathManager.get_sprite_pack_audio_path(question.start_note, interval_type)),
+            "index_url": storage.url(index_path),
+        }
+
+    def get_answers(self):
+        # ordered by number of semitones, every answer has answer_id attribute,
+        # which identifies it in get_user_answer
+        if not self.stateless:
+            return self.exercise.answers.select_related("interval").order_by("interval__num_semitones").annotate(
+                answer_id=F("id"),
+            )
+        answer_intervals = IntervalCatalogue.get_intervals(self.exercise.question_answer_interval_ids)
+        answers = []
+        for interval in sorted(answer_intervals, key=lambda interval: interval.num_semitones):
+            answer = self._get_stateless_interval_instance(interval)
+            answer.answer_id = interval.id
+            answers.append(answer)
+        return answers
+
+    def get_user_answer(self, answer_id):
+        if not self.stateless:
+            return IntervalAnswer.objects.select_related("interval_instance__interval").get(
+                exercise=self.exercise,
+                interval_instance_id=answer_id,
+            )
+        if int(answer_id) not in self.exercise.question_answer_interval_ids:
+            raise IntervalAnswer.DoesNotExist(f"Interval {answer_id} is not an answer to the current question")
+        return IntervalAnswer(
+            exercise=self.exercise,
+            interval_instance=self._get_stateless_interval_instance(IntervalCatalogue.get_interval(answer_id)),
+            is_correct=int(answer_id) == self.exercise.question_interval_id,
+        )
+
+    def refill_question_queue(self):
+        # questions are prepared in the background, off the request path
+        # without questions saved as interval instances, the queue is not used
+        if not self.question_queue.depth or self.stateless:
+            return
+        run_task_in_background(refill_intervals_question_queue, self.exercise.id, priority="low")
     
-    def update_score(self, user_answer):
-        score = ExerciseScore.objects.get_or_create(intervalsexercise=self.exercise)[0]
-        correct_answer = self.exercise.answers.get(intervalanswer__is_correct=True)
-        score.num_all_answers += 1
-        if correct_answer == user_answer:
-            score.num_correct_answers += 1
-        score.save()
-        self.exercise.save()
+    def update_score(self, user_answer, question_number=None):
+        # counters are incremented by the database in a single UPDATE, only if the answer is given
+        # to the current question (question_number, if passed, is the question displayed to the user)
+        # and the question hasn't been answered yet, so double submits and stale tabs are counted once
+        # returns False if the answer hasn't been counted
+        if question_number is None:
+            question_number = self.exercise.question_number
+        if self.stateless:
+            is_correct = user_answer.interval_id == self.exercise.question_interval_id
+        else:
+            is_correct = user_answer.id == self.exercise.question_id
+        if self.exercise.score_id is None:
+            self.reset_score()
+        num_updated = ExerciseScore.objects.filter(
+            id=self.exercise.score_id,
+            intervalsexercise__question_number=question_number,
+            last_answered_question_number__lt=question_number,
+        ).update(
+            num_all_answers=F("num_all_answers") + 1,
+            num_correct_answers=F("num_correct_answers") + int(is_correct),
+            last_answered_question_number=question_number,
+        )
+        return num_updated > 0
     
     def reset_score(self):
         score = ExerciseScore.objects.get_or_create(intervalsexercise=self.exercise)[0]
@@ -80,14 +196,45 @@ class IntervalsExerciseUpdater:
     
     def set_allowed_intervals(self, allowed_interval_names, interval_type):
         self._set_allowed_intervals(self.exercise.settings, allowed_interval_names, interval_type)
+        self.question_queue.clear()
     
     def _get_random_start_note(self):
-        lowest_note = self.exercise.settings.lowest_octave * NUM_NOTES_IN_OCTAVE
-        highest_note = (self.exercise.settings.highest_octave + 1) * NUM_NOTES_IN_OCTAVE - 1
-        return random.randint(lowest_note, highest_note)
+        return self.question_queue.get_random_start_note()
 
     def _get_random_question_interval(self):
-        return random.choice(self.exercise.settings.allowed_intervals.all())
+        return random.choice(self._get_allowed_intervals())
+
+    def _get_allowed_intervals(self):
+        # only ids of allowed intervals are queried, intervals come from the catalogue in memory
+        if self._allowed_intervals is None:
+            self._allowed_intervals = IntervalCatalogue.get_intervals(
+                self.exercise.settings.allowed_intervals.values_list("id", flat=True)
+            )
+        return self._allowed_intervals
+
+    def _generate_new_stateless_question(self):
+        self.exercise.question_start_note = self._get_random_start_note()
+        self.exercise.question_interval = self._get_random_question_interval()
+        self.exercise.question_answer_interval_ids = [interval.id for interval in self._get_allowed_intervals()]
+        self.exercise.question_number += 1
+        self.exercise.save(update_fields=[
+            "question_start_note", "question_interval", "question_answer_interval_ids", "question_number",
+        ])
+
+    def _request_sprite_pack_render(self, question):
+        # the sprite pack is used by next questions with the same start note and interval type,
+        # the current question still uses separate audio files
+        interval_type = question.interval.interval_type
+        if AudioRenderRegistry.request_render(f"sprites_{question.start_note}_{interval_type}"):
+            run_task_in_background(update_sprite_pack_audio, question.start_note, interval_type, priority="normal")
+
+    def _get_stateless_interval_instance(self, interval):
+        # the audio file is found by its path, without querying the database
+        interval_instance = IntervalInstance(start_note=self.exercise.question_start_note, interval=interval)
+        relative_audio_path = AudioFilePathManager.get_interval_instance_audio_path(interval_instance)
+        if interval_instance.audio.storage.exists(relative_audio_path):
+            interval_instance.audio.name = str(relative_audio_path)
+        return interval_instance
 
     def _set_correct_answer(self):
         answer = IntervalAnswer.objects.get(exercise=self.exercise, interval_instance=self.exercise.question)
@@ -95,12 +242,6 @@ class IntervalsExerciseUpdater:
         answer.save()
 
     def _set_allowed_intervals(self, exercise_settings, allowed_interval_names, interval_type):
-        allowed_intervals = [
-            Interval.objects.get_or_create(
-                num_semitones=get_num_semitones(interval_name),
-                interval_type=interval_type,
-                defaults={"name": interval_name}
-            )[0]
-            for interval_name in allowed_interval_names
-        ]
+        allowed_intervals = IntervalCatalogue.get_or_create_intervals(allowed_interval_names, [interval_type])
         exercise_settings.allowed_intervals.set(allowed_intervals)
+        self._allowed_intervals = None
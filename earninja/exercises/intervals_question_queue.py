@@ -0,0 +1,90 @@
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from exercises.models import QueuedIntervalsQuestion
+from exercises.music_theory_utils import NUM_NOTES_IN_OCTAVE
+from exercises.interval_catalogue import IntervalCatalogue
+
+
+class IntervalsQuestionQueue:
+    # upcoming questions of the exercise are generated in advance, in the background,
+    # and added to the queue only after audio of all their answers is ready,
+    # unless audio is rendered when the browser downloads it
+    def __init__(self, exercise):
+        self.exercise = exercise
+        self.depth = settings.INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH
+
+    def pop(self):
+        # returns None if there is no valid question in the queue
+        allowed_interval_ids = set(self.exercise.settings.allowed_intervals.values_list("id", flat=True))
+        lowest_note, highest_note = self.get_start_note_range()
+        for queued_question in self.exercise.queued_questions.select_related("question__interval"):
+            # the question could have been popped by a concurrent request
+            num_deleted, _ = QueuedIntervalsQuestion.objects.filter(id=queued_question.id).delete()
+            if not num_deleted:
+                continue
+            # questions generated before settings changed are dropped
+            question = queued_question.question
+            if question.interval_id in allowed_interval_ids and lowest_note <= question.start_note <= highest_note:
+                return question
+        return None
+
+    def refill(self):
+        # refills of the same exercise (one is requested per answer) run one at a time,
+        # otherwise they would all count the same missing questions and overfill the queue
+        with self.refill_lock() as acquired:
+            if acquired:
+                self._refill()
+
+    @contextmanager
+    def refill_lock(self):
+        # yields False if the queue is being refilled by someone else,
+        # state is kept in the default cache, which should be shared by all processes
+        key = f"question_queue_refill_lock_{self.exercise.id}"
+        acquired = cache.add(key, True, timeout=settings.INTERVALS_EXERCISE_QUESTION_QUEUE_REFILL_LOCK_TTL)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cache.delete(key)
+
+    def _refill(self):
+        num_missing_questions = self.depth - self.exercise.queued_questions.count()
+        allowed_intervals = IntervalCatalogue.get_intervals(
+            self.exercise.settings.allowed_intervals.values_list("id", flat=True)
+        )
+        if num_missing_questions <= 0 or not allowed_intervals:
+            return
+        questions = [
+            (self.get_random_start_note(), random.choice(allowed_intervals))
+            for _ in range(num_missing_questions)
+        ]
+        answers = IntervalCatalogue.get_or_create_interval_instances(
+            allowed_intervals,
+            sorted({start_note for start_note, _ in questions}),
+        )
+        if not settings.AUDIO_RENDER_ON_DEMAND:
+            # imported on first render, see tasks
+            from exercises.batch_audio_renderer import BatchAudioRenderer
+            BatchAudioRenderer().save_interval_instances_audio(
+                [answer for answer in answers if not answer.has_up_to_date_audio()]
+            )
+        answers = {(answer.start_note, answer.interval_id): answer for answer in answers}
+        QueuedIntervalsQuestion.objects.bulk_create([
+            QueuedIntervalsQuestion(exercise=self.exercise, question=answers[(start_note, interval.id)])
+            for start_note, interval in questions
+        ])
+
+    def clear(self):
+        self.exercise.queued_questions.all().delete()
+
+    def get_random_start_note(self):
+        return random.randint(*self.get_start_note_range())
+
+    def get_start_note_range(self):
+        lowest_note = self.exercise.settings.lowest_octave * NUM_NOTES_IN_OCTAVE
+        highest_note = (self.exercise.settings.highest_octave + 1) * NUM_NOTES_IN_OCTAVE - 1
+        return lowest_note, highest_note
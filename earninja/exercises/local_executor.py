@@ -0,0 +1,123 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalExecutor:
+    # runs tasks on a bounded pool of background threads of the web server process,
+    # so they can be run off the request path when Celery is not available
+    # a task submitted again while it's still queued or running is not queued twice,
+    # a failed task is retried a few times before it's given up
+    # tasks with lower priority number run first, tasks with equal priority run in order of submission
+    _lock = threading.Lock()
+    _queue = None
+    _submission_counter = itertools.count()
+    _workers = []
+    _pending_tasks = set()
+    _stats = {}
+
+    @classmethod
+    def submit(cls, task, *args, priority=0):
+        # returns False if the same task with the same arguments is already pending
+        task_key = (task, args)
+        with cls._lock:
+            cls._ensure_workers_exist()
+            if task_key in cls._pending_tasks:
+                cls._increment("num_deduplicated")
+                return False
+            cls._pending_tasks.add(task_key)
+            cls._increment("num_submitted")
+            cls._queue.put((priority, next(cls._submission_counter), task, args, 0))
+        logger.debug("Local executor queue depth: %d", cls.get_queue_depth())
+        return True
+
+    @classmethod
+    def get_queue_depth(cls):
+        # number of tasks which are queued or running
+        return len(cls._pending_tasks)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {
+                "queue_depth": len(cls._pending_tasks),
+                "num_workers": len(cls._workers),
+                **{
+                    name: cls._stats.get(name, 0)
+                    for name in ["num_submitted", "num_deduplicated", "num_retried", "num_failed", "num_completed"]
+                },
+            }
+
+    @classmethod
+    def _ensure_workers_exist(cls):
+        if cls._queue is None:
+            cls._queue = queue.PriorityQueue()
+        while len(cls._workers) < settings.LOCAL_EXECUTOR_MAX_WORKERS:
+            worker = threading.Thread(target=cls._work, args=(cls._queue,), name="local-executor", daemon=True)
+            worker.start()
+            cls._workers.append(worker)
+
+    @classmethod
+    def _work(cls, task_queue):
+        while True:
+            priority, _, task, args, num_retries = task_queue.get()
+            try:
+                cls._run(task, args, priority, num_retries)
+            finally:
+                # each thread has its own database connection
+                connection.close()
+
+    @classmethod
+    def _run(cls, task, args, priority, num_retries):
+        try:
+            task(*args)
+        except Exception:
+            if num_retries < settings.LOCAL_EXECUTOR_MAX_RETRIES:
+                logger.warning("Task %s%s failed, retrying", cls._get_task_name(task), args, exc_info=True)
+                with cls._lock:
+                    cls._increment("num_retried")
+                # the task stays pending until it's retried,
+                # workers don't wait for the retry and run other tasks in the meantime
+                retry_timer = threading.Timer(
+                    settings.LOCAL_EXECUTOR_RETRY_DELAY * (num_retries + 1),
+                    cls._queue.put,
+                    args=[(priority, next(cls._submission_counter), task, args, num_retries + 1)],
+                )
+                retry_timer.daemon = True
+                retry_timer.start()
+                return
+            logger.exception("Task %s%s failed", cls._get_task_name(task), args)
+            result = "num_failed"
+        else:
+            result = "num_completed"
+        with cls._lock:
+            cls._pending_tasks.discard((task, args))
+            cls._increment(result)
+
+    @classmethod
+    def _increment(cls, name):
+        cls._stats[name] = cls._stats.get(name, 0) + 1
+
+    @staticmethod
+    def _get_task_name(task):
+        return getattr(task, "name", getattr(task, "__name__", repr(task)))
+
+    @classmethod
+    def _forget_workers(cls):
+        # threads of the executor don't exist in a forked process
+        cls._lock = threading.Lock()
+        cls._queue = None
+        cls._workers = []
+        cls._pending_tasks = set()
+        cls._stats = {}
+
+
+os.register_at_fork(after_in_child=LocalExecutor._forget_workers)
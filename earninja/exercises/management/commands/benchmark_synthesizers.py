@@ -0,0 +1,34 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from exercises.music_theory_utils import INTERVAL_NAMES, INTERVAL_TYPES
+from exercises.synthesizers import SYNTHESIZERS
+
+
+class Command(BaseCommand):
+    help = "Compares render times of audio synthesizers on a random sample of intervals"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthesizers", nargs="+", choices=list(SYNTHESIZERS), default=list(SYNTHESIZERS))
+        parser.add_argument("--num-intervals", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        intervals = [
+            (rng.randint(2*12, 6*12 - 1), rng.choice(INTERVAL_NAMES), rng.randrange(len(INTERVAL_TYPES)))
+            for _ in range(options["num_intervals"])
+        ]
+        for name in options["synthesizers"]:
+            synthesizer = SYNTHESIZERS[name]()
+            # e.g. loading of the soundfont is not included in render times
+            synthesizer.warm_up()
+            for interval in intervals:
+                synthesizer.render_interval(*interval)
+            stats = synthesizer.get_render_stats()
+            self.stdout.write(
+                f"{name}: {stats['num_renders']} renders, "
+                f"total {stats['total_render_time']:.3f} s, "
+                f"mean {stats['mean_render_time']:.4f} s"
+            )
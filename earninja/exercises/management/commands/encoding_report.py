@@ -0,0 +1,50 @@
+import os
+import random
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exercises.audio_saver import AudioSaver
+from exercises.music_theory_utils import INTERVAL_NAMES, INTERVAL_TYPES
+from exercises.synthesizers import SYNTHESIZERS, get_synthesizer
+
+
+class Command(BaseCommand):
+    help = "Compares sizes and encode times of audio encoding profiles on a random sample of intervals"
+
+    def add_arguments(self, parser):
+        profile_names = list(settings.AUDIO_ENCODING_PROFILES)
+        parser.add_argument("--profiles", nargs="+", choices=profile_names, default=profile_names)
+        parser.add_argument("--num-intervals", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--synthesizer", choices=list(SYNTHESIZERS))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        intervals = [
+            (rng.randint(2*12, 6*12 - 1), rng.choice(INTERVAL_NAMES), rng.randrange(len(INTERVAL_TYPES)))
+            for _ in range(options["num_intervals"])
+        ]
+        # intervals are synthesized once, only encoding is measured
+        synthesizer = get_synthesizer(options["synthesizer"])
+        samples = [synthesizer.render_interval(*interval) for interval in intervals]
+        num_raw_bytes = sum(interval_samples.nbytes for interval_samples in samples)
+        self.stdout.write(f"{len(samples)} intervals, {num_raw_bytes / len(samples):.0f} bytes/interval of raw audio")
+
+        # nothing is saved, audio is only encoded
+        audio_saver = AudioSaver(os.devnull, synthesizer)
+        for profile_name in options["profiles"]:
+            start_time = time.perf_counter()
+            try:
+                num_bytes = sum(len(audio_saver.encode_audio(interval_samples, profile_name)) for interval_samples in samples)
+            except subprocess.CalledProcessError:
+                self.stdout.write(f"{profile_name}: encoding failed, is the codec available in ffmpeg?")
+                continue
+            encode_time = time.perf_counter() - start_time
+            self.stdout.write(
+                f"{profile_name}: {num_bytes / len(samples):.0f} bytes/interval "
+                f"({num_bytes / num_raw_bytes:.1%} of raw audio), "
+                f"{encode_time / len(samples) * 1000:.1f} ms/interval"
+            )
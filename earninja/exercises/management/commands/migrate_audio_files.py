@@ -0,0 +1,79 @@
+import os
+import shutil
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.models import IntervalInstance
+
+
+LEGACY_AUDIO_NAME_PREFIX = "audio/interval_instance_"
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves audio files named after database ids (audio/interval_instance_<id>.mp3) "
+        "to paths derived from the interval and render settings. "
+        "The files are assumed to be rendered by fluidsynth program and saved as default mp3, "
+        "with current soundfont, gain, sample rate and loudness. "
+        "If current render settings differ, the files are kept under their own settings and rendered again. "
+        "Can be run while the app is running: a file is available at its new path "
+        "before the database is updated, and the old file is removed only after that."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="migrate at most this many files")
+
+    def handle(self, *args, **options):
+        self.legacy_audio_dir = Path("audio") / AudioFilePathManager.get_legacy_render_config_hash()
+        if self.legacy_audio_dir != AudioFilePathManager.get_audio_dir():
+            self.stderr.write(
+                "Current render settings differ from the settings of the old audio files "
+                "(fluidsynth synthesizer and mp3 encoding), migrated files will be rendered again"
+            )
+        interval_instances = IntervalInstance.objects.select_related("interval").filter(
+            audio__startswith=LEGACY_AUDIO_NAME_PREFIX,
+        ).order_by("id")
+        if options["limit"] is not None:
+            interval_instances = interval_instances[:options["limit"]]
+
+        num_migrated = 0
+        num_missing = 0
+        for interval_instance in interval_instances.iterator():
+            if self._migrate(interval_instance):
+                num_migrated += 1
+            else:
+                num_missing += 1
+        self.stdout.write(f"Migrated {num_migrated} audio files")
+        if num_missing:
+            self.stdout.write(f"{num_missing} audio files were missing, they will be rendered again")
+
+    def _migrate(self, interval_instance):
+        storage = interval_instance.audio.storage
+        old_path = Path(storage.path(interval_instance.audio.name))
+        relative_audio_path = self.legacy_audio_dir / AudioFilePathManager.get_interval_instance_audio_path(
+            interval_instance,
+        ).name
+        new_path = Path(storage.path(relative_audio_path))
+        if not old_path.is_file():
+            interval_instance.audio.name = ""
+            interval_instance.save(update_fields=["audio"])
+            return False
+        if not new_path.is_file():
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            self._link_atomically(old_path, new_path)
+        # thanks to django-cleanup app, the old file is deleted here
+        interval_instance.audio.name = str(relative_audio_path)
+        interval_instance.save(update_fields=["audio"])
+        return True
+
+    def _link_atomically(self, old_path, new_path):
+        # the file is never visible at the new path partially written
+        temporary_path = new_path.with_name(f".{new_path.name}.{os.getpid()}.part")
+        try:
+            os.link(old_path, temporary_path)
+        except OSError:
+            # e.g. hard links are not supported by the file system
+            shutil.copyfile(old_path, temporary_path)
+        temporary_path.replace(new_path)
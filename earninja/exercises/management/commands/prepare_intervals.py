@@ -0,0 +1,207 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.batch_audio_renderer import BatchAudioRenderer
+from exercises.interval_catalogue import IntervalCatalogue
+from exercises.music_theory_utils import (
+    INTERVAL_NAMES,
+    INTERVAL_TYPES,
+    NUM_NOTES_IN_OCTAVE,
+    get_num_semitones,
+)
+from exercises.models import IntervalInstance
+
+
+def init_worker():
+    # needed when worker processes are spawned instead of forked
+    django.setup()
+
+
+def render_batch(interval_instance_ids):
+    # returns number of rendered interval instances, number of interval instances whose existing audio
+    # file has been reused, and cpu time (including cpu time of subprocesses, e.g. fluidsynth, ffmpeg)
+    # and time used to render them
+    start_time = time.monotonic()
+    start_cpu_time = get_cpu_time()
+    interval_instances = IntervalInstance.objects.select_related("interval").filter(id__in=interval_instance_ids)
+    num_rendered = BatchAudioRenderer().save_interval_instances_audio(interval_instances)
+    return (
+        num_rendered,
+        len(interval_instance_ids) - num_rendered,
+        get_cpu_time() - start_cpu_time,
+        time.monotonic() - start_time,
+    )
+
+
+def get_cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates interval instances for given range of octaves and renders their missing audio files. "
+        "Audio file of each interval instance is saved as soon as it's rendered, "
+        "so an interrupted run is resumed where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("lowest_octave", type=int)
+        parser.add_argument("highest_octave", type=int)
+        parser.add_argument("--jobs", type=int, default=1, help="number of worker processes")
+        parser.add_argument("--batch-size", type=int, default=settings.AUDIO_BATCH_SIZE)
+        # a batch is not started if it would probably exceed the budget,
+        # judging by cpu time and time of batches rendered so far
+        parser.add_argument("--cpu-budget", type=float, help="stop before using more than this many cpu seconds")
+        parser.add_argument("--time-budget", type=float, help="stop before running longer than this many seconds")
+
+    def handle(self, *args, **options):
+        self.start_time = time.monotonic()
+        self.start_cpu_time = get_cpu_time()
+        self.start_process_time = time.process_time()
+        self.worker_cpu_time = 0.0
+        self.num_rendered = 0
+        self.num_reused = 0
+        self.num_batches = 0
+        self.batches_cpu_time = 0.0
+        self.batches_time = 0.0
+        self.budget_exceeded = False
+        self.use_pool = options["jobs"] > 1
+        self.options = options
+
+        self._create_interval_instances(options["lowest_octave"], options["highest_octave"])
+        batches = self._get_batches(self._get_pending_interval_instances(), options["batch_size"])
+        self.stdout.write(f"{sum(len(batch) for batch in batches)} interval instances without audio")
+        if self.use_pool:
+            self._render_in_pool(batches, options["jobs"])
+        else:
+            self._render_in_process(batches)
+        self._print_summary()
+
+    def _create_interval_instances(self, lowest_octave, highest_octave):
+        intervals = IntervalCatalogue.get_or_create_intervals(INTERVAL_NAMES, range(len(INTERVAL_TYPES)))
+        IntervalCatalogue.get_or_create_interval_instances(
+            intervals,
+            range(lowest_octave * NUM_NOTES_IN_OCTAVE, (highest_octave + 1) * NUM_NOTES_IN_OCTAVE),
+        )
+
+    def _get_pending_interval_instances(self):
+        self.default_num_semitones = [
+            get_num_semitones(interval_name)
+            for interval_name in settings.INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS
+        ]
+        # audio rendered with different settings is rendered again
+        interval_instances = IntervalInstance.objects.exclude(
+            audio__startswith=f"{AudioFilePathManager.get_audio_dir()}/",
+        ).filter(
+            start_note__gte=self.options["lowest_octave"] * NUM_NOTES_IN_OCTAVE,
+            start_note__lt=(self.options["highest_octave"] + 1) * NUM_NOTES_IN_OCTAVE,
+        ).values_list("id", "start_note", "interval__num_semitones", "interval__interval_type")
+        return sorted(interval_instances, key=self._get_priority)
+
+    def _get_priority(self, interval_instance):
+        # intervals from default settings of the exercise are the most likely to be requested
+        # so they are rendered first
+        _, start_note, num_semitones, interval_type = interval_instance
+        in_default_octaves = (
+            settings.INTERVALS_EXERCISE_DEFAULT_LOWEST_OCTAVE * NUM_NOTES_IN_OCTAVE
+            <= start_note
+            < (settings.INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE + 1) * NUM_NOTES_IN_OCTAVE
+        )
+        is_default_interval = (
+            interval_type == settings.INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE
+            and num_semitones in self.default_num_semitones
+        )
+        return (not (in_default_octaves and is_default_interval), not in_default_octaves, interval_type, num_semitones, start_note)
+
+    def _get_batches(self, interval_instances, batch_size):
+        ids = [interval_instance[0] for interval_instance in interval_instances]
+        return [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+    def _render_in_process(self, batches):
+        for batch in batches:
+            if self._is_budget_exceeded(num_running_batches=0):
+                break
+            self._record_batch(*render_batch(batch))
+
+    def _render_in_pool(self, batches, num_jobs):
+        # worker processes open their own database connections
+        connections.close_all()
+        batches = iter(batches)
+        with ProcessPoolExecutor(max_workers=num_jobs, initializer=init_worker) as executor:
+            running = set()
+            while True:
+                while len(running) < num_jobs and not self._is_budget_exceeded(num_running_batches=len(running)):
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    running.add(executor.submit(render_batch, batch))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._record_batch(*future.result())
+
+    def _record_batch(self, num_rendered, num_reused, cpu_time, batch_time):
+        self.num_rendered += num_rendered
+        self.num_reused += num_reused
+        self.num_batches += 1
+        self.batches_cpu_time += cpu_time
+        self.batches_time += batch_time
+        self.worker_cpu_time += cpu_time
+        self.stdout.write(
+            f"Rendered audio of {self.num_rendered} interval instances, reused {self.num_reused} audio files"
+        )
+
+    def _get_elapsed_time(self):
+        return time.monotonic() - self.start_time
+
+    def _get_used_cpu_time(self):
+        if self.use_pool:
+            # cpu time of workers is known only from their reports until they finish
+            return time.process_time() - self.start_process_time + self.worker_cpu_time
+        return get_cpu_time() - self.start_cpu_time
+
+    def _is_budget_exceeded(self, num_running_batches):
+        # checked before every batch is started, so after every batch finishes,
+        # cpu time of running batches and of the next batch is estimated from batches rendered so far
+        if self.budget_exceeded:
+            return True
+        cpu_budget = self.options["cpu_budget"]
+        time_budget = self.options["time_budget"]
+        if self.num_batches:
+            expected_cpu_time = self.batches_cpu_time / self.num_batches * (num_running_batches + 1)
+            # batches run in parallel, so the next batch ends about one batch time from now
+            expected_time = self.batches_time / self.num_batches
+        else:
+            expected_cpu_time = expected_time = 0.0
+        if cpu_budget is not None and self._would_exceed(self._get_used_cpu_time(), expected_cpu_time, cpu_budget):
+            self.stdout.write("CPU time budget exceeded, waiting for running batches and stopping")
+            self.budget_exceeded = True
+        elif time_budget is not None and self._would_exceed(self._get_elapsed_time(), expected_time, time_budget):
+            self.stdout.write("Time budget exceeded, waiting for running batches and stopping")
+            self.budget_exceeded = True
+        return self.budget_exceeded
+
+    def _would_exceed(self, used, expected, budget):
+        return used >= budget or used + expected > budget
+
+    def _print_summary(self):
+        elapsed_time = self._get_elapsed_time()
+        cpu_time = self._get_used_cpu_time()
+        self.stdout.write(
+            f"Rendered audio of {self.num_rendered} interval instances in {elapsed_time:.1f} s, "
+            f"reused {self.num_reused} existing audio files"
+        )
+        if self.num_rendered:
+            self.stdout.write(
+                f"{self.num_rendered / elapsed_time:.2f} instances/s, "
+                f"{cpu_time / self.num_rendered:.3f} CPU s/instance ({cpu_time:.1f} CPU s in total)"
+            )
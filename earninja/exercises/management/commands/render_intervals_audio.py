@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.batch_audio_renderer import BatchAudioRenderer
+from exercises.models import IntervalInstance
+from exercises.synthesizers import get_synthesizer
+
+
+class Command(BaseCommand):
+    help = "Renders audio of interval instances in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("interval_instance_ids", nargs="*", type=int)
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="render all interval instances without audio, or with audio rendered with different settings",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        interval_instances = IntervalInstance.objects.select_related("interval").order_by("id")
+        if options["missing"]:
+            interval_instances = interval_instances.exclude(audio__startswith=f"{AudioFilePathManager.get_audio_dir()}/")
+        elif options["interval_instance_ids"]:
+            interval_instances = interval_instances.filter(id__in=options["interval_instance_ids"])
+        else:
+            raise CommandError("Pass ids of interval instances or --missing")
+
+        synthesizer = get_synthesizer()
+        renderer = BatchAudioRenderer(synthesizer, options["batch_size"])
+        renderer.save_interval_instances_audio(interval_instances)
+
+        stats = synthesizer.get_render_stats()
+        self.stdout.write(f"Rendered audio of {stats['num_renders']} interval instances in {stats['total_render_time']:.2f} s")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from exercises.audio_sprite_pack_renderer import AudioSpritePackRenderer
+from exercises.models import IntervalInstance
+from exercises.music_theory_utils import INTERVAL_TYPES, NUM_NOTES_IN_OCTAVE
+from exercises.synthesizers import get_synthesizer
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders sprite packs (audio of all intervals of one type from one start note in a single file) "
+        "for given range of octaves. Sprite packs which already exist are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("lowest_octave", type=int)
+        parser.add_argument("highest_octave", type=int)
+        parser.add_argument(
+            "--interval-types",
+            nargs="+",
+            type=int,
+            choices=range(len(INTERVAL_TYPES)),
+            default=list(range(len(INTERVAL_TYPES))),
+        )
+
+    def handle(self, *args, **options):
+        synthesizer = get_synthesizer()
+        renderer = AudioSpritePackRenderer(IntervalInstance._meta.get_field("audio").storage, synthesizer)
+        start_notes = range(
+            options["lowest_octave"] * NUM_NOTES_IN_OCTAVE,
+            (options["highest_octave"] + 1) * NUM_NOTES_IN_OCTAVE,
+        )
+        for interval_type in options["interval_types"]:
+            for start_note in start_notes:
+                renderer.save_sprite_pack(start_note, interval_type)
+
+        stats = synthesizer.get_render_stats()
+        self.stdout.write(f"Rendered audio of {stats['num_renders']} intervals in {stats['total_render_time']:.2f} s")
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# modules of the audio stack, which should be imported only when audio is rendered
+AUDIO_STACK_MODULES = ["numpy", "pydub", "mingus", "exercises.synthesizers", "exercises.audio_saver"]
+
+
+def parse_importtime(output):
+    # returns (module, self time, cumulative time) of every import, in microseconds,
+    # from stderr of python run with -X importtime
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative_time, module = line[len("import time:"):].split("|")
+        if not self_time.strip().isdigit():
+            # header line
+            continue
+        imports.append((module.strip(), int(self_time), int(cumulative_time)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the app in a fresh python process, the same way as a web server process does on startup, "
+        "and reports which imports take the most time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", nargs="+", default=["earninja.wsgi", "earninja.urls"])
+        parser.add_argument("--top", type=int, default=15, help="number of the slowest imports to show")
+        parser.add_argument("--budget", type=float, help="fail if imports take more than this many milliseconds")
+
+    def handle(self, *args, **options):
+        imports = parse_importtime(self._run_imports(options["modules"]))
+        total_time = sum(self_time for _, self_time, _ in imports) / 1000
+        self.stdout.write(f"{len(imports)} modules imported in {total_time:.1f} ms")
+        self.stdout.write("Slowest imports (self ms, cumulative ms):")
+        for module, self_time, cumulative_time in sorted(imports, key=lambda i: i[1], reverse=True)[:options["top"]]:
+            self.stdout.write(f"{self_time / 1000:8.1f} {cumulative_time / 1000:8.1f}  {module}")
+
+        imported_modules = {module for module, _, _ in imports}
+        audio_stack_modules = [module for module in AUDIO_STACK_MODULES if module in imported_modules]
+        if audio_stack_modules:
+            self.stdout.write(f"Audio stack imported on startup: {', '.join(audio_stack_modules)}")
+        if options["budget"] is not None and total_time > options["budget"]:
+            raise CommandError(f"Imports took {total_time:.1f} ms, more than the budget of {options['budget']:.1f} ms")
+
+    def _run_imports(self, modules):
+        code = "import django; django.setup()\n" + "".join(f"import {module}\n" for module in modules)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "earninja.settings")},
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Importing {', '.join(modules)} failed:\n{result.stderr}")
+        return result.stderr
@@ -0,0 +1,36 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.audio_file_server import AudioFileServer
+
+
+# temporary files of renders in progress start with a dot, and are never served
+AUDIO_FILE_NAME_PATTERN = re.compile(r"[\w-][\w.-]*")
+
+
+class AudioFilesMiddleware:
+    # serves audio files from the media directory before url routing, like WhiteNoise serves static files,
+    # with headers which let browsers cache them forever, see AudioFileServer
+    # files which don't exist are left to url routing (e.g. 404 or the view rendering audio on demand)
+    # a web server serving media/audio/ instead should send the same Cache-Control header
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.AUDIO_SERVE_FILES and request.method in ("GET", "HEAD"):
+            response = self._serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def _serve(self, request):
+        audio_dir_url = AudioFilePathManager.get_audio_dir_url()
+        if not request.path.startswith(audio_dir_url):
+            return None
+        file_name = request.path[len(audio_dir_url):]
+        if not AUDIO_FILE_NAME_PATTERN.fullmatch(file_name):
+            return None
+        return AudioFileServer.serve(request, Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_audio_dir() / file_name)
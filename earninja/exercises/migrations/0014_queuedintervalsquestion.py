@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0013_alter_intervalsexercisesettings_highest_octave_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedIntervalsQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_questions', to='exercises.intervalsexercise')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exercises.intervalinstance')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
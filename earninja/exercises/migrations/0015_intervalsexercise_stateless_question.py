@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0014_queuedintervalsquestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intervalsexercise',
+            name='question_answer_interval_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='intervalsexercise',
+            name='question_interval',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='exercises.interval'),
+        ),
+        migrations.AddField(
+            model_name='intervalsexercise',
+            name='question_start_note',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0015_intervalsexercise_stateless_question'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercisescore',
+            name='last_answered_question_number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='intervalsexercise',
+            name='question_number',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.db.models import UniqueConstraint
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
+from django.urls import reverse
 
 from exercises.audio_file_path_manager import AudioFilePathManager
 from exercises.music_theory_utils import (
@@ -49,11 +50,33 @@ class IntervalInstance(models.Model):
     # thanks to this method
     # the url can be accessed even before audio FileField is set
     def get_audio_url(self):
+        if settings.AUDIO_RENDER_ON_DEMAND:
+            # the audio is rendered when it's downloaded for the first time
+            return reverse("exercises:interval_audio", kwargs={
+                "render_config_hash": AudioFilePathManager.get_render_config_hash(),
+                "start_note": self.start_note,
+                "num_semitones": self.interval.num_semitones,
+                "interval_type": self.interval.interval_type,
+            })
         audio_path = AudioFilePathManager.get_interval_instance_audio_path(self)
         # https://docs.djangoproject.com/en/4.2/ref/models/fields/#django.db.models.FileField.storage
         # https://docs.djangoproject.com/en/4.2/ref/files/storage/#django.core.files.storage.Storage.url
         return self.audio.field.storage.url(audio_path)
 
+    def get_audio_ready_url(self):
+        # None if the audio can be downloaded right away
+        if settings.AUDIO_RENDER_ON_DEMAND or self.has_up_to_date_audio():
+            return None
+        return reverse("exercises:audio_ready", kwargs={
+            "start_note": self.start_note,
+            "num_semitones": self.interval.num_semitones,
+            "interval_type": self.interval.interval_type,
+        })
+
+    # audio rendered with different settings is treated as missing
+    def has_up_to_date_audio(self):
+        return AudioFilePathManager.is_audio_up_to_date(self)
+
 
 class IntervalsExercise(models.Model):
     question = models.ForeignKey(IntervalInstance, null=True, on_delete=models.SET_NULL, related_name="exercises_with_interval_instance_as_question")
@@ -63,10 +86,30 @@ class IntervalsExercise(models.Model):
     settings = models.OneToOneField("IntervalsExerciseSettings", null=True, on_delete=models.SET_NULL, related_name="exercise")
     score = models.OneToOneField("ExerciseScore", null=True, on_delete=models.SET_NULL)
 
+    # the current question when questions are not saved as interval instances and answers
+    # (INTERVALS_EXERCISE_STATELESS_QUESTIONS setting)
+    question_start_note = models.IntegerField(null=True)
+    question_interval = models.ForeignKey(Interval, null=True, on_delete=models.SET_NULL, related_name="+")
+    question_answer_interval_ids = models.JSONField(default=list)
+    # incremented with every new question, so an answer can be matched with the question it was given to
+    question_number = models.IntegerField(default=0)
+
     def __str__(self):
         return f'intervals exercise for user: {self.user}'
 
 
+class QueuedIntervalsQuestion(models.Model):
+    # upcoming question of the exercise, generated in advance with audio of all its answers
+    exercise = models.ForeignKey(IntervalsExercise, on_delete=models.CASCADE, related_name="queued_questions")
+    question = models.ForeignKey(IntervalInstance, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f'queued question: {self.question} for user: {self.exercise.user}'
+
+
 class IntervalAnswer(models.Model):
     interval_instance = models.ForeignKey(IntervalInstance, on_delete=models.CASCADE)
     exercise = models.ForeignKey(IntervalsExercise, on_delete=models.CASCADE)
@@ -101,6 +144,8 @@ class IntervalsExerciseSettings(models.Model):
 class ExerciseScore(models.Model):
     num_correct_answers = models.IntegerField(default=0)
     num_all_answers = models.IntegerField(default=0)
+    # question number (see IntervalsExercise) of the last counted answer, so every question is counted once
+    last_answered_question_number = models.IntegerField(default=0)
 
     def __str__(self):
         return f'{self.num_correct_answers}/{self.num_all_answers} ({self.display_as_percentage()})'
@@ -1,34 +1,60 @@
-from mingus.containers import NoteContainer, Note
+from functools import lru_cache
 
 
 NUM_NOTES_IN_OCTAVE = 12
 INTERVAL_NAMES = ['1', 'b2', '2', 'b3', '3', '4', '#4', '5', 'b6', '6', 'b7', '7', '8']
 INTERVAL_TYPES = ["harmonic", "melodic ascending", "melodic descending"]
 
+# names and numbers of notes are the same as in mingus (e.g. 46 is "A#-3")
+NUM_MIDI_NOTES = 128
+# mingus note 0 is C-0, which is midi pitch 12
+MIDI_PITCH_OFFSET = 12
+NOTE_CLASS_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+NOTE_NAMES = [
+    f'{NOTE_CLASS_NAMES[note % NUM_NOTES_IN_OCTAVE]}-{note // NUM_NOTES_IN_OCTAVE}'
+    for note in range(NUM_MIDI_NOTES)
+]
 
+# the same values as determined by mingus
+INTERVAL_NUM_SEMITONES = {
+    '1': 0, 'b2': 1, '2': 2, 'b3': 3, '3': 4, '4': 5, '#4': 6,
+    '5': 7, 'b6': 8, '6': 9, 'b7': 10, '7': 11, '8': 12,
+}
+INTERVAL_LONG_NAMES = {
+    '1': 'unison', 'b2': 'minor second', '2': 'major second', 'b3': 'minor third', '3': 'major third',
+    '4': 'perfect fourth', '#4': 'augmented fourth', '5': 'perfect fifth', 'b6': 'minor sixth',
+    '6': 'major sixth', 'b7': 'minor seventh', '7': 'major seventh', '8': 'octave',
+}
+
+
+def get_interval_notes(start_note_int, interval_name):
+    # unison is a single note
+    num_semitones = get_num_semitones(interval_name)
+    if not num_semitones:
+        return (start_note_int,)
+    return (start_note_int, start_note_int + num_semitones)
+
+# mingus is imported only by functions which need its objects,
+# names and numbers of intervals and notes come from tables above
 def get_interval_container(start_note_int, interval_name):
-    start_note = Note().from_int(start_note_int)
-    if interval_name == '8':
-        return NoteContainer([
-            start_note,
-            Note().from_int(start_note_int + NUM_NOTES_IN_OCTAVE)
-        ])
-    return NoteContainer().from_interval(start_note, interval_name)
+    from mingus.containers import NoteContainer, Note
+    return NoteContainer([Note().from_int(note_int) for note_int in get_interval_notes(start_note_int, interval_name)])
 
 def get_num_semitones(interval_name):
-    if interval_name == '1': return 0
-    if interval_name == '8': return 12
-    interval_container = NoteContainer().from_interval(Note(), interval_name)
-    low_note, high_note = interval_container.notes
-    return low_note.measure(high_note)
+    if interval_name in INTERVAL_NUM_SEMITONES:
+        return INTERVAL_NUM_SEMITONES[interval_name]
+    # alternative names of intervals, e.g. "b5" or "#2"
+    return _measure_num_semitones(interval_name)
 
 def get_interval_long_name(interval_name):
-    if interval_name == '1': return 'unison'
-    if interval_name == '8': return 'octave'
-    return NoteContainer().from_interval(Note(), interval_name).determine()[0]
+    if interval_name in INTERVAL_LONG_NAMES:
+        return INTERVAL_LONG_NAMES[interval_name]
+    return _determine_interval_long_name(interval_name)
 
 def get_note_name(note_int):
-    return str(Note().from_int(note_int)).replace("'", "")
+    if 0 <= note_int < NUM_MIDI_NOTES:
+        return NOTE_NAMES[note_int]
+    return f'{NOTE_CLASS_NAMES[note_int % NUM_NOTES_IN_OCTAVE]}-{note_int // NUM_NOTES_IN_OCTAVE}'
 
 def get_interval_choices():
     return [
@@ -38,3 +64,14 @@ def get_interval_choices():
 
 def get_interval_type_choices():
     return [(i, interval_type) for i, interval_type in enumerate(INTERVAL_TYPES)]
+
+@lru_cache(maxsize=None)
+def _measure_num_semitones(interval_name):
+    from mingus.containers import NoteContainer, Note
+    low_note, high_note = NoteContainer().from_interval(Note(), interval_name).notes
+    return low_note.measure(high_note)
+
+@lru_cache(maxsize=None)
+def _determine_interval_long_name(interval_name):
+    from mingus.containers import NoteContainer, Note
+    return NoteContainer().from_interval(Note(), interval_name).determine()[0]
@@ -1,25 +1,120 @@
 const audioContext = new AudioContext();
 let mainGainNode = null;
 
+// decoded audio is kept in memory, so playing it again needs neither download nor decoding
+const AUDIO_BUFFER_CACHE_SIZE = 32;
+const SPRITE_PACK_CACHE_SIZE = 4;
 
-const playAudio = async (url, numRetries = 8) => {
-    const response = await fetch(url);
+class LruCache {
+    constructor(maxSize) {
+        this.maxSize = maxSize;
+        // Map keeps insertion order, the least recently used entry is the first one
+        this.entries = new Map();
+    }
 
-    if (response.status == 404 && numRetries > 0) {
-        // maybe celery task that generates this audio file hasn't finished yet
-        // retry
-        setTimeout(() => {
-            playAudio(url, numRetries - 1);
-        }, 500);
-        return;
+    get(key) {
+        if (!this.entries.has(key)) {
+            return undefined;
+        }
+        const value = this.entries.get(key);
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        return value;
     }
 
-    const buffer = await audioContext.decodeAudioData(await response.arrayBuffer());
+    set(key, value) {
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        if (this.entries.size > this.maxSize) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    delete(key) {
+        this.entries.delete(key);
+    }
+}
+
+const audioBuffers = new LruCache(AUDIO_BUFFER_CACHE_SIZE);
+
+// the server sends a smaller rendition of an audio file (if it has one) when it's asked for its type,
+// otherwise the mp3 is sent
+const RENDITION_TYPES = ["audio/ogg; codecs=opus", "audio/ogg; codecs=vorbis"];
+const audioElement = document.createElement("audio");
+const audioRequestHeaders = {
+    Accept: [...RENDITION_TYPES.filter(type => audioElement.canPlayType(type)), "audio/mpeg"].join(", "),
+};
+
+const playBuffer = (buffer, offset = 0, duration = undefined) => {
     const source = audioContext.createBufferSource();
     source.buffer = buffer;
 
     source.connect(mainGainNode);
-    source.start()
+    source.start(0, offset, duration);
+}
+
+// a readiness request is answered by the server as soon as the audio is rendered, or after a timeout,
+// the render is assumed to have failed if the audio is not ready after this many requests
+const MAX_NUM_READINESS_REQUESTS = 6;
+
+const waitUntilReady = async (readyUrl) => {
+    for (let i = 0; i < MAX_NUM_READINESS_REQUESTS; i++) {
+        const response = await fetch(readyUrl);
+        if (!response.ok) {
+            return false;
+        }
+        const {ready} = await response.json();
+        if (ready) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// readyUrl is given if the audio was still being rendered when the page was generated
+const playAudio = async (url, readyUrl = null) => {
+    const cachedBuffer = audioBuffers.get(url);
+    if (cachedBuffer) {
+        playBuffer(cachedBuffer);
+        return;
+    }
+
+    if (readyUrl && !(await waitUntilReady(readyUrl))) {
+        // audio file is still not ready, nothing to play
+        return;
+    }
+
+    const response = await fetch(url, {headers: audioRequestHeaders});
+    if (!response.ok) {
+        return;
+    }
+
+    const buffer = await audioContext.decodeAudioData(await response.arrayBuffer());
+    audioBuffers.set(url, buffer);
+    playBuffer(buffer);
+}
+
+// decoded sprite packs with their indexes, by url of the sprite pack audio
+const spritePacks = new LruCache(SPRITE_PACK_CACHE_SIZE);
+
+const loadSpritePack = (audioUrl, indexUrl) => {
+    let spritePack = spritePacks.get(audioUrl);
+    if (!spritePack) {
+        spritePack = Promise.all([
+            fetch(audioUrl, {headers: audioRequestHeaders}).then(response => response.arrayBuffer()).then(data => audioContext.decodeAudioData(data)),
+            fetch(indexUrl).then(response => response.json()),
+        ]).then(([buffer, index]) => ({buffer, index}));
+        // a failed download is tried again next time
+        spritePack.catch(() => spritePacks.delete(audioUrl));
+        spritePacks.set(audioUrl, spritePack);
+    }
+    return spritePack;
+}
+
+const playSprite = async (audioUrl, indexUrl, key) => {
+    const {buffer, index} = await loadSpritePack(audioUrl, indexUrl);
+    const [offset, duration] = index[key];
+    playBuffer(buffer, offset, duration);
 }
 
 const changeVolume = () => {
@@ -41,3 +136,10 @@ const setupVolumeControl = () => {
 
     changeVolume();
 }
+
+const registerAudioServiceWorker = (url) => {
+    // the service worker keeps recently played audio files across page loads
+    if ("serviceWorker" in navigator) {
+        navigator.serviceWorker.register(url).catch(() => {});
+    }
+}
@@ -0,0 +1,32 @@
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.audio_saver import AudioSaver
+from exercises.task_backends import run_task_in_background
+from exercises.tasks import update_interval_instance_renditions
+
+
+class StreamingAudioRenderer:
+    # renders audio of an interval instance and yields the mp3 while it's being encoded,
+    # so the browser starts playing it before the whole file exists
+    # the mp3 is saved to the storage at the same time, the same way as by update_interval_instance_audio task
+    # the render lock of the interval instance is acquired and released by the caller,
+    # the generator may be closed before it's started, e.g. when the browser disconnects right away
+    def __init__(self, interval_instance, synthesizer=None):
+        self.interval_instance = interval_instance
+        self.synthesizer = synthesizer
+
+    def stream(self):
+        interval_instance = self.interval_instance
+        relative_audio_path = AudioFilePathManager.get_interval_instance_audio_path(interval_instance)
+        audio_saver = AudioSaver(interval_instance.audio.storage.path(relative_audio_path), self.synthesizer)
+        yield from audio_saver.stream_interval_instance_audio(
+            interval_instance.start_note,
+            interval_instance.interval.name,
+            interval_instance.interval.interval_type,
+        )
+        interval_instance.audio.name = str(relative_audio_path)
+        interval_instance.save(update_fields=["audio"])
+        AudioRenderRegistry.notify_ready(relative_audio_path)
+        if audio_saver.extra_renditions:
+            # encoded after the stream ends, the browser waits for the mp3 only
+            run_task_in_background(update_interval_instance_renditions, interval_instance.id, priority="low")
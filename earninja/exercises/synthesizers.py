@@ -0,0 +1,446 @@
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from mingus.containers import NoteContainer, Note, Bar
+from mingus.midi.midi_file_out import MidiFile
+from mingus.midi.midi_track import MidiTrack
+
+from exercises.music_theory_utils import MIDI_PITCH_OFFSET, get_interval_container, get_interval_notes
+
+
+logger = logging.getLogger(__name__)
+
+InMemoryFile = namedtuple("InMemoryFile", ["path", "pass_fds"])
+
+# mingus writes midi files at 120 bpm, so a quarter note lasts half a second
+MIDI_BPM = 120
+NOTE_DURATION = 0.5
+MIDI_TICKS_PER_QUARTER_NOTE = 72
+NUM_CHANNELS = 2
+NUM_MIDI_PITCHES = 128
+# mingus writes notes with this velocity by default
+NOTE_VELOCITY = 64
+# in batch renders, intervals are separated by this many quarter notes of silence,
+# so that note releases and reverb don't leak into the next interval
+BATCH_GAP = 2
+# after the last note off, notes are released and the reverb dies out for this many seconds
+RELEASE_DURATION = 1
+
+
+def get_interval_note_events(start_note, interval_name, interval_type):
+    # returns (note, onset) pairs, onset is given in quarter notes
+    # 0 - harmonic, 1 - melodic ascending, 2 - melodic descending
+    notes = list(get_interval_notes(start_note, interval_name))
+    if interval_type == 0:
+        return [(note, 0) for note in notes]
+    if len(notes) == 1:
+        notes = notes * 2
+    if interval_type == 2:
+        notes.reverse()
+    return [(note, onset) for onset, note in enumerate(notes)]
+
+
+def get_batch_note_events(intervals):
+    # lays out intervals, given as (start_note, interval_name, interval_type), one after another
+    # returns note events and (onset, length) of every interval, in quarter notes
+    note_events = []
+    segments = []
+    onset = 0
+    for interval in intervals:
+        interval_note_events = get_interval_note_events(*interval)
+        length = max(note_onset for _, note_onset in interval_note_events) + 1
+        note_events += [(note, onset + note_onset) for note, note_onset in interval_note_events]
+        segments.append((onset, length))
+        onset += length + BATCH_GAP
+    return note_events, segments
+
+
+def get_midi_events(note_events, onset_length):
+    # returns (time, is_note_on, note) tuples sorted by time, time is given in onset_length units
+    # every note lasts one quarter note, as in midi files written by mingus
+    # if a note ends when another starts, the note off comes first
+    return sorted(
+        [(onset * onset_length, 1, note) for note, onset in note_events]
+        + [((onset + 1) * onset_length, 0, note) for note, onset in note_events]
+    )
+
+
+def slice_segments(samples, segments, sample_rate):
+    onset_length = int(NOTE_DURATION * sample_rate)
+    sliced_samples = []
+    for onset, length in segments:
+        segment = samples[onset * onset_length:(onset + length) * onset_length]
+        missing_length = length * onset_length - len(segment)
+        sliced_samples.append(np.pad(segment, ((0, missing_length), (0, 0))))
+    return sliced_samples
+
+
+@contextmanager
+def in_memory_file(data):
+    # yields a file with given data, which can be opened by a subprocess by its path
+    # on linux the file lives only in memory, elsewhere it's a temporary file
+    if hasattr(os, "memfd_create"):
+        with os.fdopen(os.memfd_create("audio_data"), "w+b") as f:
+            f.write(data)
+            f.flush()
+            yield InMemoryFile(path=f"/dev/fd/{f.fileno()}", pass_fds=(f.fileno(),))
+    else:
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            yield InMemoryFile(path=f.name, pass_fds=())
+
+
+def mix_note_events(note_samples, sample_rate):
+    # note_samples is a list of (samples, onset) pairs, onset is given in quarter notes
+    onset_length = int(NOTE_DURATION * sample_rate)
+    length = max(onset * onset_length + len(samples) for samples, onset in note_samples)
+    mix = np.zeros((length, NUM_CHANNELS), dtype=np.int32)
+    for samples, onset in note_samples:
+        start = onset * onset_length
+        mix[start:start + len(samples)] += samples
+    return np.clip(mix, -2**15, 2**15 - 1).astype(np.int16)
+
+
+class Synthesizer:
+    # base class for synthesizers, it keeps track of render times
+    # so that different synthesizers can be compared
+    name = None
+
+    def __init__(self):
+        self.num_renders = 0
+        self.total_render_time = 0.0
+        self.last_render_time = None
+
+    def render_interval(self, start_note, interval_name, interval_type):
+        start_time = time.perf_counter()
+        samples = self._render_interval(start_note, interval_name, interval_type)
+        self._record_render_time(time.perf_counter() - start_time)
+        return samples
+
+    def render_intervals(self, intervals):
+        # renders many intervals, given as (start_note, interval_name, interval_type), at once
+        start_time = time.perf_counter()
+        samples = self._render_intervals(intervals)
+        self._record_render_time(time.perf_counter() - start_time, num_renders=len(intervals))
+        return samples
+
+    def get_render_stats(self):
+        return {
+            "synthesizer": self.name,
+            "num_renders": self.num_renders,
+            "total_render_time": self.total_render_time,
+            "mean_render_time": self.total_render_time / self.num_renders if self.num_renders else None,
+            "last_render_time": self.last_render_time,
+        }
+
+    def warm_up(self):
+        pass
+
+    def _render_interval(self, start_note, interval_name, interval_type):
+        raise NotImplementedError
+
+    def _render_intervals(self, intervals):
+        return [self._render_interval(*interval) for interval in intervals]
+
+    def _record_render_time(self, render_time, num_renders=1):
+        self.num_renders += num_renders
+        self.total_render_time += render_time
+        self.last_render_time = render_time / num_renders
+        logger.debug("%s synthesizer rendered %d interval(s) in %.4f s", self.name, num_renders, render_time)
+
+
+class FluidsynthSynthesizer(Synthesizer):
+    # renders every interval with a separate run of the fluidsynth program
+    # midi data is passed to fluidsynth through an in-memory file,
+    # and raw samples are read from its standard output, so nothing is written to disk
+    name = "fluidsynth"
+
+    def __init__(self):
+        super().__init__()
+        self._load_settings()
+
+    def render_note(self, note):
+        track = MidiTrack(MIDI_BPM)
+        track.set_deltatime(b"\x00")
+        track.play_Note(Note().from_int(note))
+        track.set_deltatime(b"\x48")
+        track.stop_Note(Note().from_int(note))
+        return self._midi_to_samples(MidiFile([track]).get_midi_data())
+
+    def _render_interval(self, start_note, interval_name, interval_type):
+        if interval_type == 0:
+            interval_mingus_object = self._get_harmonic_interval(start_note, interval_name)
+        elif interval_type == 1:
+            interval_mingus_object = self._get_melodic_interval(start_note, interval_name, ascending=True)
+        elif interval_type == 2:
+            interval_mingus_object = self._get_melodic_interval(start_note, interval_name, ascending=False)
+        return self._midi_to_samples(self._get_midi_data(interval_mingus_object))
+
+    def _render_intervals(self, intervals):
+        # all intervals are rendered with a single run of fluidsynth
+        note_events, segments = get_batch_note_events(intervals)
+        samples = self._midi_to_samples(self._get_note_events_midi_data(note_events))
+        return slice_segments(samples, segments, self.sample_rate)
+
+    def _load_settings(self):
+        self.gain = settings.FLUIDSYNTH_GAIN
+        self.sample_rate = settings.FLUIDSYNTH_SAMPLE_RATE
+        self.soundfont_path = settings.SOUNDFONT_PATH
+        self.fluidsynth_path = settings.FLUIDSYNTH_PATH
+
+    def _get_harmonic_interval(self, start_note, interval_name):
+        return get_interval_container(start_note, interval_name)
+
+    def _get_melodic_interval(self, start_note, interval_name, ascending):
+        container = get_interval_container(start_note, interval_name)
+        if len(container.notes) == 1:
+            note_1, note_2 = container.notes[0], container.notes[0]
+        elif ascending:
+            note_1, note_2 = container.notes
+        else:
+            note_2, note_1 = container.notes
+        bar = Bar()
+        bar.place_notes(note_1, 4)
+        bar.place_notes(note_2, 4)
+        return bar
+
+    def _get_midi_data(self, interval_mingus_object):
+        # the same midi data as written by write_NoteContainer and write_Bar from mingus
+        track = MidiTrack(MIDI_BPM)
+        if isinstance(interval_mingus_object, NoteContainer):
+            track.set_deltatime(b"\x00")
+            track.play_NoteContainer(interval_mingus_object)
+            track.set_deltatime(b"\x48")
+            track.stop_NoteContainer(interval_mingus_object)
+        elif isinstance(interval_mingus_object, Bar):
+            track.play_Bar(interval_mingus_object)
+        return MidiFile([track]).get_midi_data()
+
+    def _get_note_events_midi_data(self, note_events):
+        track = MidiTrack(MIDI_BPM)
+        position = 0
+        for event_time, is_note_on, note in get_midi_events(note_events, MIDI_TICKS_PER_QUARTER_NOTE):
+            track.set_deltatime(event_time - position)
+            position = event_time
+            if is_note_on:
+                track.play_Note(Note().from_int(note))
+            else:
+                track.stop_Note(Note().from_int(note))
+        return MidiFile([track]).get_midi_data()
+
+    def _midi_to_samples(self, midi_data):
+        with in_memory_file(midi_data) as midi_file:
+            result = subprocess.run(
+                [
+                    self.fluidsynth_path, '-niq', '-g', str(self.gain), self.soundfont_path, midi_file.path,
+                    '-T', 'raw', '-O', 's16', '-F', '/dev/stdout', '-r', str(self.sample_rate)
+                ],
+                stdout=subprocess.PIPE,
+                pass_fds=midi_file.pass_fds,
+                check=True,
+            )
+        return np.frombuffer(result.stdout, dtype=np.int16).reshape(-1, NUM_CHANNELS)
+
+
+class LibfluidsynthSynthesizer(Synthesizer):
+    # renders note events in process, with the shared library shipped with fluidsynth
+    # the soundfont is loaded only once per process (lazily or by warm_up),
+    # a forked process (e.g. gunicorn or celery worker) creates its own synth on first use
+    name = "libfluidsynth"
+
+    def __init__(self):
+        super().__init__()
+        self._load_settings()
+        self._library = None
+        self._forget_synth()
+        _libfluidsynth_synthesizers.add(self)
+
+    def render_note(self, note):
+        return self.render_note_events([(note, 0)])
+
+    def render_note_events(self, note_events):
+        # note_events are (note, onset) pairs, onset is given in quarter notes
+        midi_events = get_midi_events(note_events, int(NOTE_DURATION * self.sample_rate))
+        with self._lock:
+            self._ensure_synth_exists()
+            tail_length = int(RELEASE_DURATION * self.sample_rate)
+            samples = np.zeros((midi_events[-1][0] + tail_length, NUM_CHANNELS), dtype=np.int16)
+            position = 0
+            for event_time, is_note_on, note in midi_events:
+                self._write_samples(samples[position:event_time])
+                position = event_time
+                if is_note_on:
+                    self._library.fluid_synth_noteon(self._synth, 0, note + MIDI_PITCH_OFFSET, NOTE_VELOCITY)
+                else:
+                    self._library.fluid_synth_noteoff(self._synth, 0, note + MIDI_PITCH_OFFSET)
+            # the release tail, as rendered by fluidsynth program
+            self._write_samples(samples[position:])
+            self._reset()
+        return samples
+
+    def warm_up(self):
+        with self._lock:
+            self._ensure_synth_exists()
+
+    def _render_interval(self, start_note, interval_name, interval_type):
+        return self.render_note_events(get_interval_note_events(start_note, interval_name, interval_type))
+
+    def _render_intervals(self, intervals):
+        # all intervals are rendered in a single session of the synth
+        note_events, segments = get_batch_note_events(intervals)
+        return slice_segments(self.render_note_events(note_events), segments, self.sample_rate)
+
+    def _load_settings(self):
+        self.gain = settings.FLUIDSYNTH_GAIN
+        self.sample_rate = settings.FLUIDSYNTH_SAMPLE_RATE
+        self.soundfont_path = settings.SOUNDFONT_PATH
+        self.library_path = settings.LIBFLUIDSYNTH_PATH or ctypes.util.find_library("fluidsynth")
+
+    def _forget_synth(self):
+        # the synth (and its threads) of the parent process is not reused after fork
+        self._lock = threading.Lock()
+        self._synth = None
+
+    def _ensure_synth_exists(self):
+        if self._synth is not None:
+            return
+        start_time = time.perf_counter()
+        self._library = self._load_library()
+        fluid_settings = self._library.new_fluid_settings()
+        self._library.fluid_settings_setnum(fluid_settings, b"synth.sample-rate", float(self.sample_rate))
+        self._library.fluid_settings_setnum(fluid_settings, b"synth.gain", float(self.gain))
+        synth = self._library.new_fluid_synth(fluid_settings)
+        if self._library.fluid_synth_sfload(synth, str(self.soundfont_path).encode(), 1) < 0:
+            self._library.delete_fluid_synth(synth)
+            self._library.delete_fluid_settings(fluid_settings)
+            raise RuntimeError(f"fluidsynth could not load soundfont: {self.soundfont_path}")
+        self._synth = synth
+        logger.info("libfluidsynth loaded soundfont in %.4f s", time.perf_counter() - start_time)
+
+    def _load_library(self):
+        if self.library_path is None:
+            raise OSError("libfluidsynth not found, set LIBFLUIDSYNTH_PATH")
+        library = ctypes.CDLL(self.library_path)
+        library.new_fluid_settings.restype = ctypes.c_void_p
+        library.fluid_settings_setnum.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_double]
+        library.new_fluid_synth.argtypes = [ctypes.c_void_p]
+        library.new_fluid_synth.restype = ctypes.c_void_p
+        library.delete_fluid_synth.argtypes = [ctypes.c_void_p]
+        library.delete_fluid_settings.argtypes = [ctypes.c_void_p]
+        library.fluid_synth_sfload.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        library.fluid_synth_noteon.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        library.fluid_synth_noteoff.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        library.fluid_synth_system_reset.argtypes = [ctypes.c_void_p]
+        library.fluid_synth_write_s16.argtypes = [
+            ctypes.c_void_p, ctypes.c_int,
+            ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+            ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+        ]
+        return library
+
+    def _write_samples(self, samples):
+        # samples are interleaved: left channel at even, right channel at odd positions
+        if len(samples) == 0:
+            return
+        buffer = samples.ctypes.data_as(ctypes.c_void_p)
+        self._library.fluid_synth_write_s16(self._synth, len(samples), buffer, 0, 2, buffer, 1, 2)
+
+    def _reset(self):
+        # stop all voices and let the reverb die out, so that renders don't affect each other
+        self._library.fluid_synth_system_reset(self._synth)
+        self._write_samples(np.zeros((self.sample_rate, NUM_CHANNELS), dtype=np.int16))
+
+
+# the fork handler is registered once per process, not once per synthesizer,
+# synthesizers which are no longer used (e.g. created by benchmarks or tests) are not kept alive by it
+_libfluidsynth_synthesizers = weakref.WeakSet()
+
+
+def _forget_libfluidsynth_synths():
+    for synthesizer in list(_libfluidsynth_synthesizers):
+        synthesizer._forget_synth()
+
+
+os.register_at_fork(after_in_child=_forget_libfluidsynth_synths)
+
+
+class NoteCacheSynthesizer(Synthesizer):
+    # renders each pitch only once and builds intervals from the cached notes:
+    # harmonic intervals are sums of two notes,
+    # melodic intervals are notes offset by the duration of a quarter note
+    name = "note_cache"
+
+    def __init__(self, note_renderer=None):
+        super().__init__()
+        self.note_renderer = note_renderer or get_synthesizer(settings.AUDIO_NOTE_CACHE_RENDERER)
+        self.sample_rate = settings.FLUIDSYNTH_SAMPLE_RATE
+        self.cache_dir = Path(settings.AUDIO_NOTE_CACHE_DIR)
+        self._notes = {}
+
+    def _render_interval(self, start_note, interval_name, interval_type):
+        note_samples = [
+            (self.get_note(note), onset)
+            for note, onset in get_interval_note_events(start_note, interval_name, interval_type)
+        ]
+        return mix_note_events(note_samples, self.sample_rate)
+
+    def get_note(self, note):
+        if note not in self._notes:
+            self._notes[note] = self._load_note(note)
+        return self._notes[note]
+
+    def warm_up(self):
+        self.note_renderer.warm_up()
+
+    def render_all_notes(self):
+        for midi_pitch in range(NUM_MIDI_PITCHES):
+            self.get_note(midi_pitch - MIDI_PITCH_OFFSET)
+
+    def _load_note(self, note):
+        # rendered notes are also kept on disk, so that they survive restarts
+        path = self.cache_dir / f"note_{note + MIDI_PITCH_OFFSET}_{self._get_config_hash()}.npy"
+        if path.is_file():
+            return np.load(path)
+        samples = self.note_renderer.render_note(note)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp.npy")
+        np.save(temporary_path, samples)
+        temporary_path.replace(path)
+        return samples
+
+    def _get_config_hash(self):
+        config = f"{settings.SOUNDFONT_PATH}|{settings.FLUIDSYNTH_GAIN}|{self.sample_rate}"
+        return hashlib.sha1(config.encode()).hexdigest()[:10]
+
+
+SYNTHESIZERS = {
+    "fluidsynth": FluidsynthSynthesizer,
+    "libfluidsynth": LibfluidsynthSynthesizer,
+    "note_cache": NoteCacheSynthesizer,
+}
+
+# synthesizers are created once per process,
+# so that e.g. the note cache is shared between renders
+_synthesizers = {}
+
+
+def get_synthesizer(name=None):
+    name = name or settings.AUDIO_SYNTHESIZER
+    if name not in _synthesizers:
+        _synthesizers[name] = SYNTHESIZERS[name]()
+    return _synthesizers[name]
@@ -0,0 +1,40 @@
+from django.conf import settings
+
+from exercises.local_executor import LocalExecutor
+
+
+# "celery" - tasks are sent to Celery workers through the broker
+# "local" - tasks run on a pool of background threads of the web server process, no broker is needed
+# "sync" - tasks run immediately, during the request
+TASK_BACKENDS = ["celery", "local", "sync"]
+
+# "high" - tasks a user is waiting for right now (e.g. audio of the question)
+# "normal" - tasks a user will probably wait for soon (e.g. audio of answers)
+# "low" - background work (e.g. preparing questions in advance, pre-generating audio)
+# lower number means higher priority, as in Celery with Redis broker
+TASK_PRIORITIES = {"high": 0, "normal": 3, "low": 9}
+
+
+def get_task_backend():
+    # without TASK_BACKEND setting, the backend is chosen by USE_CELERY setting
+    if settings.TASK_BACKEND:
+        if settings.TASK_BACKEND not in TASK_BACKENDS:
+            raise ValueError(f"Unknown task backend: {settings.TASK_BACKEND}, available: {', '.join(TASK_BACKENDS)}")
+        return settings.TASK_BACKEND
+    return "celery" if settings.USE_CELERY else "sync"
+
+
+def run_task(task, *args, priority="normal"):
+    backend = get_task_backend()
+    if backend == "celery":
+        return task.apply_async(args, priority=TASK_PRIORITIES[priority])
+    if backend == "local":
+        return LocalExecutor.submit(task, *args, priority=TASK_PRIORITIES[priority])
+    return task(*args)
+
+
+def run_task_in_background(task, *args, priority="normal"):
+    # for tasks which shouldn't delay the response even with "sync" backend
+    if get_task_backend() == "sync":
+        return LocalExecutor.submit(task, *args, priority=TASK_PRIORITIES[priority])
+    return run_task(task, *args, priority=priority)
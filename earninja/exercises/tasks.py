@@ -1,50 +1,105 @@
 from pathlib import Path
 
 from celery import shared_task
-from django.core.files import File
-from django.conf import settings
 
-from exercises.models import IntervalInstance
-from exercises.audio_saver import AudioSaver
+from exercises.models import IntervalInstance, IntervalsExercise
+from exercises.audio_render_registry import AudioRenderRegistry
 from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.intervals_question_queue import IntervalsQuestionQueue
 
 
 @shared_task()
 def update_interval_instance_audio(interval_instance_id):
+    with AudioRenderRegistry.render_lock(interval_instance_id) as acquired:
+        if not acquired:
+            # the same audio is being rendered right now by another worker
+            return
+        try:
+            _update_interval_instance_audio(interval_instance_id)
+        finally:
+            # once saved, the audio isn't requested again, a failed render can be requested again
+            AudioRenderRegistry.cancel_render_request(interval_instance_id)
+
+
+def _update_interval_instance_audio(interval_instance_id):
     # retrieve the interval instance object from the database
-    interval_instance = IntervalInstance.objects.get(id=interval_instance_id)
-    
-    # manage paths
+    interval_instance = IntervalInstance.objects.select_related("interval").get(id=interval_instance_id)
+
+    # the mp3 file is written directly to its location in the storage of the audio field
+    # the location depends only on the interval and render settings,
+    # so a file which already exists there (e.g. rendered for another database) is reused
     relative_audio_path = AudioFilePathManager.get_interval_instance_audio_path(interval_instance)
-    absolute_audio_path = Path(settings.MEDIA_ROOT) / relative_audio_path
-    intermediate_audio_path = AudioFilePathManager.get_intermediate_base_path(relative_audio_path)
+    if not interval_instance.audio.storage.exists(relative_audio_path):
+        # the audio stack (numpy, pydub, mingus midi) is imported only when audio is rendered,
+        # so web processes which never render start faster
+        from exercises.audio_saver import AudioSaver
+        audio_saver = AudioSaver(interval_instance.audio.storage.path(relative_audio_path))
+        audio_saver.save_interval_instance_audio(
+            interval_instance.start_note,
+            interval_instance.interval.name,
+            interval_instance.interval.interval_type,
+        )
+
+    # associate the mp3 file with the audio field, without copying it
+    # thanks to django-cleanup app,
+    # a different file previously associated with the audio field is deleted here
+    interval_instance.audio.name = str(relative_audio_path)
+    interval_instance.save(update_fields=["audio"])
+    AudioRenderRegistry.notify_ready(relative_audio_path)
 
-    # generate intermediate files: midi, wav, mp3
-    audio_saver = AudioSaver(intermediate_audio_path)
-    audio_saver.save_interval_instance_audio(
+
+@shared_task()
+def update_interval_instance_renditions(interval_instance_id):
+    # extra renditions of audio which has been streamed to the browser, see StreamingAudioRenderer
+    interval_instance = IntervalInstance.objects.select_related("interval").get(id=interval_instance_id)
+    storage = interval_instance.audio.storage
+    audio_path = Path(storage.path(AudioFilePathManager.get_interval_instance_audio_path(interval_instance)))
+    if all(rendition_path.is_file() for _, rendition_path in AudioFilePathManager.get_renditions(audio_path)):
+        return
+    from exercises.audio_saver import AudioSaver
+    AudioSaver(audio_path).save_interval_instance_renditions(
         interval_instance.start_note,
         interval_instance.interval.name,
         interval_instance.interval.interval_type,
     )
 
-    # delete the old audio file, if it already exists
-    # thanks to django-cleanup app,
-    # the mp3 file should be deleted here, together with audio field value
-    interval_instance.audio.delete()
-    # just in case there was a file with the same name but not associated with the audio field
-    absolute_audio_path.unlink(missing_ok=True)
-
-    # the exists() check helps to prevent creating multiple audio files
-    # for the same interval instance due to race condtitons 
-    # (i.e. due to many tasks for the same interval instance runnning at the same time)
-    if not absolute_audio_path.exists():
-        # associate the "intermediate" mp3 file with the audio field
-        # it copies this file
-        with intermediate_audio_path.with_suffix(".mp3").open(mode="rb") as f:
-            interval_instance.audio = File(f, name=intermediate_audio_path.with_suffix(".mp3").name)
-            interval_instance.save()
-
-    # cleanup
-    # delete the intermediate files
-    # it does not delete the file associated with interval_instance.audio
-    audio_saver.delete_files()
+
+@shared_task()
+def update_interval_audio(start_note, interval_id):
+    # used when questions are not saved as interval instances,
+    # the interval instance is created only when its audio is needed
+    # the render has been requested under the interval, not under the interval instance id
+    try:
+        interval_instance, _ = IntervalInstance.objects.get_or_create(start_note=start_note, interval_id=interval_id)
+        update_interval_instance_audio(interval_instance.id)
+    finally:
+        AudioRenderRegistry.cancel_render_request(f"interval_{start_note}_{interval_id}")
+
+
+@shared_task()
+def update_sprite_pack_audio(start_note, interval_type):
+    render_key = f"sprites_{start_note}_{interval_type}"
+    with AudioRenderRegistry.render_lock(render_key) as acquired:
+        if not acquired:
+            return
+        try:
+            from exercises.audio_sprite_pack_renderer import AudioSpritePackRenderer
+            storage = IntervalInstance._meta.get_field("audio").storage
+            AudioSpritePackRenderer(storage).save_sprite_pack(start_note, interval_type)
+        finally:
+            AudioRenderRegistry.cancel_render_request(render_key)
+
+
+@shared_task()
+def update_interval_instances_audio(interval_instance_ids):
+    # renders audio of many interval instances at once, e.g. when audio files are pre-generated
+    interval_instances = IntervalInstance.objects.select_related("interval").filter(id__in=interval_instance_ids)
+    from exercises.batch_audio_renderer import BatchAudioRenderer
+    BatchAudioRenderer().save_interval_instances_audio(interval_instances)
+
+
+@shared_task()
+def refill_intervals_question_queue(exercise_id):
+    exercise = IntervalsExercise.objects.select_related("settings").get(id=exercise_id)
+    if exercise.settings is not None:
+        IntervalsQuestionQueue(exercise).refill()
@@ -0,0 +1,52 @@
+// keeps recently played audio files in Cache Storage, so they are not downloaded again on next page loads
+// audio files are named after their content, so a cached file never becomes stale
+const CACHE_NAME = "audio-{{ audio_dir_name }}";
+const MAX_NUM_CACHED_FILES = {{ max_num_cached_files }};
+const AUDIO_URL_PREFIXES = [{% for prefix in audio_url_prefixes %}"{{ prefix }}", {% endfor %}];
+
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", event => {
+    // audio rendered with different settings is not needed anymore
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith("audio-") && name !== CACHE_NAME).map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener("fetch", event => {
+    const url = new URL(event.request.url);
+    // partial responses (e.g. when the browser seeks in the audio) can't be cached
+    if (event.request.method !== "GET" || event.request.headers.has("Range") || url.origin !== self.location.origin || !AUDIO_URL_PREFIXES.some(prefix => url.pathname.startsWith(prefix))) {
+        return;
+    }
+    event.respondWith(getAudio(event.request));
+});
+
+const getAudio = async request => {
+    const cache = await caches.open(CACHE_NAME);
+    const cachedResponse = await cache.match(request);
+    if (cachedResponse) {
+        // putting the file again moves it to the end, so the least recently used files are evicted first
+        await cache.put(request, cachedResponse.clone());
+        return cachedResponse;
+    }
+    const response = await fetch(request);
+    // e.g. audio which is still being rendered (404) is not cached
+    if (response.status === 200) {
+        await cache.put(request, response.clone());
+        await evictFiles(cache);
+    }
+    return response;
+}
+
+const evictFiles = async cache => {
+    const requests = await cache.keys();
+    const numExcessFiles = requests.length - MAX_NUM_CACHED_FILES;
+    for (const request of requests.slice(0, Math.max(numExcessFiles, 0))) {
+        await cache.delete(request);
+    }
+}
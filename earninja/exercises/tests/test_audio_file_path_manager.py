@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from exercises.audio_file_path_manager import AudioFilePathManager
 from exercises.models import (
@@ -15,11 +15,47 @@ class AudioFilePathManagerTests(TestCase):
         self.interval_instance_2 = IntervalInstance.objects.create(start_note=4*12 + 5, interval=self.interval_b3)
 
     def test_get_interval_audio_path(self):
+        config_hash = AudioFilePathManager.get_render_config_hash()
         self.assertEqual(
             str(AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_1)), 
-            "audio/interval_instance_1.mp3"
+            f"audio/{config_hash}/interval_48_3_0.mp3"
         )
         self.assertEqual(
             str(AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_2)), 
-            "audio/interval_instance_2.mp3"
+            f"audio/{config_hash}/interval_53_3_0.mp3"
         )
+
+    def test_path_can_be_computed_without_database(self):
+        self.assertEqual(
+            AudioFilePathManager.get_interval_audio_path(4*12, 3, 0),
+            AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_1),
+        )
+
+    def test_path_depends_on_render_settings(self):
+        path = AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_1)
+        for changed_setting in [
+            {"AUDIO_SYNTHESIZER": "other_synthesizer"},
+            {"SOUNDFONT_PATH": "/other.sf2"},
+            {"FLUIDSYNTH_GAIN": 0.3},
+            {"FLUIDSYNTH_SAMPLE_RATE": 22050},
+            {"NUM_DB_LOUDER": 10},
+            {"AUDIO_ENCODING_PROFILE": "mp3_small"},
+            {"AUDIO_EXTRA_RENDITIONS": ["opus"]},
+        ]:
+            with self.settings(**changed_setting):
+                self.assertNotEqual(AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_1), path)
+
+    @override_settings(AUDIO_EXTRA_RENDITIONS=["opus"])
+    def test_renditions(self):
+        path = AudioFilePathManager.get_interval_audio_path(4*12, 3, 0)
+        self.assertListEqual(
+            AudioFilePathManager.get_renditions(path),
+            [("audio/ogg; codecs=opus", path.with_name("interval_48_3_0.opus.opus"))],
+        )
+
+    def test_audio_rendered_with_different_settings_is_not_up_to_date(self):
+        self.assertFalse(AudioFilePathManager.is_audio_up_to_date(self.interval_instance_1))
+        self.interval_instance_1.audio.name = str(AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance_1))
+        self.assertTrue(AudioFilePathManager.is_audio_up_to_date(self.interval_instance_1))
+        with override_settings(NUM_DB_LOUDER=10):
+            self.assertFalse(AudioFilePathManager.is_audio_up_to_date(self.interval_instance_1))
@@ -0,0 +1,93 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase, override_settings
+from django.core.cache import cache
+
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.tasks import update_interval_instance_audio, update_interval_audio
+
+
+class AudioRenderRegistryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_render_requested_once(self):
+        self.assertTrue(AudioRenderRegistry.request_render(1))
+        self.assertFalse(AudioRenderRegistry.request_render(1))
+        self.assertTrue(AudioRenderRegistry.request_render(2))
+        stats = AudioRenderRegistry.get_stats()
+        self.assertEqual(stats["num_requested"], 3)
+        self.assertEqual(stats["num_collapsed_requests"], 1)
+
+    def test_cancelled_render_can_be_requested_again(self):
+        AudioRenderRegistry.request_render(1)
+        AudioRenderRegistry.cancel_render_request(1)
+        self.assertTrue(AudioRenderRegistry.request_render(1))
+
+    def test_render_lock(self):
+        with AudioRenderRegistry.render_lock(1) as acquired:
+            self.assertTrue(acquired)
+            with AudioRenderRegistry.render_lock(1) as acquired_again:
+                self.assertFalse(acquired_again)
+        # the lock is released
+        with AudioRenderRegistry.render_lock(1) as acquired:
+            self.assertTrue(acquired)
+        stats = AudioRenderRegistry.get_stats()
+        self.assertEqual(stats["num_renders"], 2)
+        self.assertEqual(stats["num_collapsed_renders"], 1)
+
+    @override_settings(AUDIO_READY_POLL_INTERVAL=0.01)
+    def test_wait_until_ready(self):
+        storage = Mock()
+        storage.exists.return_value = False
+        self.assertFalse(AudioRenderRegistry.wait_until_ready("audio/interval.mp3", storage, timeout=0.05))
+        AudioRenderRegistry.notify_ready("audio/interval.mp3")
+        self.assertTrue(AudioRenderRegistry.wait_until_ready("audio/interval.mp3", storage, timeout=0.05))
+        # audio saved before anyone waited for it
+        storage.exists.return_value = True
+        self.assertTrue(AudioRenderRegistry.wait_until_ready("audio/other.mp3", storage, timeout=0))
+
+    @override_settings(AUDIO_READY_POLL_INTERVAL=0.01)
+    def test_wait_until_ready_without_signal(self):
+        # e.g. the audio is rendered by a celery worker, which doesn't share the cache
+        storage = Mock()
+        storage.exists.side_effect = [False, False, True]
+        self.assertTrue(AudioRenderRegistry.wait_until_ready("audio/interval.mp3", storage, timeout=10))
+        self.assertEqual(storage.exists.call_count, 3)
+
+    @patch('exercises.tasks._update_interval_instance_audio')
+    def test_task_skipped_while_same_audio_is_rendered(self, mock_update_interval_instance_audio):
+        with AudioRenderRegistry.render_lock(1):
+            update_interval_instance_audio(1)
+        mock_update_interval_instance_audio.assert_not_called()
+        update_interval_instance_audio(1)
+        mock_update_interval_instance_audio.assert_called_once_with(1)
+
+    @patch('exercises.tasks._update_interval_instance_audio', side_effect=RuntimeError)
+    def test_failed_render_can_be_requested_again(self, mock_update_interval_instance_audio):
+        AudioRenderRegistry.request_render(1)
+        with self.assertRaises(RuntimeError):
+            update_interval_instance_audio(1)
+        self.assertTrue(AudioRenderRegistry.request_render(1))
+
+    @patch('exercises.tasks._update_interval_instance_audio')
+    def test_finished_render_can_be_requested_again(self, mock_update_interval_instance_audio):
+        # e.g. after the audio file has been deleted
+        AudioRenderRegistry.request_render(1)
+        update_interval_instance_audio(1)
+        self.assertTrue(AudioRenderRegistry.request_render(1))
+
+    def test_render_with_other_settings_not_collapsed(self):
+        AudioRenderRegistry.request_render(1)
+        with override_settings(NUM_DB_LOUDER=100):
+            self.assertTrue(AudioRenderRegistry.request_render(1))
+        self.assertFalse(AudioRenderRegistry.request_render(1))
+
+    @patch('exercises.tasks.IntervalInstance.objects.get_or_create', return_value=(Mock(id=1), True))
+    @patch('exercises.tasks._update_interval_instance_audio', side_effect=RuntimeError)
+    def test_failed_render_of_interval_can_be_requested_again(self, mock_update_interval_instance_audio, mock_get_or_create):
+        # in stateless question mode, the render is requested under the interval
+        AudioRenderRegistry.request_render("interval_48_2")
+        with self.assertRaises(RuntimeError):
+            update_interval_audio(48, 2)
+        self.assertTrue(AudioRenderRegistry.request_render("interval_48_2"))
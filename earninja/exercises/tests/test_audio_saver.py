@@ -1,7 +1,11 @@
 import shutil
+import subprocess
 from pathlib import Path
+from unittest.mock import Mock, patch
 
-from django.test import SimpleTestCase
+import numpy as np
+
+from django.test import SimpleTestCase, override_settings
 from django.conf import settings
 
 from exercises.audio_saver import AudioSaver
@@ -28,47 +32,111 @@ class AudioSaverTests(SimpleTestCase):
         self._test_save_interval_instance_audio(interval_name="1", interval_type=1)
 
     def _test_save_interval_instance_audio(self, interval_name, interval_type):
-        audio_path = self.test_media_dir / "interval_42"
+        audio_path = self.test_media_dir / "interval_42.mp3"
         audio_saver = AudioSaver(audio_path)
         audio_saver.save_interval_instance_audio(start_note=4*12, interval_name=interval_name, interval_type=interval_type)
 
-        saved_file_path = self.test_media_dir / "interval_42.mid"
-        self.assertTrue(saved_file_path.is_file())
-        self.assertGreaterEqual(saved_file_path.stat().st_size, 5)
-
-        saved_file_path = self.test_media_dir / "interval_42.wav"
-        self.assertTrue(saved_file_path.is_file())
-        self.assertGreaterEqual(saved_file_path.stat().st_size, 500)
-
-        saved_file_path = self.test_media_dir / "interval_42.mp3"
-        self.assertTrue(saved_file_path.is_file())
-        self.assertGreaterEqual(saved_file_path.stat().st_size, 500)
-
-    def test_delete_files(self):
-        file_path = self.test_media_dir / "interval_42.mid"
-        file_path.write_bytes(b"content")
-        self.assertTrue(file_path.is_file())
-
-        file_path = self.test_media_dir / "interval_42.wav"
-        file_path.write_bytes(b"content")
-        self.assertTrue(file_path.is_file())
-        
-        file_path = self.test_media_dir / "interval_42.mp3"
-        file_path.write_bytes(b"content")
-        self.assertTrue(file_path.is_file())
-        
-        audio_path = self.test_media_dir / "interval_42"
+        self.assertTrue(audio_path.is_file())
+        self.assertGreaterEqual(audio_path.stat().st_size, 500)
+        # no intermediate files (midi, wav) are written to disk
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [audio_path])
+
+    def test_save_interval_instance_audio_replaces_existing_file(self):
+        audio_path = self.test_media_dir / "interval_42.mp3"
+        audio_path.write_bytes(b"small file")
         audio_saver = AudioSaver(audio_path)
-        audio_saver.delete_files()
+        audio_saver.save_interval_instance_audio(start_note=4*12, interval_name="5", interval_type=0)
+
+        self.assertGreaterEqual(audio_path.stat().st_size, 500)
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [audio_path])
 
-        file_path = self.test_media_dir / "interval_42.mid"
-        self.assertFalse(file_path.exists())
+    def test_make_louder_clips_samples(self):
+        audio_saver = AudioSaver(self.test_media_dir / "interval_42.mp3")
+        audio_saver.num_db_louder = 20
+        samples = np.array([[100, -100], [10000, -10000]], dtype=np.int16)
+        louder_samples = audio_saver._make_louder(samples)
+        self.assertListEqual(louder_samples.tolist(), [[1000, -1000], [2**15 - 1, -2**15]])
 
-        file_path = self.test_media_dir / "interval_42.wav"
-        self.assertFalse(file_path.exists())
 
-        file_path = self.test_media_dir / "interval_42.mp3"
-        self.assertFalse(file_path.exists())
+@override_settings(AUDIO_STREAM_CHUNK_SIZE=4, NUM_DB_LOUDER=0)
+class AudioSaverStreamingTests(SimpleTestCase):
+    def setUp(self):
+        self.test_media_dir = Path(settings.MEDIA_ROOT) / "test"
+        self.audio_path = self.test_media_dir / "interval_42.mp3"
+        self.audio_saver = AudioSaver(self.audio_path, synthesizer=Mock())
+        self.samples = np.arange(16, dtype=np.int16).reshape(-1, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    # the encoder is replaced with a command which outputs its input unchanged
+    @patch.object(AudioSaver, '_get_encoder_command', return_value=["cat"])
+    def test_stream_samples_yields_chunks_and_saves_file(self, mock_get_encoder_command):
+        chunks = list(self.audio_saver.stream_samples(self.samples))
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+        self.assertEqual(b"".join(chunks), self.samples.tobytes())
+        self.assertEqual(self.audio_path.read_bytes(), self.samples.tobytes())
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [self.audio_path])
+
+    @patch.object(AudioSaver, '_get_encoder_command', return_value=["cat"])
+    def test_closed_stream_saves_nothing(self, mock_get_encoder_command):
+        # e.g. the client has disconnected
+        chunks = self.audio_saver.stream_samples(self.samples)
+        next(chunks)
+        chunks.close()
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [])
+
+    @patch.object(AudioSaver, '_get_encoder_command', return_value=["false"])
+    def test_failed_encoding_saves_nothing(self, mock_get_encoder_command):
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(self.audio_saver.stream_samples(self.samples))
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [])
+
+
+class AudioSaverEncodingProfilesTests(SimpleTestCase):
+    def setUp(self):
+        self.test_media_dir = Path(settings.MEDIA_ROOT) / "test"
+        self.audio_path = self.test_media_dir / "interval_42.mp3"
+        self.samples = np.zeros((16, 2), dtype=np.int16)
 
-        # to make sure that there are no errors if files are already deleted
-        audio_saver.delete_files()
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    def test_encoder_command_of_profile(self):
+        audio_saver = AudioSaver(self.audio_path, synthesizer=Mock())
+        command = audio_saver._get_encoder_command(2, "opus")
+        self.assertListEqual(
+            command[-11:],
+            ['-c:a', 'libopus', '-b:a', '32k', '-ac', '1', '-ar', '48000', '-f', 'ogg', 'pipe:1'],
+        )
+        # ffmpeg's defaults are kept
+        command = audio_saver._get_encoder_command(2, "mp3")
+        self.assertListEqual(command[-5:], ['-c:a', 'libmp3lame', '-f', 'mp3', 'pipe:1'])
+
+    @override_settings(AUDIO_ENCODING_PROFILE="mp3_small")
+    def test_default_profile_from_settings(self):
+        command = AudioSaver(self.audio_path, synthesizer=Mock())._get_encoder_command(2)
+        self.assertIn('48k', command)
+
+    @override_settings(AUDIO_EXTRA_RENDITIONS=["opus", "vorbis"])
+    @patch.object(AudioSaver, 'encode_audio', side_effect=lambda samples, profile_name=None: (profile_name or "mp3").encode())
+    def test_extra_renditions_saved_next_to_audio_file(self, mock_encode_audio):
+        AudioSaver(self.audio_path, synthesizer=Mock()).save_samples(self.samples)
+        self.assertEqual(self.audio_path.read_bytes(), b"mp3")
+        self.assertEqual((self.test_media_dir / "interval_42.opus.opus").read_bytes(), b"opus")
+        self.assertEqual((self.test_media_dir / "interval_42.vorbis.ogg").read_bytes(), b"vorbis")
+        self.assertEqual(len(list(self.test_media_dir.iterdir())), 3)
+
+    @override_settings(AUDIO_EXTRA_RENDITIONS=["opus"])
+    @patch.object(AudioSaver, 'encode_audio', side_effect=lambda samples, profile_name=None: (profile_name or "mp3").encode())
+    @patch.object(AudioSaver, '_get_encoder_command', return_value=["cat"])
+    def test_extra_renditions_not_encoded_while_streaming(self, mock_get_encoder_command, mock_encode_audio):
+        # the stream ends as soon as the mp3 is encoded, renditions are saved separately
+        audio_saver = AudioSaver(self.audio_path, synthesizer=Mock())
+        list(audio_saver.stream_samples(self.samples))
+        mock_encode_audio.assert_not_called()
+        self.assertListEqual(list(self.test_media_dir.iterdir()), [self.audio_path])
+        audio_saver.synthesizer.render_interval.return_value = self.samples
+        audio_saver.save_interval_instance_renditions(42, "5", 0)
+        self.assertEqual((self.test_media_dir / "interval_42.opus.opus").read_bytes(), b"opus")
+        self.assertEqual(self.audio_path.read_bytes(), self.samples.tobytes())
@@ -0,0 +1,66 @@
+import json
+import shutil
+from io import StringIO
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from django.test import SimpleTestCase, override_settings
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from exercises.audio_saver import AudioSaver
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.audio_sprite_pack_renderer import AudioSpritePackRenderer
+from exercises.synthesizers import FluidsynthSynthesizer
+
+
+def render_intervals(intervals):
+    # every interval is rendered as one second of audio
+    return [np.ones((100, 2), dtype=np.int16) for _ in intervals]
+
+
+@override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test", FLUIDSYNTH_SAMPLE_RATE=100)
+@patch.object(AudioSaver, "encode_audio", side_effect=lambda samples, profile_name=None: b"mp3 of %d samples" % len(samples))
+class AudioSpritePackRendererTests(SimpleTestCase):
+    def setUp(self):
+        self.test_media_dir = Path(settings.MEDIA_ROOT)
+        self.synthesizer = Mock()
+        self.synthesizer.render_intervals.side_effect = render_intervals
+        self.renderer = AudioSpritePackRenderer(default_storage, self.synthesizer)
+        self.audio_path = self.test_media_dir / AudioFilePathManager.get_sprite_pack_audio_path(40, 1)
+        self.index_path = self.test_media_dir / AudioFilePathManager.get_sprite_pack_index_path(40, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    def test_all_intervals_rendered_with_single_invocation(self, mock_encode_audio):
+        self.renderer.save_sprite_pack(40, 1)
+        self.synthesizer.render_intervals.assert_called_once()
+        intervals = self.synthesizer.render_intervals.call_args.args[0]
+        self.assertEqual(len(intervals), 13)
+        self.assertIn((40, "b3", 1), intervals)
+
+    def test_intervals_saved_back_to_back_with_index(self, mock_encode_audio):
+        self.renderer.save_sprite_pack(40, 1)
+        # 13 intervals of one second, each followed by half a second of silence
+        self.assertEqual(self.audio_path.read_bytes(), b"mp3 of %d samples" % (13 * 150))
+        index = json.loads(self.index_path.read_text())
+        self.assertListEqual(index["0"], [0.0, 1.0])
+        self.assertListEqual(index["3"], [4.5, 1.0])
+        self.assertListEqual(index["12"], [18.0, 1.0])
+
+    def test_existing_sprite_pack_not_rendered_again(self, mock_encode_audio):
+        self.renderer.save_sprite_pack(40, 1)
+        self.renderer.save_sprite_pack(40, 1)
+        self.synthesizer.render_intervals.assert_called_once()
+
+    @override_settings(AUDIO_SYNTHESIZER="fluidsynth")
+    @patch.object(FluidsynthSynthesizer, "render_intervals", side_effect=render_intervals)
+    def test_render_sprite_packs_command(self, mock_render_intervals, mock_encode_audio):
+        call_command("render_sprite_packs", 3, 3, "--interval-types", "0", stdout=StringIO())
+        self.assertEqual(mock_render_intervals.call_count, 12)
+        for start_note in range(3 * 12, 4 * 12):
+            self.assertTrue(default_storage.exists(AudioFilePathManager.get_sprite_pack_index_path(start_note, 0)))
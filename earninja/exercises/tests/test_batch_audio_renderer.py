@@ -0,0 +1,68 @@
+import shutil
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+from django.conf import settings
+
+from exercises.audio_saver import AudioSaver
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.batch_audio_renderer import BatchAudioRenderer
+from exercises.models import Interval, IntervalInstance
+
+
+@override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test")
+@patch.object(AudioSaver, "encode_audio", side_effect=lambda samples, profile_name=None: b"mp3 of " + bytes([len(samples)]))
+class BatchAudioRendererTests(TestCase):
+    def setUp(self):
+        self.test_media_dir = Path(settings.MEDIA_ROOT)
+        interval_b3 = Interval.objects.create(name="b3", num_semitones=3, interval_type=1)
+        self.interval_instances = [
+            IntervalInstance.objects.create(start_note=start_note, interval=interval_b3)
+            for start_note in range(40, 45)
+        ]
+        self.synthesizer = Mock()
+        self.synthesizer.render_intervals.side_effect = lambda intervals: [
+            np.zeros((start_note, 2), dtype=np.int16) for start_note, _, _ in intervals
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    def test_intervals_rendered_in_batches(self, mock_encode_audio):
+        renderer = BatchAudioRenderer(self.synthesizer, batch_size=2)
+        renderer.save_interval_instances_audio(self.interval_instances)
+        self.assertListEqual(
+            [call.args[0] for call in self.synthesizer.render_intervals.call_args_list],
+            [[(40, "b3", 1), (41, "b3", 1)], [(42, "b3", 1), (43, "b3", 1)], [(44, "b3", 1)]]
+        )
+
+    def test_audio_files_saved_and_associated_with_audio_field(self, mock_encode_audio):
+        renderer = BatchAudioRenderer(self.synthesizer, batch_size=2)
+        renderer.save_interval_instances_audio(self.interval_instances)
+        for interval_instance in self.interval_instances:
+            interval_instance = IntervalInstance.objects.get(id=interval_instance.id)
+            self.assertEqual(
+                interval_instance.audio.name,
+                str(AudioFilePathManager.get_interval_audio_path(interval_instance.start_note, 3, 1)),
+            )
+            # every file contains audio of its own interval instance
+            self.assertEqual(interval_instance.audio.read(), b"mp3 of " + bytes([interval_instance.start_note]))
+            interval_instance.audio.close()
+
+    def test_existing_audio_files_reused(self, mock_encode_audio):
+        # e.g. rendered for another database
+        existing_file_path = self.test_media_dir / AudioFilePathManager.get_interval_audio_path(41, 3, 1)
+        existing_file_path.parent.mkdir(parents=True, exist_ok=True)
+        existing_file_path.write_bytes(b"existing mp3")
+        renderer = BatchAudioRenderer(self.synthesizer, batch_size=10)
+        self.assertEqual(renderer.save_interval_instances_audio(self.interval_instances), 4)
+        self.assertListEqual(
+            [start_note for start_note, _, _ in self.synthesizer.render_intervals.call_args.args[0]],
+            [40, 42, 43, 44]
+        )
+        interval_instance = IntervalInstance.objects.get(id=self.interval_instances[1].id)
+        self.assertEqual(interval_instance.audio.read(), b"existing mp3")
+        interval_instance.audio.close()
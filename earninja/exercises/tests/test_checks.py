@@ -0,0 +1,20 @@
+from django.test import SimpleTestCase, override_settings
+
+from exercises.checks import check_audio_encoding_profiles
+
+
+class CheckAudioEncodingProfilesTests(SimpleTestCase):
+    @override_settings(AUDIO_ENCODING_PROFILE="mp3_small", AUDIO_EXTRA_RENDITIONS=["opus"])
+    def test_mp3_profile_with_extra_renditions(self):
+        self.assertListEqual(check_audio_encoding_profiles(None), [])
+
+    @override_settings(AUDIO_ENCODING_PROFILE="opus")
+    def test_main_profile_must_be_mp3(self):
+        # otherwise ogg data would be saved as *.mp3 and served as audio/mpeg
+        errors = check_audio_encoding_profiles(None)
+        self.assertListEqual([error.id for error in errors], ["exercises.E002"])
+
+    @override_settings(AUDIO_ENCODING_PROFILE="wav", AUDIO_EXTRA_RENDITIONS=["opus", "aac"])
+    def test_unknown_profiles(self):
+        errors = check_audio_encoding_profiles(None)
+        self.assertListEqual([error.id for error in errors], ["exercises.E001", "exercises.E001"])
@@ -0,0 +1,35 @@
+from io import StringIO
+import subprocess
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from exercises.audio_saver import AudioSaver
+
+
+def encode_audio(samples, profile_name=None):
+    if profile_name == "vorbis":
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+    return b"x" * {"mp3": 400, "opus": 100}[profile_name]
+
+
+class EncodingReportCommandTests(SimpleTestCase):
+    @patch.object(AudioSaver, "encode_audio", side_effect=encode_audio)
+    @patch("exercises.management.commands.encoding_report.get_synthesizer")
+    def test_report(self, mock_get_synthesizer, mock_encode_audio):
+        synthesizer = Mock()
+        synthesizer.render_interval.return_value = np.zeros((100, 2), dtype=np.int16)
+        mock_get_synthesizer.return_value = synthesizer
+        out = StringIO()
+        call_command("encoding_report", "--profiles", "mp3", "opus", "vorbis", "--num-intervals", "4", stdout=out)
+        # every interval is synthesized once, and encoded with every profile
+        self.assertEqual(synthesizer.render_interval.call_count, 4)
+        self.assertEqual(mock_encode_audio.call_count, 4 + 4 + 1)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "4 intervals, 400 bytes/interval of raw audio")
+        self.assertTrue(lines[1].startswith("mp3: 400 bytes/interval (100.0% of raw audio)"))
+        self.assertTrue(lines[2].startswith("opus: 100 bytes/interval (25.0% of raw audio)"))
+        self.assertEqual(lines[3], "vorbis: encoding failed, is the codec available in ffmpeg?")
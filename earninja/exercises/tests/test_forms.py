@@ -1,11 +1,11 @@
-from django.test import TestCase
-
 from exercises.forms import IntervalsExerciseSettingsForm
 from exercises.models import IntervalsExerciseSettings, Interval
+from exercises.tests.utils import IntervalCatalogueTestCase
 
 
-class IntervalsExerciseSettingsFormTests(TestCase):
+class IntervalsExerciseSettingsFormTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         self.exercise_settings = IntervalsExerciseSettings.objects.create(
             lowest_octave=3, 
             highest_octave=5,
@@ -0,0 +1,67 @@
+from exercises.interval_catalogue import IntervalCatalogue
+from exercises.models import Interval, IntervalInstance
+from exercises.tests.utils import IntervalCatalogueTestCase
+
+
+class IntervalCatalogueTests(IntervalCatalogueTestCase):
+    def test_get_or_create_intervals_creates_missing_intervals(self):
+        Interval.objects.create(name="b3", num_semitones=3, interval_type=1)
+        intervals = IntervalCatalogue.get_or_create_intervals(["b3", "5"], [0, 1])
+        self.assertListEqual(
+            [(interval.name, interval.interval_type) for interval in intervals],
+            [("b3", 0), ("5", 0), ("b3", 1), ("5", 1)]
+        )
+        self.assertEqual(Interval.objects.count(), 4)
+
+    def test_get_or_create_intervals_keeps_names_of_existing_intervals(self):
+        Interval.objects.create(name="#4", num_semitones=6, interval_type=0)
+        intervals = IntervalCatalogue.get_or_create_intervals(["b5"], [0])
+        self.assertEqual(intervals[0].name, "#4")
+        self.assertEqual(Interval.objects.count(), 1)
+
+    def test_get_or_create_interval_instances_creates_missing_instances(self):
+        intervals = IntervalCatalogue.get_or_create_intervals(["b3", "5"], [0])
+        existing_interval_instance = IntervalInstance.objects.create(start_note=13, interval=intervals[1])
+        interval_instances = IntervalCatalogue.get_or_create_interval_instances(intervals, range(12, 14))
+        self.assertListEqual(
+            [(interval_instance.interval.name, interval_instance.start_note) for interval_instance in interval_instances],
+            [("b3", 12), ("b3", 13), ("5", 12), ("5", 13)]
+        )
+        self.assertEqual(interval_instances[3], existing_interval_instance)
+        self.assertEqual(IntervalInstance.objects.count(), 4)
+
+    def test_number_of_queries_does_not_depend_on_number_of_rows(self):
+        # loading intervals to memory, savepoint, insert, select, release savepoint
+        with self.assertNumQueries(5):
+            intervals = IntervalCatalogue.get_or_create_intervals(["1", "b3", "3", "4", "5"], [0, 1, 2])
+        with self.assertNumQueries(4):
+            interval_instances = IntervalCatalogue.get_or_create_interval_instances(intervals[:2], range(4*12, 5*12))
+        self.assertEqual(len(interval_instances), 2 * 12)
+
+    def test_known_intervals_are_resolved_without_queries(self):
+        intervals = IntervalCatalogue.get_or_create_intervals(["b3", "5"], [0, 1])
+        # created intervals are loaded to memory once
+        with self.assertNumQueries(1):
+            IntervalCatalogue.get_or_create_intervals(["b3", "5"], [0, 1])
+        with self.assertNumQueries(0):
+            self.assertListEqual(IntervalCatalogue.get_or_create_intervals(["b3", "5"], [0, 1]), intervals)
+            self.assertListEqual(IntervalCatalogue.get_intervals([interval.id for interval in intervals]), intervals)
+            self.assertEqual(IntervalCatalogue.get_interval(str(intervals[0].id)), intervals[0])
+
+    def test_intervals_loaded_again_after_change(self):
+        interval = Interval.objects.create(name="b3", num_semitones=3)
+        self.assertEqual(IntervalCatalogue.get_interval(interval.id).name, "b3")
+        interval.name = "#2"
+        interval.save()
+        self.assertEqual(IntervalCatalogue.get_interval(interval.id).name, "#2")
+
+    def test_intervals_created_by_another_process_are_loaded(self):
+        IntervalCatalogue.get_or_create_intervals(["b3"], [0])
+        # bulk_create sends no signals, like a change made by another process
+        interval = Interval.objects.bulk_create([Interval(name="5", num_semitones=7)])[0]
+        with self.assertNumQueries(1):
+            self.assertEqual(IntervalCatalogue.get_interval(interval.id).name, "5")
+
+    def test_missing_interval(self):
+        with self.assertRaises(Interval.DoesNotExist):
+            IntervalCatalogue.get_interval(1)
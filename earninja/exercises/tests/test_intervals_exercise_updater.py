@@ -4,9 +4,10 @@ from unittest.mock import patch
 
 from mingus.containers import Note
 
-from django.test import TestCase, override_settings
+from django.test import override_settings
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files import File
 
 from exercises.models import (
@@ -14,9 +15,14 @@ from exercises.models import (
     IntervalsExerciseSettings,
     Interval,
     IntervalInstance,
+    IntervalAnswer,
     ExerciseScore,
 )
+from exercises.audio_file_path_manager import AudioFilePathManager
 from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.task_backends import TASK_PRIORITIES
+from exercises.tests.utils import IntervalCatalogueTestCase
 
 
 @override_settings(
@@ -26,8 +32,11 @@ from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
 )
-class IntervalsExerciseUpdaterTests(TestCase):
+class IntervalsExerciseUpdaterTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
+        # forget audio renders requested by other tests
+        cache.clear()
         # use test media directory for tests
         self.test_media_dir = Path(settings.MEDIA_ROOT)
         self.test_media_dir.mkdir(parents=True, exist_ok=True)
@@ -92,19 +101,21 @@ class IntervalsExerciseUpdaterTests(TestCase):
     @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
     def test_save_audio_files_with_celery(self, mock_update_interval_instance_audio):
         exercise = self._prepare_exercise_object()       
+        self.updater.exercise.refresh_from_db()
         self.updater.save_audio_files()
-        # update_interval_instance_audio.delay gets called because USE_CELERY=True
+        # update_interval_instance_audio.apply_async gets called because USE_CELERY=True
         # it's called only for intervals b3 and 5
         # bacause interval #4 already has a dummy file associated with audio field
-        self.assertEqual(mock_update_interval_instance_audio.delay.call_count, 2)
-        mock_update_interval_instance_audio.delay.assert_any_call(
-             exercise.answers.get(interval__name="b3").id
+        self.assertEqual(mock_update_interval_instance_audio.apply_async.call_count, 2)
+        # audio of the question (b3) has high priority
+        mock_update_interval_instance_audio.apply_async.assert_any_call(
+             (exercise.answers.get(interval__name="b3").id,), priority=TASK_PRIORITIES["high"]
         )
-        mock_update_interval_instance_audio.delay.assert_any_call(
-             exercise.answers.get(interval__name="5").id
+        mock_update_interval_instance_audio.apply_async.assert_any_call(
+             (exercise.answers.get(interval__name="5").id,), priority=TASK_PRIORITIES["normal"]
         )
     
-    @override_settings(USE_CELERY=False)
+    @override_settings(USE_CELERY=False, AUDIO_RENDER_ANSWERS_IN_BACKGROUND=False)
     @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
     def test_save_audio_files_without_celery(self, mock_update_interval_instance_audio):
         exercise = self._prepare_exercise_object()
@@ -120,6 +131,65 @@ class IntervalsExerciseUpdaterTests(TestCase):
              exercise.answers.get(interval__name="5").id
         )
 
+    @override_settings(AUDIO_RENDER_ON_DEMAND=True)
+    @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
+    def test_save_audio_files_renders_nothing_when_audio_is_rendered_on_demand(self, mock_update_interval_instance_audio):
+        self._prepare_exercise_object()
+        self.updater.save_audio_files()
+        mock_update_interval_instance_audio.assert_not_called()
+        mock_update_interval_instance_audio.apply_async.assert_not_called()
+
+    @override_settings(USE_CELERY=False, AUDIO_RENDER_ANSWERS_IN_BACKGROUND=True)
+    @patch('exercises.task_backends.LocalExecutor')
+    @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
+    def test_save_audio_files_renders_only_question_synchronously(self, mock_update_interval_instance_audio, mock_local_executor):
+        exercise = self._prepare_exercise_object()
+        self.updater.exercise.refresh_from_db()
+        self.updater.save_audio_files()
+        # audio of the question (b3) is rendered during the request
+        mock_update_interval_instance_audio.assert_called_once_with(exercise.question.id)
+        # audio of the other answer without audio file (5) is rendered in the background
+        mock_local_executor.submit.assert_called_once_with(
+            mock_update_interval_instance_audio,
+            exercise.answers.get(interval__name="5").id,
+            priority=TASK_PRIORITIES["normal"],
+        )
+
+    @override_settings(USE_CELERY=True)
+    @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
+    def test_save_audio_files_requests_each_render_once(self, mock_update_interval_instance_audio):
+        self._prepare_exercise_object()
+        self.updater.save_audio_files()
+        # e.g. another user got the same question before the audio was rendered
+        self.updater.save_audio_files()
+        self.assertEqual(mock_update_interval_instance_audio.apply_async.call_count, 2)
+        self.assertEqual(AudioRenderRegistry.get_stats()["num_collapsed_requests"], 2)
+
+    @override_settings(AUDIO_SPRITE_PACKS=True)
+    @patch('exercises.intervals_exercise_updater.update_sprite_pack_audio')
+    @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
+    def test_save_audio_files_requests_sprite_pack(self, mock_update_interval_instance_audio, mock_update_sprite_pack_audio):
+        self._prepare_exercise_object()
+        self.updater.exercise.refresh_from_db()
+        self.assertIsNone(self.updater.get_sprite_pack())
+        with patch('exercises.intervals_exercise_updater.run_task_in_background') as mock_run_task_in_background:
+            self.updater.save_audio_files()
+        mock_run_task_in_background.assert_any_call(mock_update_sprite_pack_audio, 5, 0, priority="normal")
+
+    @override_settings(AUDIO_SPRITE_PACKS=True)
+    @patch('exercises.intervals_exercise_updater.update_interval_instance_audio')
+    def test_save_audio_files_skipped_when_sprite_pack_is_ready(self, mock_update_interval_instance_audio):
+        self._prepare_exercise_object()
+        self.updater.exercise.refresh_from_db()
+        index_path = self.test_media_dir / AudioFilePathManager.get_sprite_pack_index_path(5, 0)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.write_text("{}")
+        sprite_pack = self.updater.get_sprite_pack()
+        self.assertEqual(sprite_pack["index_url"], settings.MEDIA_URL + str(AudioFilePathManager.get_sprite_pack_index_path(5, 0)))
+        self.assertEqual(sprite_pack["audio_url"], settings.MEDIA_URL + str(AudioFilePathManager.get_sprite_pack_audio_path(5, 0)))
+        self.updater.save_audio_files()
+        mock_update_interval_instance_audio.assert_not_called()
+
     def _prepare_exercise_object(self):
         exercise = IntervalsExercise.objects.get(id=self.updater.exercise.id)
         exercise.settings = self.custom_settings
@@ -227,6 +297,50 @@ class IntervalsExerciseUpdaterTests(TestCase):
         self.assertEqual(exercise.score.num_all_answers, 1)
         self.assertEqual(exercise.score.num_correct_answers, 0)
     
+    def test_update_score_is_single_update(self):
+        self.updater.exercise.settings = self.custom_settings
+        self.updater.exercise.save()
+        self.updater.generate_new_question()
+        self.updater.reset_score()
+
+        question = IntervalsExercise.objects.get(id=self.updater.exercise.id).question
+        with self.assertNumQueries(1):
+            self.updater.update_score(question)
+
+    def test_update_score_does_not_write_back_stale_score(self):
+        # the two updates run one after the other, this only checks that score objects loaded
+        # by the requests (e.g. from two tabs) are not saved, so neither update overwrites the other
+        self.updater.exercise.settings = self.custom_settings
+        self.updater.exercise.save()
+        self.updater.generate_new_question()
+        self.updater.reset_score()
+
+        updaters = [
+            IntervalsExerciseUpdater(IntervalsExercise.objects.select_related("score").get(id=self.updater.exercise.id))
+            for _ in range(2)
+        ]
+        # the same question is answered twice, e.g. by a double submit
+        self.assertListEqual([updater.update_score(updater.exercise.question) for updater in updaters], [True, False])
+        for updater in updaters:
+            updater.exercise.save()
+            # the stale score loaded with the exercise is left as it was
+            self.assertEqual(updater.exercise.score.num_all_answers, 0)
+        score = ExerciseScore.objects.get(intervalsexercise=self.updater.exercise)
+        self.assertEqual(score.num_all_answers, 1)
+        self.assertEqual(score.num_correct_answers, 1)
+
+    def test_update_score_ignores_answer_to_previous_question(self):
+        # e.g. given in a stale tab, after a new question has been generated in another tab
+        self.updater.exercise.settings = self.custom_settings
+        self.updater.exercise.save()
+        self.updater.generate_new_question()
+        previous_question_number = self.updater.exercise.question_number
+        self.updater.generate_new_question()
+        self.assertFalse(self.updater.update_score(self.updater.exercise.question, previous_question_number))
+        self.assertTrue(self.updater.update_score(self.updater.exercise.question, previous_question_number + 1))
+        score = ExerciseScore.objects.get(intervalsexercise=self.updater.exercise)
+        self.assertEqual(score.num_all_answers, 1)
+
     def test_reset_score(self):
         self.updater.reset_score()
         score = ExerciseScore.objects.get(intervalsexercise=self.updater.exercise)
@@ -254,3 +368,105 @@ class IntervalsExerciseUpdaterTests(TestCase):
         self.assertListEqual(actual_allowed_interval_names, sorted(['b2', 'b3', '#4', '5']))
         for interval in exercise.settings.allowed_intervals.all():
             self.assertEqual(interval.interval_type, 1)
+
+
+@override_settings(
+    MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
+    INTERVALS_EXERCISE_STATELESS_QUESTIONS=True,
+)
+class StatelessIntervalsExerciseUpdaterTests(IntervalCatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.test_media_dir = Path(settings.MEDIA_ROOT)
+        self.test_media_dir.mkdir(parents=True, exist_ok=True)
+        self.custom_settings = IntervalsExerciseSettings.objects.create(lowest_octave=3, highest_octave=3)
+        self.custom_settings.allowed_intervals.set([
+            Interval.objects.create(name="b3", num_semitones=3),
+            Interval.objects.create(name="#4", num_semitones=6),
+            Interval.objects.create(name="5", num_semitones=7)
+        ])
+        User = get_user_model()
+        test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
+        exercise = IntervalsExercise.objects.create(user=test_user, settings=self.custom_settings)
+        self.updater = IntervalsExerciseUpdater(exercise)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir)
+
+    @patch.object(IntervalsExerciseUpdater, '_get_random_start_note', return_value=40)
+    def test_generate_new_question_is_single_update(self, mock_get_random_start_note):
+        # allowed intervals, random interval, update of the exercise
+        with self.assertNumQueries(3):
+            self.updater.generate_new_question()
+        exercise = IntervalsExercise.objects.get(id=self.updater.exercise.id)
+        self.assertEqual(exercise.question_start_note, 40)
+        self.assertIn(exercise.question_interval, self.custom_settings.allowed_intervals.all())
+        self.assertCountEqual(
+            exercise.question_answer_interval_ids,
+            self.custom_settings.allowed_intervals.values_list("id", flat=True),
+        )
+        self.assertIsNone(exercise.question)
+        self.assertEqual(IntervalInstance.objects.count(), 0)
+
+    def test_question_and_answers_are_not_saved(self):
+        self.updater.generate_new_question()
+        question = self.updater.get_question()
+        answers = self.updater.get_answers()
+        self.assertIsNone(question.id)
+        self.assertListEqual([answer.interval.name for answer in answers], ["b3", "#4", "5"])
+        self.assertIn(question.interval_id, [answer.answer_id for answer in answers])
+        for answer in answers:
+            self.assertEqual(answer.start_note, question.start_note)
+            self.assertFalse(answer.has_up_to_date_audio())
+
+    def test_answers_with_rendered_audio(self):
+        self.updater.generate_new_question()
+        question = self.updater.get_question()
+        audio_path = Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_interval_instance_audio_path(question)
+        audio_path.parent.mkdir(parents=True, exist_ok=True)
+        audio_path.write_bytes(b"small file")
+        answer = next(answer for answer in self.updater.get_answers() if answer.interval_id == question.interval_id)
+        self.assertTrue(answer.has_up_to_date_audio())
+
+    def test_update_score(self):
+        self.updater.generate_new_question()
+        question_interval_id = self.updater.exercise.question_interval_id
+        wrong_answer_id = next(
+            interval_id for interval_id in self.updater.exercise.question_answer_interval_ids
+            if interval_id != question_interval_id
+        )
+        for answer_id in [question_interval_id, wrong_answer_id]:
+            user_answer = self.updater.get_user_answer(str(answer_id))
+            self.assertEqual(user_answer.is_correct, answer_id == question_interval_id)
+            self.updater.update_score(user_answer.interval_instance)
+        # only the first answer to the question is counted
+        score = IntervalsExercise.objects.get(id=self.updater.exercise.id).score
+        self.assertEqual(score.num_all_answers, 1)
+        self.assertEqual(score.num_correct_answers, 1)
+        self.updater.generate_new_question()
+        wrong_answer_id = next(
+            interval_id for interval_id in self.updater.exercise.question_answer_interval_ids
+            if interval_id != self.updater.exercise.question_interval_id
+        )
+        self.updater.update_score(self.updater.get_user_answer(str(wrong_answer_id)).interval_instance)
+        score = IntervalsExercise.objects.get(id=self.updater.exercise.id).score
+        self.assertEqual(score.num_all_answers, 2)
+        self.assertEqual(score.num_correct_answers, 1)
+
+    def test_get_user_answer_rejects_interval_outside_of_answers(self):
+        self.updater.generate_new_question()
+        with self.assertRaises(IntervalAnswer.DoesNotExist):
+            self.updater.get_user_answer(Interval.objects.create(name="2", num_semitones=2).id)
+
+    @override_settings(USE_CELERY=True)
+    @patch('exercises.intervals_exercise_updater.update_interval_audio')
+    def test_save_audio_files(self, mock_update_interval_audio):
+        self.updater.generate_new_question()
+        self.updater.save_audio_files()
+        self.updater.save_audio_files()
+        self.assertEqual(mock_update_interval_audio.apply_async.call_count, 3)
+        mock_update_interval_audio.apply_async.assert_any_call(
+            (self.updater.exercise.question_start_note, self.updater.exercise.question_interval_id),
+            priority=TASK_PRIORITIES["high"],
+        )
@@ -0,0 +1,112 @@
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.contrib.auth import get_user_model
+from django.conf import settings
+
+from exercises.models import (
+    IntervalsExercise,
+    IntervalsExerciseSettings,
+    Interval,
+    IntervalInstance,
+    QueuedIntervalsQuestion,
+)
+from exercises.batch_audio_renderer import BatchAudioRenderer
+from exercises.intervals_question_queue import IntervalsQuestionQueue
+from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.tests.utils import IntervalCatalogueTestCase, save_dummy_audio
+
+
+@override_settings(
+    MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=3,
+)
+@patch.object(BatchAudioRenderer, 'save_interval_instances_audio', autospec=True, side_effect=save_dummy_audio)
+class IntervalsQuestionQueueTests(IntervalCatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_media_dir = Path(settings.MEDIA_ROOT)
+        self.exercise_settings = IntervalsExerciseSettings.objects.create(lowest_octave=3, highest_octave=3)
+        self.exercise_settings.allowed_intervals.set([
+            Interval.objects.create(name="b3", num_semitones=3),
+            Interval.objects.create(name="5", num_semitones=7),
+        ])
+        User = get_user_model()
+        test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
+        self.exercise = IntervalsExercise.objects.create(user=test_user, settings=self.exercise_settings)
+        self.queue = IntervalsQuestionQueue(self.exercise)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    def test_refill_fills_queue_with_questions_with_audio_of_answers(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        queued_questions = self.exercise.queued_questions.all()
+        self.assertEqual(queued_questions.count(), 3)
+        for queued_question in queued_questions:
+            self.assertIn(queued_question.question.start_note, range(3*12, 4*12))
+            answers = IntervalInstance.objects.filter(start_note=queued_question.question.start_note)
+            self.assertEqual(answers.count(), 2)
+            for answer in answers:
+                self.assertTrue(answer.audio)
+
+    def test_refill_adds_only_missing_questions(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        self.queue.pop()
+        self.queue.refill()
+        self.assertEqual(self.exercise.queued_questions.count(), 3)
+
+    def test_concurrent_refill_is_skipped(self, mock_save_interval_instances_audio):
+        with IntervalsQuestionQueue(self.exercise).refill_lock() as acquired:
+            self.assertTrue(acquired)
+            # another refill of the same exercise is running
+            self.queue.refill()
+        self.assertEqual(self.exercise.queued_questions.count(), 0)
+        self.queue.refill()
+        self.assertEqual(self.exercise.queued_questions.count(), 3)
+
+    def test_refill_not_counted_as_audio_render(self, mock_save_interval_instances_audio):
+        stats = AudioRenderRegistry.get_stats()
+        self.queue.refill()
+        self.assertEqual(AudioRenderRegistry.get_stats(), stats)
+
+    def test_pop_returns_questions_in_order(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        questions = [queued_question.question for queued_question in self.exercise.queued_questions.all()]
+        self.assertListEqual([self.queue.pop() for _ in range(4)], questions + [None])
+
+    def test_pop_drops_questions_not_matching_settings(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        self.exercise_settings.lowest_octave = 4
+        self.exercise_settings.highest_octave = 4
+        self.exercise_settings.save()
+        self.assertIsNone(self.queue.pop())
+        self.assertEqual(QueuedIntervalsQuestion.objects.count(), 0)
+
+    def test_generate_new_question_uses_queued_question(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        queued_question = self.exercise.queued_questions.first().question
+        updater = IntervalsExerciseUpdater(self.exercise)
+        updater.generate_new_question()
+        exercise = IntervalsExercise.objects.get(id=self.exercise.id)
+        self.assertEqual(exercise.question, queued_question)
+        self.assertEqual(exercise.answers.count(), 2)
+        self.assertEqual(exercise.answers.get(intervalanswer__is_correct=True), queued_question)
+        self.assertEqual(exercise.queued_questions.count(), 2)
+
+    def test_changing_settings_clears_queue(self, mock_save_interval_instances_audio):
+        self.queue.refill()
+        IntervalsExerciseUpdater(self.exercise).set_allowed_intervals(["b3"], 0)
+        self.assertEqual(self.exercise.queued_questions.count(), 0)
+        self.queue.refill()
+        IntervalsExerciseUpdater(self.exercise).set_default_settings()
+        self.assertEqual(self.exercise.queued_questions.count(), 0)
+
+    @override_settings(INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0)
+    def test_queue_disabled(self, mock_save_interval_instances_audio):
+        IntervalsQuestionQueue(self.exercise).refill()
+        self.assertEqual(self.exercise.queued_questions.count(), 0)
+        mock_save_interval_instances_audio.assert_not_called()
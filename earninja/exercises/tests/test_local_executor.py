@@ -0,0 +1,85 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase, override_settings
+
+from exercises.local_executor import LocalExecutor
+
+
+@override_settings(LOCAL_EXECUTOR_MAX_WORKERS=1, LOCAL_EXECUTOR_MAX_RETRIES=2, LOCAL_EXECUTOR_RETRY_DELAY=0)
+class LocalExecutorTests(SimpleTestCase):
+    def setUp(self):
+        LocalExecutor._forget_workers()
+
+    def tearDown(self):
+        LocalExecutor._forget_workers()
+
+    def _wait_until_done(self):
+        for _ in range(500):
+            if LocalExecutor.get_queue_depth() == 0:
+                return
+            time.sleep(0.01)
+        self.fail("tasks haven't finished")
+
+    def test_task_runs_in_background(self):
+        task = Mock()
+        self.assertTrue(LocalExecutor.submit(task, 1, 2))
+        self._wait_until_done()
+        task.assert_called_once_with(1, 2)
+        self.assertEqual(LocalExecutor.get_stats()["num_completed"], 1)
+
+    def test_pending_task_is_not_submitted_twice(self):
+        task_started = threading.Event()
+        release_task = threading.Event()
+        blocking_task = Mock(side_effect=lambda: task_started.set() or release_task.wait(5))
+        task = Mock()
+        LocalExecutor.submit(blocking_task)
+        task_started.wait(5)
+        # the task is queued behind the running task
+        self.assertTrue(LocalExecutor.submit(task, 1))
+        self.assertFalse(LocalExecutor.submit(task, 1))
+        self.assertTrue(LocalExecutor.submit(task, 2))
+        self.assertEqual(LocalExecutor.get_queue_depth(), 3)
+        release_task.set()
+        self._wait_until_done()
+        self.assertEqual(task.call_count, 2)
+        stats = LocalExecutor.get_stats()
+        self.assertEqual(stats["num_submitted"], 3)
+        self.assertEqual(stats["num_deduplicated"], 1)
+        # finished task can be submitted again
+        self.assertTrue(LocalExecutor.submit(task, 1))
+
+    def test_tasks_run_in_order_of_priority(self):
+        task_started = threading.Event()
+        release_task = threading.Event()
+        blocking_task = Mock(side_effect=lambda: task_started.set() or release_task.wait(5))
+        calls = []
+        task = Mock(side_effect=calls.append)
+        LocalExecutor.submit(blocking_task)
+        task_started.wait(5)
+        LocalExecutor.submit(task, "low 1", priority=9)
+        LocalExecutor.submit(task, "normal", priority=3)
+        LocalExecutor.submit(task, "low 2", priority=9)
+        LocalExecutor.submit(task, "high", priority=0)
+        release_task.set()
+        self._wait_until_done()
+        self.assertListEqual(calls, ["high", "normal", "low 1", "low 2"])
+
+    def test_failed_task_is_retried(self):
+        task = Mock(side_effect=[RuntimeError, None])
+        LocalExecutor.submit(task)
+        self._wait_until_done()
+        self.assertEqual(task.call_count, 2)
+        stats = LocalExecutor.get_stats()
+        self.assertEqual(stats["num_retried"], 1)
+        self.assertEqual(stats["num_completed"], 1)
+        self.assertEqual(stats["num_failed"], 0)
+
+    def test_task_given_up_after_max_retries(self):
+        task = Mock(side_effect=RuntimeError)
+        with self.assertLogs("exercises.local_executor", level="ERROR"):
+            LocalExecutor.submit(task)
+            self._wait_until_done()
+        self.assertEqual(task.call_count, 3)
+        self.assertEqual(LocalExecutor.get_stats()["num_failed"], 1)
@@ -0,0 +1,103 @@
+import gzip
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+
+
+@override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test")
+class AudioFilesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.audio_dir = Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_audio_dir()
+        self.audio_dir.mkdir(parents=True)
+        (self.audio_dir / "interval_40_7_0.mp3").write_bytes(b"0123456789")
+        self.audio_url = f"{AudioFilePathManager.get_audio_dir_url()}interval_40_7_0.mp3"
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT)
+
+    def test_audio_file_is_served_with_caching_headers(self):
+        response = self.client.get(self.audio_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn(f"max-age={settings.AUDIO_CACHE_MAX_AGE}", response["Cache-Control"])
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_conditional_request(self):
+        etag = self.client.get(self.audio_url)["ETag"]
+        response = self.client.get(self.audio_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_range_request(self):
+        response = self.client.get(self.audio_url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        # the last bytes of the file
+        response = self.client.get(self.audio_url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+        response = self.client.get(self.audio_url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_range_of_different_version_is_ignored(self):
+        response = self.client.get(self.audio_url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_precompressed_variant(self):
+        index = b'{"7": [0, 1.5]}'
+        (self.audio_dir / "sprites_40_0.json").write_bytes(index)
+        (self.audio_dir / "sprites_40_0.json.gz").write_bytes(gzip.compress(index))
+        index_url = f"{AudioFilePathManager.get_audio_dir_url()}sprites_40_0.json"
+        response = self.client.get(index_url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), index)
+        self.assertIn("Accept-Encoding", response["Vary"])
+        response = self.client.get(index_url)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), index)
+
+    @override_settings(AUDIO_EXTRA_RENDITIONS=["opus"])
+    def test_rendition_chosen_by_accept_header(self):
+        # the audio directory depends on encoding profiles
+        audio_dir = Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_audio_dir()
+        audio_dir.mkdir(parents=True)
+        (audio_dir / "interval_40_7_0.mp3").write_bytes(b"mp3")
+        (audio_dir / "interval_40_7_0.opus.opus").write_bytes(b"opus")
+        audio_url = f"{AudioFilePathManager.get_audio_dir_url()}interval_40_7_0.mp3"
+        response = self.client.get(audio_url, HTTP_ACCEPT="audio/ogg;codecs=opus, audio/mpeg")
+        self.assertEqual(b"".join(response.streaming_content), b"opus")
+        self.assertEqual(response["Content-Type"], "audio/ogg; codecs=opus")
+        self.assertIn("Accept", response["Vary"])
+        # browsers which don't ask for it explicitly get the mp3
+        for accept in ["*/*", "audio/ogg; codecs=opus; q=0, audio/mpeg"]:
+            response = self.client.get(audio_url, HTTP_ACCEPT=accept)
+            self.assertEqual(b"".join(response.streaming_content), b"mp3")
+            self.assertEqual(response["Content-Type"], "audio/mpeg")
+
+    def test_missing_and_temporary_files_are_not_served(self):
+        # e.g. audio which is still being rendered
+        (self.audio_dir / ".interval_40_3_0.part").write_bytes(b"012")
+        response = self.client.get(f"{AudioFilePathManager.get_audio_dir_url()}.interval_40_3_0.part")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"{AudioFilePathManager.get_audio_dir_url()}interval_40_3_0.mp3")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+    @override_settings(AUDIO_SERVE_FILES=False)
+    def test_serving_can_be_disabled(self):
+        # the web server serves media files instead
+        response = self.client.get(self.audio_url)
+        self.assertEqual(response.status_code, 404)
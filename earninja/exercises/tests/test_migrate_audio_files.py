@@ -0,0 +1,80 @@
+import shutil
+from io import StringIO
+from pathlib import Path
+
+from django.test import TransactionTestCase, override_settings
+from django.conf import settings
+from django.core.management import call_command
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.models import Interval, IntervalInstance
+
+
+@override_settings(
+    MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
+    AUDIO_SYNTHESIZER="fluidsynth",
+    AUDIO_ENCODING_PROFILE="mp3",
+    AUDIO_EXTRA_RENDITIONS=[],
+)
+class MigrateAudioFilesCommandTests(TransactionTestCase):
+    def setUp(self):
+        self.test_media_dir = Path(settings.MEDIA_ROOT)
+        interval_b3 = Interval.objects.create(name="b3", num_semitones=3)
+        self.interval_instances = [
+            IntervalInstance.objects.create(start_note=start_note, interval=interval_b3)
+            for start_note in range(40, 43)
+        ]
+        for interval_instance in self.interval_instances:
+            legacy_file_path = self.test_media_dir / "audio" / f"interval_instance_{interval_instance.id}.mp3"
+            legacy_file_path.parent.mkdir(parents=True, exist_ok=True)
+            legacy_file_path.write_bytes(b"mp3 of " + bytes([interval_instance.start_note]))
+            interval_instance.audio.name = f"audio/{legacy_file_path.name}"
+            interval_instance.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_media_dir, ignore_errors=True)
+
+    def test_files_moved_to_new_paths(self):
+        output = StringIO()
+        call_command("migrate_audio_files", stdout=output)
+        self.assertIn("Migrated 3 audio files", output.getvalue())
+        for interval_instance in IntervalInstance.objects.all():
+            self.assertTrue(interval_instance.has_up_to_date_audio())
+            self.assertEqual(interval_instance.audio.read(), b"mp3 of " + bytes([interval_instance.start_note]))
+            interval_instance.audio.close()
+        # old files are removed
+        self.assertListEqual(list((self.test_media_dir / "audio").glob("*.mp3")), [])
+
+    def test_missing_files_are_rendered_again(self):
+        (self.test_media_dir / "audio" / f"interval_instance_{self.interval_instances[0].id}.mp3").unlink()
+        output = StringIO()
+        call_command("migrate_audio_files", stdout=output)
+        self.assertIn("Migrated 2 audio files", output.getvalue())
+        self.assertEqual(IntervalInstance.objects.get(id=self.interval_instances[0].id).audio.name, "")
+
+    def test_limit(self):
+        call_command("migrate_audio_files", "--limit", "1", stdout=StringIO())
+        migrated = [interval_instance.has_up_to_date_audio() for interval_instance in IntervalInstance.objects.order_by("id")]
+        self.assertListEqual(migrated, [True, False, False])
+        self.assertEqual(
+            Path(AudioFilePathManager.get_audio_dir()),
+            Path("audio") / AudioFilePathManager.get_render_config_hash(),
+        )
+
+    @override_settings(AUDIO_SYNTHESIZER="note_cache")
+    def test_files_rendered_with_other_settings_kept_under_their_settings(self):
+        output = StringIO()
+        errors = StringIO()
+        call_command("migrate_audio_files", stdout=output, stderr=errors)
+        self.assertIn("Migrated 3 audio files", output.getvalue())
+        self.assertIn("will be rendered again", errors.getvalue())
+        legacy_audio_dir = Path("audio") / AudioFilePathManager.get_legacy_render_config_hash()
+        self.assertNotEqual(legacy_audio_dir, AudioFilePathManager.get_audio_dir())
+        for interval_instance in IntervalInstance.objects.all():
+            self.assertEqual(
+                interval_instance.audio.name,
+                str(legacy_audio_dir / f"interval_{interval_instance.start_note}_3_0.mp3"),
+            )
+            self.assertFalse(interval_instance.has_up_to_date_audio())
+            self.assertEqual(interval_instance.audio.read(), b"mp3 of " + bytes([interval_instance.start_note]))
+            interval_instance.audio.close()
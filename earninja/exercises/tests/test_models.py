@@ -1,6 +1,7 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 
+from exercises.audio_file_path_manager import AudioFilePathManager
 from exercises.models import (
     Interval,
     IntervalInstance,
@@ -45,8 +46,29 @@ class IntervalInstanceModelTests(TestCase):
         interval_instance_1 = IntervalInstance.objects.get(id=1)
         interval_instance_2 = IntervalInstance.objects.get(id=2)
 
-        self.assertEqual(interval_instance_1.get_audio_url(), "/media/audio/interval_instance_1.mp3")
-        self.assertEqual(interval_instance_2.get_audio_url(), "/media/audio/interval_instance_2.mp3")
+        config_hash = AudioFilePathManager.get_render_config_hash()
+        self.assertEqual(interval_instance_1.get_audio_url(), f"/media/audio/{config_hash}/interval_48_3_0.mp3")
+        self.assertEqual(interval_instance_2.get_audio_url(), f"/media/audio/{config_hash}/interval_30_3_0.mp3")
+
+    def test_get_audio_ready_url(self):
+        interval_instance = IntervalInstance.objects.get(id=1)
+        self.assertEqual(interval_instance.get_audio_ready_url(), "/audio-ready/48/3/0/")
+        # start notes of the lowest octave (-1) are negative
+        interval_instance = IntervalInstance(start_note=-7, interval=self.interval_b3)
+        self.assertEqual(interval_instance.get_audio_ready_url(), "/audio-ready/-7/3/0/")
+        interval_instance.audio.name = str(AudioFilePathManager.get_interval_instance_audio_path(interval_instance))
+        self.assertIsNone(interval_instance.get_audio_ready_url())
+
+    @override_settings(AUDIO_RENDER_ON_DEMAND=True)
+    def test_get_audio_url_of_audio_rendered_on_demand(self):
+        interval_instance = IntervalInstance.objects.get(id=1)
+
+        config_hash = AudioFilePathManager.get_render_config_hash()
+        self.assertEqual(interval_instance.get_audio_url(), f"/audio/{config_hash}/48/3/0.mp3")
+        interval_instance = IntervalInstance(start_note=-7, interval=self.interval_b3)
+        self.assertEqual(interval_instance.get_audio_url(), f"/audio/{config_hash}/-7/3/0.mp3")
+        # the browser doesn't need to wait for the render
+        self.assertIsNone(interval_instance.get_audio_ready_url())
 
 
 class IntervalsExerciseModelTests(TestCase):
@@ -1,6 +1,9 @@
 from django.test import SimpleTestCase
 
 from exercises.music_theory_utils import (
+    INTERVAL_NAMES,
+    NUM_MIDI_NOTES,
+    get_interval_notes,
     get_interval_container,
     get_num_semitones,
     get_interval_long_name,
@@ -8,7 +11,7 @@ from exercises.music_theory_utils import (
     get_interval_choices,
     get_interval_type_choices,
 )
-from mingus.containers import Note
+from mingus.containers import Note, NoteContainer
 
 
 class MusicTheoryUtilsTests(SimpleTestCase):
@@ -83,3 +86,42 @@ class MusicTheoryUtilsTests(SimpleTestCase):
             get_interval_type_choices(), 
             [(0, 'harmonic'), (1, 'melodic ascending'), (2, 'melodic descending')]
         )
+
+    def test_get_interval_notes(self):
+        self.assertTupleEqual(get_interval_notes(3*12 + 4, "b7"), (3*12 + 4, 4*12 + 2))
+        self.assertTupleEqual(get_interval_notes(4*12, "1"), (4*12,))
+
+    def test_get_num_semitones_for_alternative_interval_names(self):
+        self.assertEqual(get_num_semitones("b5"), 6)
+        self.assertEqual(get_num_semitones("#2"), 3)
+
+
+class MusicTheoryUtilsMatchMingusTests(SimpleTestCase):
+    # lookup tables give the same results as computing them with mingus objects
+    def test_interval_notes(self):
+        for interval_name in INTERVAL_NAMES:
+            for start_note in range(NUM_MIDI_NOTES - 12):
+                if interval_name == '8':
+                    mingus_notes = [start_note, start_note + 12]
+                else:
+                    mingus_notes = NoteContainer().from_interval(Note().from_int(start_note), interval_name).notes
+                self.assertListEqual(
+                    list(get_interval_notes(start_note, interval_name)),
+                    [int(note) for note in mingus_notes],
+                )
+
+    def test_num_semitones(self):
+        for interval_name in INTERVAL_NAMES[1:-1]:
+            low_note, high_note = NoteContainer().from_interval(Note(), interval_name).notes
+            self.assertEqual(get_num_semitones(interval_name), low_note.measure(high_note))
+
+    def test_interval_long_names(self):
+        for interval_name in INTERVAL_NAMES[1:-1]:
+            self.assertEqual(
+                get_interval_long_name(interval_name),
+                NoteContainer().from_interval(Note(), interval_name).determine()[0],
+            )
+
+    def test_note_names(self):
+        for note in range(-12, NUM_MIDI_NOTES + 12):
+            self.assertEqual(get_note_name(note), str(Note().from_int(note)).replace("'", ""))
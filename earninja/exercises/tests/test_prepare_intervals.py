@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+from io import StringIO
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.core.management import call_command
+
+from exercises.batch_audio_renderer import BatchAudioRenderer
+from exercises.management.commands import prepare_intervals
+from exercises.models import Interval, IntervalInstance
+from exercises.tests.utils import IntervalCatalogueTestCase, save_dummy_audio
+
+
+class SynchronousExecutor:
+    # runs batches in the test process, so that they use the test database
+    def __init__(self, max_workers, initializer):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@override_settings(
+    INTERVALS_EXERCISE_DEFAULT_LOWEST_OCTAVE=1,
+    INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=1,
+    INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["b3", "5"],
+    INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=1,
+)
+@patch.object(BatchAudioRenderer, "save_interval_instances_audio", autospec=True, side_effect=save_dummy_audio)
+class PrepareIntervalsCommandTests(IntervalCatalogueTestCase):
+    def test_interval_instances_created_for_all_intervals(self, mock_save_interval_instances_audio):
+        call_command("prepare_intervals", 0, 1, stdout=StringIO())
+        self.assertEqual(Interval.objects.count(), 13 * 3)
+        self.assertEqual(IntervalInstance.objects.count(), 13 * 3 * 24)
+        self.assertFalse(IntervalInstance.objects.filter(audio="").exists())
+
+    def test_default_intervals_rendered_first(self, mock_save_interval_instances_audio):
+        call_command("prepare_intervals", 0, 1, "--batch-size", "24", stdout=StringIO())
+        first_batch = mock_save_interval_instances_audio.call_args_list[0].args[1]
+        self.assertEqual(len(first_batch), 24)
+        for interval_instance in first_batch:
+            self.assertIn(interval_instance.interval.name, ["b3", "5"])
+            self.assertEqual(interval_instance.interval.interval_type, 1)
+            self.assertGreaterEqual(interval_instance.start_note, 12)
+        second_batch = mock_save_interval_instances_audio.call_args_list[1].args[1]
+        for interval_instance in second_batch:
+            self.assertGreaterEqual(interval_instance.start_note, 12)
+
+    def test_rerun_renders_only_missing_audio(self, mock_save_interval_instances_audio):
+        call_command("prepare_intervals", 0, 0, stdout=StringIO())
+        num_calls = mock_save_interval_instances_audio.call_count
+        output = StringIO()
+        call_command("prepare_intervals", 0, 0, stdout=output)
+        self.assertEqual(mock_save_interval_instances_audio.call_count, num_calls)
+        self.assertIn("0 interval instances without audio", output.getvalue())
+
+    def test_stops_when_time_budget_exceeded(self, mock_save_interval_instances_audio):
+        output = StringIO()
+        call_command("prepare_intervals", 0, 1, "--time-budget", "0", stdout=output)
+        mock_save_interval_instances_audio.assert_not_called()
+        self.assertIn("Time budget exceeded", output.getvalue())
+        self.assertTrue(IntervalInstance.objects.filter(audio="").exists())
+
+    @patch.object(prepare_intervals, "ProcessPoolExecutor", SynchronousExecutor)
+    def test_all_batches_rendered_by_parallel_jobs(self, mock_save_interval_instances_audio):
+        output = StringIO()
+        call_command("prepare_intervals", 0, 0, "--jobs", "2", "--batch-size", "100", stdout=output)
+        self.assertEqual(mock_save_interval_instances_audio.call_count, 5)
+        self.assertFalse(IntervalInstance.objects.filter(audio="").exists())
+        self.assertIn("Rendered audio of 468 interval instances", output.getvalue())
+
+    def test_reused_audio_files_reported_separately(self, mock_save_interval_instances_audio):
+        # the first interval instance of every batch already has an audio file
+        mock_save_interval_instances_audio.side_effect = (
+            lambda renderer, interval_instances: save_dummy_audio(renderer, interval_instances) - 1
+        )
+        output = StringIO()
+        call_command("prepare_intervals", 0, 0, "--batch-size", "100", stdout=output)
+        self.assertIn("Rendered audio of 463 interval instances", output.getvalue())
+        self.assertIn("reused 5 existing audio files", output.getvalue())
+
+    def test_batch_not_started_when_it_would_exceed_cpu_budget(self, mock_save_interval_instances_audio):
+        cpu_time = [0.0]
+
+        def render_using_cpu_second(renderer, interval_instances):
+            cpu_time[0] += 1
+            return save_dummy_audio(renderer, interval_instances)
+
+        mock_save_interval_instances_audio.side_effect = render_using_cpu_second
+        output = StringIO()
+        with patch.object(prepare_intervals, "get_cpu_time", lambda: cpu_time[0]):
+            call_command("prepare_intervals", 0, 0, "--batch-size", "100", "--cpu-budget", "2.5", stdout=output)
+        # the third batch would use about 3 cpu seconds in total
+        self.assertEqual(mock_save_interval_instances_audio.call_count, 2)
+        self.assertIn("CPU time budget exceeded", output.getvalue())
+        self.assertEqual(IntervalInstance.objects.exclude(audio="").count(), 200)
@@ -0,0 +1,35 @@
+from io import StringIO
+
+from django.test import SimpleTestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from exercises.management.commands.startup_report import parse_importtime
+
+
+class ParseImporttimeTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _io\n"
+            "import time:      1467 |     117549 | numpy\n"
+            "some other output\n"
+        )
+        self.assertListEqual(parse_importtime(output), [("_io", 120, 120), ("numpy", 1467, 117549)])
+
+
+class StartupReportCommandTests(SimpleTestCase):
+    def test_audio_stack_not_imported_on_startup(self):
+        output = StringIO()
+        call_command("startup_report", stdout=output)
+        self.assertIn("modules imported in", output.getvalue())
+        self.assertNotIn("Audio stack imported on startup", output.getvalue())
+
+    def test_audio_stack_reported(self):
+        output = StringIO()
+        call_command("startup_report", "--modules", "exercises.audio_saver", stdout=output)
+        self.assertIn("Audio stack imported on startup: numpy, pydub, mingus", output.getvalue())
+
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(CommandError, "more than the budget"):
+            call_command("startup_report", "--budget", "0", stdout=StringIO())
@@ -0,0 +1,162 @@
+import shutil
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from django.test import SimpleTestCase, override_settings
+from django.conf import settings
+
+from exercises.synthesizers import (
+    FluidsynthSynthesizer,
+    LibfluidsynthSynthesizer,
+    NoteCacheSynthesizer,
+    _forget_libfluidsynth_synths,
+    _libfluidsynth_synthesizers,
+    get_batch_note_events,
+    get_interval_note_events,
+    slice_segments,
+)
+
+
+class GetIntervalNoteEventsTests(SimpleTestCase):
+    def test_harmonic_interval_notes_start_together(self):
+        self.assertListEqual(get_interval_note_events(4*12, "5", 0), [(4*12, 0), (4*12 + 7, 0)])
+
+    def test_melodic_ascending_interval_starts_with_lower_note(self):
+        self.assertListEqual(get_interval_note_events(4*12, "5", 1), [(4*12, 0), (4*12 + 7, 1)])
+
+    def test_melodic_descending_interval_starts_with_higher_note(self):
+        self.assertListEqual(get_interval_note_events(4*12, "5", 2), [(4*12 + 7, 0), (4*12, 1)])
+
+    def test_harmonic_unison_is_single_note(self):
+        self.assertListEqual(get_interval_note_events(4*12, "1", 0), [(4*12, 0)])
+
+    def test_melodic_unison_is_repeated_note(self):
+        self.assertListEqual(get_interval_note_events(4*12, "1", 1), [(4*12, 0), (4*12, 1)])
+
+
+class BatchRenderingTests(SimpleTestCase):
+    def test_get_batch_note_events_separates_intervals_with_silence(self):
+        note_events, segments = get_batch_note_events([(40, "5", 0), (40, "3", 2), (50, "1", 0)])
+        self.assertListEqual(note_events, [(40, 0), (47, 0), (44, 3), (40, 4), (50, 7)])
+        self.assertListEqual(segments, [(0, 1), (3, 2), (7, 1)])
+
+    def test_slice_segments(self):
+        samples = np.arange(10 * 2, dtype=np.int16).reshape(-1, 2)
+        first, second = slice_segments(samples, [(0, 1), (3, 3)], sample_rate=4)
+        self.assertListEqual(first.tolist(), [[0, 1], [2, 3]])
+        # missing samples at the end are filled with silence
+        self.assertListEqual(second.tolist(), [[12, 13], [14, 15], [16, 17], [18, 19], [0, 0], [0, 0]])
+
+    @override_settings(FLUIDSYNTH_SAMPLE_RATE=100)
+    def test_fluidsynth_renders_intervals_with_single_run(self):
+        synthesizer = FluidsynthSynthesizer()
+        synthesizer._midi_to_samples = Mock(return_value=np.ones((500, 2), dtype=np.int16))
+        samples = synthesizer.render_intervals([(40, "5", 0), (40, "3", 2)])
+        synthesizer._midi_to_samples.assert_called_once()
+        self.assertListEqual([len(interval_samples) for interval_samples in samples], [50, 100])
+        self.assertEqual(synthesizer.get_render_stats()["num_renders"], 2)
+
+
+@override_settings(
+    AUDIO_NOTE_CACHE_DIR=Path(settings.MEDIA_ROOT) / "test" / "note_cache",
+    FLUIDSYNTH_SAMPLE_RATE=100,
+)
+class NoteCacheSynthesizerTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = Path(settings.AUDIO_NOTE_CACHE_DIR)
+        # every note is rendered as one second of a constant signal equal to its number
+        self.note_renderer = Mock()
+        self.note_renderer.render_note.side_effect = lambda note: np.full((100, 2), note, dtype=np.int16)
+        self.synthesizer = NoteCacheSynthesizer(note_renderer=self.note_renderer)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir.parent, ignore_errors=True)
+
+    def test_harmonic_interval_is_sum_of_notes(self):
+        samples = self.synthesizer.render_interval(40, "5", 0)
+        self.assertEqual(samples.shape, (100, 2))
+        self.assertTrue((samples == 40 + 47).all())
+
+    def test_melodic_interval_notes_are_offset_by_quarter_note(self):
+        samples = self.synthesizer.render_interval(40, "5", 2)
+        self.assertEqual(samples.shape, (150, 2))
+        self.assertTrue((samples[:50] == 47).all())
+        self.assertTrue((samples[50:100] == 40 + 47).all())
+        self.assertTrue((samples[100:] == 40).all())
+
+    def test_each_note_rendered_once(self):
+        self.synthesizer.render_interval(40, "5", 0)
+        self.synthesizer.render_interval(40, "5", 1)
+        self.synthesizer.render_interval(47, "1", 1)
+        self.assertEqual(self.note_renderer.render_note.call_count, 2)
+
+    def test_rendered_notes_are_reused_by_new_synthesizer(self):
+        self.synthesizer.render_interval(40, "5", 0)
+        synthesizer = NoteCacheSynthesizer(note_renderer=self.note_renderer)
+        samples = synthesizer.render_interval(40, "5", 0)
+        self.assertEqual(self.note_renderer.render_note.call_count, 2)
+        self.assertTrue((samples == 40 + 47).all())
+
+    def test_mix_is_clipped(self):
+        self.note_renderer.render_note.side_effect = lambda note: np.full((100, 2), 2**15 - 1, dtype=np.int16)
+        samples = self.synthesizer.render_interval(40, "5", 0)
+        self.assertTrue((samples == 2**15 - 1).all())
+
+
+@override_settings(FLUIDSYNTH_SAMPLE_RATE=100)
+class LibfluidsynthSynthesizerTests(SimpleTestCase):
+    def setUp(self):
+        self.synthesizer = LibfluidsynthSynthesizer()
+        # pretend that the synth has been already created
+        self.synthesizer._library = Mock()
+        self.synthesizer._synth = "synth"
+
+    def test_melodic_interval_note_events(self):
+        samples = self.synthesizer.render_interval(40, "5", 1)
+        # two quarter notes and the release tail
+        self.assertEqual(samples.shape, (200, 2))
+        library = self.synthesizer._library
+        self.assertListEqual(
+            library.fluid_synth_noteon.call_args_list,
+            [(("synth", 0, 52, 64),), (("synth", 0, 59, 64),)]
+        )
+        self.assertListEqual(
+            library.fluid_synth_noteoff.call_args_list,
+            [(("synth", 0, 52),), (("synth", 0, 59),)]
+        )
+        # two quarter notes and the release tail, then the rest of the reverb is flushed
+        self.assertListEqual(
+            [call.args[1] for call in library.fluid_synth_write_s16.call_args_list],
+            [50, 50, 100, 100]
+        )
+        library.fluid_synth_system_reset.assert_called_once_with("synth")
+
+    def test_render_times_are_recorded(self):
+        self.synthesizer.render_interval(40, "5", 0)
+        self.synthesizer.render_interval(40, "3", 0)
+        stats = self.synthesizer.get_render_stats()
+        self.assertEqual(stats["synthesizer"], "libfluidsynth")
+        self.assertEqual(stats["num_renders"], 2)
+        self.assertGreaterEqual(stats["total_render_time"], stats["last_render_time"])
+
+    def test_synth_is_deleted_if_soundfont_cannot_be_loaded(self):
+        synthesizer = LibfluidsynthSynthesizer()
+        library = Mock()
+        library.fluid_synth_sfload.return_value = -1
+        with patch.object(synthesizer, "_load_library", return_value=library):
+            with self.assertRaises(RuntimeError):
+                synthesizer.warm_up()
+        library.delete_fluid_synth.assert_called_once_with(library.new_fluid_synth.return_value)
+        library.delete_fluid_settings.assert_called_once_with(library.new_fluid_settings.return_value)
+        self.assertIsNone(synthesizer._synth)
+
+    def test_synths_are_forgotten_after_fork(self):
+        _forget_libfluidsynth_synths()
+        self.assertIsNone(self.synthesizer._synth)
+
+    def test_fork_handler_does_not_keep_synthesizers_alive(self):
+        num_synthesizers = len(_libfluidsynth_synthesizers)
+        LibfluidsynthSynthesizer()
+        self.assertEqual(len(_libfluidsynth_synthesizers), num_synthesizers)
@@ -0,0 +1,43 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from exercises.task_backends import TASK_PRIORITIES, get_task_backend, run_task, run_task_in_background
+
+
+class TaskBackendsTests(SimpleTestCase):
+    @override_settings(TASK_BACKEND=None, USE_CELERY=True)
+    def test_backend_chosen_by_use_celery_by_default(self):
+        self.assertEqual(get_task_backend(), "celery")
+        with self.settings(USE_CELERY=False):
+            self.assertEqual(get_task_backend(), "sync")
+
+    @override_settings(TASK_BACKEND="unknown")
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_task_backend()
+
+    @override_settings(TASK_BACKEND="celery")
+    def test_celery_backend(self):
+        task = Mock()
+        run_task(task, 1, priority="high")
+        task.apply_async.assert_called_once_with((1,), priority=TASK_PRIORITIES["high"])
+        task.assert_not_called()
+
+    @override_settings(TASK_BACKEND="local")
+    @patch("exercises.task_backends.LocalExecutor")
+    def test_local_backend(self, mock_local_executor):
+        task = Mock()
+        run_task(task, 1, priority="low")
+        mock_local_executor.submit.assert_called_once_with(task, 1, priority=TASK_PRIORITIES["low"])
+        task.assert_not_called()
+
+    @override_settings(TASK_BACKEND="sync")
+    @patch("exercises.task_backends.LocalExecutor")
+    def test_sync_backend(self, mock_local_executor):
+        task = Mock()
+        run_task(task, 1)
+        task.assert_called_once_with(1)
+        # background tasks don't delay the response
+        run_task_in_background(task, 2)
+        mock_local_executor.submit.assert_called_once_with(task, 2, priority=TASK_PRIORITIES["normal"])
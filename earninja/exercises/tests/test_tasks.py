@@ -3,10 +3,10 @@ import shutil
 
 from django.test import TransactionTestCase, override_settings
 from django.conf import settings
-from django.core.files import File
 
+from exercises.audio_file_path_manager import AudioFilePathManager
 from exercises.models import Interval, IntervalInstance
-from exercises.tasks import update_interval_instance_audio
+from exercises.tasks import update_interval_instance_audio, update_interval_instances_audio, update_interval_audio
 
 
 @override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test")
@@ -17,69 +17,80 @@ class UpdateIntervalInstanceAudioTaskTests(TransactionTestCase):
 
         interval_b3 = Interval.objects.create(name="b3", num_semitones=3)
         self.interval_instance = IntervalInstance.objects.create(start_note=4*12, interval=interval_b3)
+        self.relative_file_path = AudioFilePathManager.get_interval_instance_audio_path(self.interval_instance)
+        self.file_path = self.test_media_dir / self.relative_file_path
 
     def tearDown(self):
         shutil.rmtree(self.test_media_dir)
 
     def test_mp3_file_saved(self):
-        saved_file_path = self.test_media_dir / "audio" / f"interval_instance_{self.interval_instance.id}.mp3"
-        self.assertFalse(saved_file_path.is_file())
+        self.assertFalse(self.file_path.is_file())
 
         update_interval_instance_audio(self.interval_instance.id)
 
-        self.assertTrue(saved_file_path.is_file())
-        self.assertGreaterEqual(saved_file_path.stat().st_size, 500)
+        self.assertTrue(self.file_path.is_file())
+        self.assertGreaterEqual(self.file_path.stat().st_size, 500)
 
     def test_mp3_file_associated_with_interval_instance_audio_field(self):
         update_interval_instance_audio(self.interval_instance.id)
 
         interval_instance = IntervalInstance.objects.get(id=self.interval_instance.id)
         self.assertGreaterEqual(interval_instance.audio.file.size, 500)
-        self.assertEqual(interval_instance.audio.name, f"audio/interval_instance_{self.interval_instance.id}.mp3")
+        self.assertEqual(interval_instance.audio.name, str(self.relative_file_path))
 
-    def test_intermediate_files_cleaned_up(self):
+    def test_no_intermediate_files_written(self):
         update_interval_instance_audio(self.interval_instance.id)
 
-        file_path = self.test_media_dir / "audio" / f"intermediate_interval_instance_{self.interval_instance.id}.mid"
-        self.assertFalse(file_path.exists())
+        self.assertListEqual(list(self.file_path.parent.iterdir()), [self.file_path])
 
-        file_path = self.test_media_dir / "audio" / f"intermediate_interval_instance_{self.interval_instance.id}.wav"
-        self.assertFalse(file_path.exists())
+    def test_stale_mp3_file_replaced(self):
+        # e.g. a file rendered with different settings
+        stale_file_path = self.test_media_dir / "audio" / f"interval_instance_{self.interval_instance.id}.mp3"
+        stale_file_path.parent.mkdir(parents=True, exist_ok=True)
+        stale_file_path.write_bytes(b"small file")
+        self.interval_instance.audio.name = f"audio/{stale_file_path.name}"
+        self.interval_instance.save()
 
-        file_path = self.test_media_dir / "audio" / f"intermediate_interval_instance_{self.interval_instance.id}.mp3"
-        self.assertFalse(file_path.exists())
+        update_interval_instance_audio(self.interval_instance.id)
 
-    def test_mp3_file_replaced_if_already_exists_and_associated_with_audio_field(self):
-        intermediate_file_path = self.test_media_dir / "audio" / f"intermediate_interval_instance_{self.interval_instance.id}.mp3"
-        file_path = self.test_media_dir / "audio" / f"interval_instance_{self.interval_instance.id}.mp3"
+        # thanks to django-cleanup app, the stale file is deleted
+        self.assertFalse(stale_file_path.exists())
+        self.assertGreaterEqual(self.file_path.stat().st_size, 500)
+        interval_instance = IntervalInstance.objects.get(id=self.interval_instance.id)
+        self.assertEqual(interval_instance.audio.name, str(self.relative_file_path))
 
-        # create a dummy file
-        intermediate_file_path.parent.mkdir(parents=True, exist_ok=True)
-        intermediate_file_path.write_bytes(b"small file")
+    def test_existing_mp3_file_reused_and_associated_with_audio_field(self):
+        # e.g. the file has been rendered for another database
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.file_path.write_bytes(b"small file")
 
-        # associate dummy file with audio field
-        with intermediate_file_path.open(mode="rb") as f:
-            self.interval_instance.audio = File(f, name=intermediate_file_path.name)
-            self.interval_instance.save()
-        intermediate_file_path.unlink()
+        update_interval_instance_audio(self.interval_instance.id)
 
-        self.assertEqual(len(list(file_path.parent.glob("*.mp3"))), 1)
-        self.assertEqual(file_path.stat().st_size, 10)
+        self.assertEqual(self.file_path.read_bytes(), b"small file")
+        interval_instance = IntervalInstance.objects.get(id=self.interval_instance.id)
+        self.assertEqual(interval_instance.audio.name, str(self.relative_file_path))
 
-        update_interval_instance_audio(self.interval_instance.id)
+    def test_update_interval_instances_audio_saves_all_mp3_files(self):
+        interval_5 = Interval.objects.create(name="5", num_semitones=7, interval_type=1)
+        interval_instance = IntervalInstance.objects.create(start_note=4*12, interval=interval_5)
 
-        self.assertEqual(len(list(file_path.parent.glob("*.mp3"))), 1)
-        self.assertGreaterEqual(file_path.stat().st_size, 500)
-    
-    def test_mp3_file_replaced_if_already_exists_and_not_associated_with_audio_field(self):
-        file_path = self.test_media_dir / "audio" / f"interval_instance_{self.interval_instance.id}.mp3"
+        update_interval_instances_audio([self.interval_instance.id, interval_instance.id])
+
+        for interval_instance in IntervalInstance.objects.all():
+            self.assertEqual(
+                interval_instance.audio.name,
+                str(AudioFilePathManager.get_interval_instance_audio_path(interval_instance)),
+            )
+            self.assertGreaterEqual(interval_instance.audio.file.size, 500)
+            interval_instance.audio.close()
+
+    def test_update_interval_audio_creates_interval_instance(self):
+        interval_5 = Interval.objects.create(name="5", num_semitones=7)
+        file_path = self.test_media_dir / AudioFilePathManager.get_interval_audio_path(4*12, 7, 0)
         file_path.parent.mkdir(parents=True, exist_ok=True)
         file_path.write_bytes(b"small file")
 
-        self.assertEqual(len(list(file_path.parent.glob("*.mp3"))), 1)
-        self.assertEqual(file_path.stat().st_size, 10)
-
-        update_interval_instance_audio(self.interval_instance.id)
+        update_interval_audio(4*12, interval_5.id)
 
-        self.assertEqual(len(list(file_path.parent.glob("*.mp3"))), 1)
-        self.assertGreaterEqual(file_path.stat().st_size, 500)
+        interval_instance = IntervalInstance.objects.get(start_note=4*12, interval=interval_5)
+        self.assertEqual(interval_instance.audio.name, str(file_path.relative_to(self.test_media_dir)))
@@ -0,0 +1,72 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from exercises.models import IntervalsExercise
+from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
+from exercises.tests.utils import IntervalCatalogueTestCase
+
+
+# every request also loads the session and the logged in user
+@override_settings(
+    MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
+    INTERVALS_EXERCISE_DEFAULT_LOWEST_OCTAVE=3,
+    INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
+    INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5", "6", "7"],
+    INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
+)
+class IntervalsViewsQueryCountTests(IntervalCatalogueTestCase):
+    # exercise with its question and score, answers with their intervals
+    num_question_view_queries = 4
+    # exercise, user answer, update of the score,
+    # the session is saved in a transaction after it's changed
+    num_answered_view_post_queries = 8
+    # exercise with its question and score, user answer, answers with their intervals
+    num_answered_view_queries = 5
+
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
+        self.client.login(username='test_user', password='r6S6FrpHzFqf')
+        self._generate_question()
+        self.exercise = IntervalsExercise.objects.get(user=self.test_user)
+
+    @patch.object(IntervalsExerciseUpdater, 'save_audio_files')
+    def _generate_question(self, mock_save_audio_files):
+        return self.client.post(reverse("exercises:intervals_question"))
+
+    def _answer_question(self):
+        return self.client.post(reverse("exercises:intervals_answered"), {"answer_id": self._get_answer_id()})
+
+    def _get_answer_id(self):
+        return self.exercise.question_id
+
+    def test_question_view(self):
+        with self.assertNumQueries(self.num_question_view_queries):
+            self.client.get(reverse("exercises:intervals_question"))
+
+    def test_answered_view_post(self):
+        with self.assertNumQueries(self.num_answered_view_post_queries):
+            self._answer_question()
+
+    def test_answered_view(self):
+        self._answer_question()
+        with self.assertNumQueries(self.num_answered_view_queries):
+            self.client.get(reverse("exercises:intervals_answered"))
+
+
+@override_settings(INTERVALS_EXERCISE_STATELESS_QUESTIONS=True)
+class StatelessIntervalsViewsQueryCountTests(IntervalsViewsQueryCountTests):
+    # question, answers and user answer are built from the exercise row and intervals in memory
+    num_question_view_queries = 3
+    num_answered_view_post_queries = 7
+    num_answered_view_queries = 3
+
+    def _get_answer_id(self):
+        return self.exercise.question_interval_id
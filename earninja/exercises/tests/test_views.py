@@ -1,11 +1,14 @@
 from unittest.mock import patch
 from pathlib import Path
+import shutil
 
 from mingus.containers import Note
 
+from asgiref.sync import async_to_sync
 from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse 
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 
 from exercises.models import (
@@ -13,8 +16,15 @@ from exercises.models import (
     ExerciseScore,
     IntervalsExerciseSettings,
     Interval,
+    IntervalInstance,
 )
 from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
+from exercises.views import iterate_in_thread
+from exercises.tasks import update_interval_instance_renditions
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.audio_render_registry import AudioRenderRegistry
+from exercises.interval_catalogue import IntervalCatalogue
+from exercises.tests.utils import IntervalCatalogueTestCase
 
 
 class ChooseExerciseViewTests(TestCase):
@@ -69,9 +79,11 @@ class ChooseExerciseViewTests(TestCase):
     INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
 )
-class IntervalsQuestionViewTests(TestCase):
+class IntervalsQuestionViewTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         User = get_user_model()
         self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
         self.test_user.save()
@@ -137,6 +149,12 @@ class IntervalsQuestionViewTests(TestCase):
         # _get_random_start_note is patched so the question cannot stay the same by chance
         self.assertNotEqual(question_after_first_post_request, question_after_second_post_request)
 
+    @patch.object(IntervalsExerciseUpdater, 'refill_question_queue')
+    @patch.object(IntervalsExerciseUpdater, 'save_audio_files')
+    def test_post_request_refills_question_queue(self, mock_save_audio_files, mock_refill_question_queue):
+        self.client.post(reverse("exercises:intervals_question"))
+        mock_refill_question_queue.assert_called_once()
+
 
 @override_settings(
     MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
@@ -144,9 +162,11 @@ class IntervalsQuestionViewTests(TestCase):
     INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
 )
-class IntervalsAnsweredViewTests(TestCase):
+class IntervalsAnsweredViewTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         User = get_user_model()
         self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
         self.test_user.save()
@@ -203,6 +223,16 @@ class IntervalsAnsweredViewTests(TestCase):
         exercise_settings = IntervalsExerciseSettings.objects.get(exercise__user=self.test_user)
         self.assertContains(response, reverse("exercises:intervals_settings", kwargs={"pk": exercise_settings.id}))
     
+    def test_template_content_answers_without_audio_are_marked_as_pending(self):
+        exercise = IntervalsExercise.objects.get(user=self.test_user)
+        for answer in exercise.answers.exclude(id=exercise.question.id):
+            answer.audio.name = str(AudioFilePathManager.get_interval_instance_audio_path(answer))
+            answer.save()
+        response = self.client.get(reverse("exercises:intervals_answered"))
+        # only the question has no audio file, it's played when the render finishes
+        self.assertContains(response, "data-audio-ready-url", count=1)
+        self.assertContains(response, f"data-audio-ready-url={exercise.question.get_audio_ready_url()}")
+
     def test_template_content_correct_answer(self):
         self._set_correct_answer_in_session()
         response = self.client.get(reverse("exercises:intervals_answered"))
@@ -243,6 +273,65 @@ class IntervalsAnsweredViewTests(TestCase):
         exercise = IntervalsExercise.objects.get(user=self.test_user)
         self.assertEqual(exercise.score.num_all_answers, 1)
 
+    def test_post_request_counts_each_question_once(self):
+        question_number = IntervalsExercise.objects.get(user=self.test_user).question_number
+        for _ in range(2):
+            self.client.post(reverse("exercises:intervals_answered"), {"answer_id": 1, "question_number": question_number})
+        # answer given in a stale tab to a previous question
+        self.client.post(reverse("exercises:intervals_answered"), {"answer_id": 1, "question_number": question_number - 1})
+        exercise = IntervalsExercise.objects.get(user=self.test_user)
+        self.assertEqual(exercise.score.num_all_answers, 1)
+
+
+@override_settings(
+    MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
+    INTERVALS_EXERCISE_DEFAULT_LOWEST_OCTAVE=3,
+    INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
+    INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
+    INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_STATELESS_QUESTIONS=True,
+)
+class StatelessIntervalsViewsTests(IntervalCatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
+        self.client.login(username='test_user', password='r6S6FrpHzFqf')
+        self._generate_question()
+
+    @patch.object(IntervalsExerciseUpdater, 'save_audio_files')
+    def _generate_question(self, mock_save_audio_files):
+        return self.client.post(reverse("exercises:intervals_question"))
+
+    def test_question_is_stored_on_exercise(self):
+        exercise = IntervalsExercise.objects.get(user=self.test_user)
+        self.assertIsNone(exercise.question)
+        self.assertIsNotNone(exercise.question_interval)
+        response = self.client.get(reverse("exercises:intervals_question"))
+        for interval_id in exercise.question_answer_interval_ids:
+            self.assertContains(response, f'value="{interval_id}"')
+        question = IntervalsExerciseUpdater(exercise).get_question()
+        self.assertContains(response, question.get_audio_url())
+
+    def test_correct_answer(self):
+        exercise = IntervalsExercise.objects.get(user=self.test_user)
+        response = self.client.post(reverse("exercises:intervals_answered"), {"answer_id": exercise.question_interval_id})
+        self.assertRedirects(response, reverse("exercises:intervals_answered"))
+        response = self.client.get(reverse("exercises:intervals_answered"))
+        self.assertContains(response, "Correct!")
+        self.assertContains(response, "Score: 1/1 (100.00%)")
+
+    def test_wrong_answer(self):
+        exercise = IntervalsExercise.objects.get(user=self.test_user)
+        wrong_answer_id = next(
+            interval_id for interval_id in exercise.question_answer_interval_ids
+            if interval_id != exercise.question_interval_id
+        )
+        self.client.post(reverse("exercises:intervals_answered"), {"answer_id": wrong_answer_id})
+        response = self.client.get(reverse("exercises:intervals_answered"))
+        self.assertContains(response, "Wrong")
+        self.assertContains(response, "Score: 0/1 (0.00%)")
+
 
 @override_settings(
     MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test",
@@ -250,9 +339,11 @@ class IntervalsAnsweredViewTests(TestCase):
     INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
 )
-class IntervalsSettingsViewTests(TestCase):
+class IntervalsSettingsViewTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         User = get_user_model()
         self.test_user_1 = User.objects.create_user(username='test_user_1', password='r6S6FrpHzFqf')
         self.test_user_2 = User.objects.create_user(username='test_user_2', password='KrxwAS3WEMGS')
@@ -340,9 +431,11 @@ class IntervalsSettingsViewTests(TestCase):
     INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
 )
-class IntervalsResetScoreViewTests(TestCase):
+class IntervalsResetScoreViewTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         User = get_user_model()
         self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
         self.test_user.save()
@@ -380,9 +473,11 @@ class IntervalsResetScoreViewTests(TestCase):
     INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE=5,
     INTERVALS_EXERCISE_DEFAULT_ALLOWED_INTERVALS=["1", "b3", "3", "4", "5"],
     INTERVALS_EXERCISE_DEFAULT_INTERVAL_TYPE=0,
+    INTERVALS_EXERCISE_QUESTION_QUEUE_DEPTH=0,
 )
-class IntervalsResetSettingsViewTests(TestCase):
+class IntervalsResetSettingsViewTests(IntervalCatalogueTestCase):
     def setUp(self):
+        super().setUp()
         User = get_user_model()
         self.test_user = User.objects.create_user(username='test_user', password='r6S6FrpHzFqf')
         self.test_user.save()
@@ -416,6 +511,198 @@ class IntervalsResetSettingsViewTests(TestCase):
         self.assertEqual(exercise_settings.highest_octave, settings.INTERVALS_EXERCISE_DEFAULT_HIGHEST_OCTAVE)
 
 
+@override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test", AUDIO_READY_TIMEOUT=0.3, AUDIO_READY_POLL_INTERVAL=0.01)
+class AudioReadyViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.relative_audio_path = AudioFilePathManager.get_interval_audio_path(4*12, 7, 0)
+        self.url = reverse("exercises:audio_ready", kwargs={"start_note": 4*12, "num_semitones": 7, "interval_type": 0})
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_existing_audio_is_ready(self):
+        audio_path = Path(settings.MEDIA_ROOT) / self.relative_audio_path
+        audio_path.parent.mkdir(parents=True)
+        audio_path.write_bytes(b"mp3")
+        response = self.client.get(self.url)
+        self.assertJSONEqual(response.content, {"ready": True})
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_audio_is_ready_when_render_finishes(self):
+        AudioRenderRegistry.notify_ready(self.relative_audio_path)
+        response = self.client.get(self.url)
+        self.assertJSONEqual(response.content, {"ready": True})
+
+    def test_start_note_of_lowest_octave(self):
+        url = reverse("exercises:audio_ready", kwargs={"start_note": -7, "num_semitones": 7, "interval_type": 0})
+        self.assertEqual(url, "/audio-ready/-7/7/0/")
+        self.assertJSONEqual(self.client.get(url).content, {"ready": False})
+
+    def test_audio_is_not_ready_after_timeout(self):
+        response = self.client.get(self.url)
+        self.assertJSONEqual(response.content, {"ready": False})
+
+
+@override_settings(MEDIA_ROOT=Path(settings.MEDIA_ROOT) / "test", AUDIO_READY_TIMEOUT=0.1, AUDIO_READY_POLL_INTERVAL=0.01)
+class IntervalAudioViewTests(IntervalCatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.audio_path = Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_interval_audio_path(4*12, 7, 0)
+        self.url = self._get_url(AudioFilePathManager.get_render_config_hash(), 4*12, 7, 0)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def _get_url(self, render_config_hash, start_note, num_semitones, interval_type):
+        return reverse("exercises:interval_audio", kwargs={
+            "render_config_hash": render_config_hash,
+            "start_note": start_note,
+            "num_semitones": num_semitones,
+            "interval_type": interval_type,
+        })
+
+    def _save_audio(self, *args):
+        self.audio_path.parent.mkdir(parents=True, exist_ok=True)
+        self.audio_path.write_bytes(b"mp3")
+
+    @patch('exercises.views.update_interval_audio')
+    def test_existing_audio_is_served(self, mock_update_interval_audio):
+        self._save_audio()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        mock_update_interval_audio.assert_not_called()
+
+    @patch('exercises.views.update_interval_audio')
+    def test_missing_audio_is_rendered_and_served(self, mock_update_interval_audio):
+        mock_update_interval_audio.side_effect = self._save_audio
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        interval = Interval.objects.get(num_semitones=7, interval_type=0)
+        mock_update_interval_audio.assert_called_once_with(4*12, interval.id)
+
+    @patch('exercises.views.update_interval_audio')
+    def test_audio_of_lowest_octave_is_rendered(self, mock_update_interval_audio):
+        # start notes of the lowest octave (-1) are negative
+        self.audio_path = Path(settings.MEDIA_ROOT) / AudioFilePathManager.get_interval_audio_path(-7, 7, 0)
+        mock_update_interval_audio.side_effect = self._save_audio
+        response = self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), -7, 7, 0))
+        self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        interval = Interval.objects.get(num_semitones=7, interval_type=0)
+        mock_update_interval_audio.assert_called_once_with(-7, interval.id)
+
+    @patch('exercises.views.update_interval_audio')
+    def test_unavailable_if_render_by_another_request_does_not_finish(self, mock_update_interval_audio):
+        # the render lock is held by another request, so nothing is rendered
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+
+    @patch('exercises.views.update_interval_audio')
+    def test_invalid_urls(self, mock_update_interval_audio):
+        self._save_audio()
+        # rendered with different settings
+        self.assertEqual(self.client.get(self._get_url("0123456789", 4*12, 7, 0)).status_code, 404)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), 4*12, 13, 0)).status_code, 404)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), 4*12, 7, 3)).status_code, 404)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), 125, 7, 0)).status_code, 404)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), -13, 7, 0)).status_code, 404)
+        mock_update_interval_audio.assert_not_called()
+
+    @patch('exercises.views.update_interval_audio')
+    def test_start_notes_of_valid_midi_pitches(self, mock_update_interval_audio):
+        # the highest note of the interval is midi pitch 127 (mingus note 115)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), 108, 7, 0)).status_code, 503)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), 109, 7, 0)).status_code, 404)
+        # the lowest note of the interval is midi pitch 0 (mingus note -12)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), -12, 7, 0)).status_code, 503)
+        self.assertEqual(self.client.get(self._get_url(AudioFilePathManager.get_render_config_hash(), -13, 7, 0)).status_code, 404)
+        self.assertListEqual(
+            [call.args[0] for call in mock_update_interval_audio.call_args_list],
+            [108, -12],
+        )
+
+    @override_settings(AUDIO_STREAM_RENDERS=True)
+    @patch('exercises.views.update_interval_audio')
+    def test_missing_audio_is_streamed_while_rendered(self, mock_update_interval_audio):
+        with patch('exercises.audio_saver.AudioSaver.stream_interval_instance_audio', return_value=iter([b"mp", b"3"])):
+            response = self.client.get(self.url)
+            self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        mock_update_interval_audio.assert_not_called()
+        interval_instance = IntervalInstance.objects.get(start_note=4*12, interval__num_semitones=7)
+        self.assertEqual(interval_instance.audio.name, str(AudioFilePathManager.get_interval_instance_audio_path(interval_instance)))
+        # the render lock is released when streaming ends
+        self.assertTrue(AudioRenderRegistry.acquire_render_lock(interval_instance.id))
+
+    @override_settings(AUDIO_STREAM_RENDERS=True, AUDIO_EXTRA_RENDITIONS=["opus"])
+    @patch('exercises.streaming_audio_renderer.run_task_in_background')
+    @patch('exercises.views.update_interval_audio')
+    def test_extra_renditions_of_streamed_audio_are_saved_in_background(self, mock_update_interval_audio, mock_run_task_in_background):
+        url = self._get_url(AudioFilePathManager.get_render_config_hash(), 4*12, 7, 0)
+        with patch('exercises.audio_saver.AudioSaver.stream_interval_instance_audio', return_value=iter([b"mp3"])):
+            response = self.client.get(url)
+            self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        interval_instance = IntervalInstance.objects.get(start_note=4*12, interval__num_semitones=7)
+        mock_run_task_in_background.assert_called_once_with(
+            update_interval_instance_renditions, interval_instance.id, priority="low",
+        )
+
+    @override_settings(AUDIO_STREAM_RENDERS=True)
+    @patch('exercises.views.update_interval_audio')
+    def test_render_lock_released_if_response_is_closed_before_streaming(self, mock_update_interval_audio):
+        with patch('exercises.audio_saver.AudioSaver.stream_interval_instance_audio') as mock_stream:
+            response = self.client.get(self.url)
+            response.close()
+        mock_stream.assert_not_called()
+        interval_instance = IntervalInstance.objects.get(start_note=4*12, interval__num_semitones=7)
+        self.assertFalse(interval_instance.audio)
+        self.assertTrue(AudioRenderRegistry.acquire_render_lock(interval_instance.id))
+
+    @override_settings(AUDIO_STREAM_RENDERS=True)
+    @patch('exercises.views.update_interval_audio')
+    def test_audio_streamed_by_another_request_is_awaited(self, mock_update_interval_audio):
+        interval = IntervalCatalogue.get_or_create_intervals(["5"], [0])[0]
+        interval_instance = IntervalInstance.objects.create(start_note=4*12, interval=interval)
+        AudioRenderRegistry.acquire_render_lock(interval_instance.id)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        mock_update_interval_audio.assert_called_once_with(4*12, interval.id)
+
+    def test_url_prefix(self):
+        self.assertTrue(self.url.startswith(AudioFilePathManager.get_render_through_audio_dir_url()))
+
+
+class IterateInThreadTests(SimpleTestCase):
+    def test_chunks_are_iterated_and_iterator_is_closed(self):
+        closed = []
+
+        def get_chunks():
+            try:
+                yield b"mp"
+                yield b"3"
+            finally:
+                closed.append(True)
+
+        async def read_chunks():
+            return [chunk async for chunk in iterate_in_thread(get_chunks())]
+
+        self.assertListEqual(async_to_sync(read_chunks)(), [b"mp", b"3"])
+        self.assertListEqual(closed, [True])
+
+
+class AudioServiceWorkerViewTests(SimpleTestCase):
+    def test_service_worker_served_from_root(self):
+        response = self.client.get("/audio-service-worker.js")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertContains(response, f'"{AudioFilePathManager.get_audio_dir_url()}"')
+        self.assertContains(response, f'"{AudioFilePathManager.get_render_through_audio_dir_url()}"')
+        self.assertContains(response, f"MAX_NUM_CACHED_FILES = {settings.AUDIO_CLIENT_CACHE_MAX_FILES}")
+
+
 class ScaleDegreesQuestionViewTests(SimpleTestCase):
     def test_url_exists_at_correct_location(self):
         response = self.client.get("/scale-degrees/question/")
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.interval_catalogue import IntervalCatalogue
+
+
+def save_dummy_audio(renderer, interval_instances):
+    # side effect for mocks of BatchAudioRenderer.save_interval_instances_audio,
+    # audio fields point to the files which would be rendered, without rendering them,
+    # all of them are reported as rendered
+    for interval_instance in interval_instances:
+        interval_instance.audio.name = str(AudioFilePathManager.get_interval_instance_audio_path(interval_instance))
+        interval_instance.save(update_fields=["audio"])
+    return len(interval_instances)
+
+
+class IntervalCatalogueTestCase(TestCase):
+    # intervals are kept in memory of the process (see IntervalCatalogue),
+    # so intervals loaded during a test are forgotten when its rows are rolled back,
+    # and intervals loaded by other test cases are forgotten before the first test
+    @classmethod
+    def setUpClass(cls):
+        IntervalCatalogue.clear()
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(IntervalCatalogue.clear)
@@ -1,6 +1,8 @@
-from django.urls import path
+from django.urls import path, register_converter
 
-from . import views
+from . import converters, views
+
+register_converter(converters.SignedIntConverter, "signed_int")
 
 app_name = "exercises"
 urlpatterns = [
@@ -10,5 +12,16 @@ urlpatterns = [
     path("intervals/settings/<int:pk>/", views.IntervalsSettingsView.as_view(), name="intervals_settings"),
     path("intervals/reset-score/", views.IntervalsResetScoreView.as_view(), name="intervals_reset_score"),
     path("intervals/reset-settings/", views.IntervalsResetSettingsView.as_view(), name="intervals_reset_settings"),
+    path(
+        "audio-ready/<signed_int:start_note>/<int:num_semitones>/<int:interval_type>/",
+        views.AudioReadyView.as_view(),
+        name="audio_ready",
+    ),
+    path(
+        "audio/<str:render_config_hash>/<signed_int:start_note>/<int:num_semitones>/<int:interval_type>.mp3",
+        views.IntervalAudioView.as_view(),
+        name="interval_audio",
+    ),
+    path("audio-service-worker.js", views.AudioServiceWorkerView.as_view(), name="audio_service_worker"),
     path("scale-degrees/question/", views.ScaleDegreesQuestionView.as_view(), name="scale_degrees_question"),
 ]
\ No newline at end of file
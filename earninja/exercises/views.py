@@ -1,18 +1,52 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.views.generic.edit import UpdateView
 from django.urls import reverse_lazy, reverse
 from django.shortcuts import render, redirect
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.cache import never_cache
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
 from exercises.models import (
+    IntervalInstance,
     IntervalsExercise,
-    IntervalAnswer,
     IntervalsExerciseSettings,
 )
 from exercises.forms import IntervalsExerciseSettingsForm
+from exercises.audio_file_path_manager import AudioFilePathManager
+from exercises.audio_file_server import AudioFileServer
+from exercises.audio_render_registry import AudioRenderRegistry
 from exercises.intervals_exercise_updater import IntervalsExerciseUpdater
+from exercises.interval_catalogue import IntervalCatalogue
+from exercises.music_theory_utils import INTERVAL_NAMES, INTERVAL_TYPES, MIDI_PITCH_OFFSET, NUM_MIDI_NOTES
+from exercises.tasks import update_interval_audio
+
+
+def get_exercise(user):
+    # everything displayed with the question is loaded with the exercise in a single query
+    return IntervalsExercise.objects.select_related(
+        "score",
+        "question__interval",
+    ).filter(user=user).first()
+
+
+async def iterate_in_thread(chunks):
+    # ASGI servers need an async iterator to send chunks as they come,
+    # otherwise django reads the whole blocking iterator before sending anything
+    get_next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await get_next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
 
 
 class ChooseExerciseView(View):
@@ -22,10 +56,13 @@ class ChooseExerciseView(View):
 
 class IntervalsQuestionView(LoginRequiredMixin, View):
     def get(self, request):
-        exercise = IntervalsExercise.objects.filter(user=request.user).first()
+        exercise = get_exercise(request.user)
+        updater = IntervalsExerciseUpdater(exercise) if exercise else None
         context = {
             "exercise": exercise,
-            "answers": exercise.answers.order_by("interval__num_semitones") if exercise else None
+            "question": updater.get_question() if updater else None,
+            "answers": updater.get_answers() if updater else None,
+            "sprite_pack": updater.get_sprite_pack() if updater else None,
         }
         return render(request, 'exercises/intervals_question.html', context=context)
     
@@ -39,30 +76,34 @@ class IntervalsQuestionView(LoginRequiredMixin, View):
             updater.reset_score()
         updater.generate_new_question()
         updater.save_audio_files()
+        updater.refill_question_queue()
         return redirect('exercises:intervals_question')
 
 
 class IntervalsAnsweredView(LoginRequiredMixin, View):
     def get(self, request):
-        exercise = IntervalsExercise.objects.get(user=request.user)
-        user_answer = IntervalAnswer.objects.get(
-            exercise=exercise, 
-            interval_instance_id=request.session["user_answer_id"]
-        )
+        exercise = get_exercise(request.user)
+        updater = IntervalsExerciseUpdater(exercise)
+        question = updater.get_question()
         context = {
             "exercise": exercise,
-            "user_answer": user_answer,
-            "correct_answer": exercise.answers.get(intervalanswer__is_correct=True),
-            "answers": exercise.answers.order_by("interval__num_semitones"),
+            "question": question,
+            "user_answer": updater.get_user_answer(request.session["user_answer_id"]),
+            "correct_answer": question,
+            "answers": updater.get_answers(),
+            "sprite_pack": updater.get_sprite_pack(),
         }
         return render(request, 'exercises/intervals_answered.html', context=context)
 
     @method_decorator(csrf_protect)
     def post(self, request):
         exercise = IntervalsExercise.objects.get(user=request.user)
+        updater = IntervalsExerciseUpdater(exercise)
+        user_answer = updater.get_user_answer(request.POST["answer_id"])
         request.session["user_answer_id"] = request.POST["answer_id"]
-        user_answer = exercise.answers.get(id=request.POST["answer_id"])
-        IntervalsExerciseUpdater(exercise).update_score(user_answer)
+        # number of the question displayed to the user, sent with the answer
+        question_number = request.POST.get("question_number", "")
+        updater.update_score(user_answer.interval_instance, int(question_number) if question_number.isdigit() else None)
         return redirect('exercises:intervals_answered')
 
 
@@ -87,6 +128,7 @@ class IntervalsSettingsView(LoginRequiredMixin, UserPassesTestMixin, UpdateView)
         # generate new question using new settings
         updater.generate_new_question()
         updater.save_audio_files()
+        updater.refill_question_queue()
         return redirect_url
 
 
@@ -101,6 +143,7 @@ class IntervalsResetScoreView(LoginRequiredMixin, View):
         updater.reset_score()
         updater.generate_new_question()
         updater.save_audio_files()
+        updater.refill_question_queue()
         return redirect('exercises:intervals_question')
 
 
@@ -116,9 +159,88 @@ class IntervalsResetSettingsView(LoginRequiredMixin, View):
         updater.set_default_settings()
         updater.generate_new_question()
         updater.save_audio_files()
+        updater.refill_question_queue()
         return redirect('exercises:intervals_settings', pk=exercise.settings.id)
 
 
+class AudioReadyView(View):
+    # requested by the browser instead of retrying the download of audio which is still being rendered,
+    # answered as soon as the audio is saved, so the audio is downloaded only once
+    @method_decorator(never_cache)
+    def get(self, request, start_note, num_semitones, interval_type):
+        relative_audio_path = AudioFilePathManager.get_interval_audio_path(start_note, num_semitones, interval_type)
+        storage = IntervalInstance._meta.get_field("audio").storage
+        is_ready = AudioRenderRegistry.wait_until_ready(relative_audio_path, storage, settings.AUDIO_READY_TIMEOUT)
+        return JsonResponse({"ready": is_ready})
+
+
+class IntervalAudioView(View):
+    # serves audio of an interval, rendered during the first request for it,
+    # so only audio which is actually played is ever rendered
+    # concurrent requests for the same audio wait for a single render
+    def get(self, request, render_config_hash, start_note, num_semitones, interval_type):
+        # urls of audio rendered with different settings are not valid anymore,
+        # both notes of the interval have to be valid midi pitches
+        if (
+            render_config_hash != AudioFilePathManager.get_render_config_hash()
+            or not 0 <= num_semitones < len(INTERVAL_NAMES)
+            or not 0 <= interval_type < len(INTERVAL_TYPES)
+            or not 0 <= start_note + MIDI_PITCH_OFFSET
+            or not start_note + num_semitones + MIDI_PITCH_OFFSET < NUM_MIDI_NOTES
+        ):
+            raise Http404
+        relative_audio_path = AudioFilePathManager.get_interval_audio_path(start_note, num_semitones, interval_type)
+        storage = IntervalInstance._meta.get_field("audio").storage
+        if not storage.exists(relative_audio_path):
+            # interval names are ordered by number of semitones
+            interval = IntervalCatalogue.get_or_create_intervals([INTERVAL_NAMES[num_semitones]], [interval_type])[0]
+            if settings.AUDIO_STREAM_RENDERS:
+                response = self._stream_render(request, start_note, interval)
+                if response is not None:
+                    return response
+            # returns right away if the same audio is being rendered by another request or worker
+            update_interval_audio(start_note, interval.id)
+            if not AudioRenderRegistry.wait_until_ready(relative_audio_path, storage, settings.AUDIO_READY_TIMEOUT):
+                return HttpResponse(status=503)
+        # the url contains render settings, so its content never changes and it's served like other audio files
+        response = AudioFileServer.serve(request, storage.path(relative_audio_path))
+        if response is None:
+            # e.g. removed in the meantime
+            raise Http404
+        return response
+
+    def _stream_render(self, request, start_note, interval):
+        # returns None if the same audio is being rendered by another request or worker
+        interval_instance, _ = IntervalInstance.objects.get_or_create(start_note=start_note, interval=interval)
+        if not AudioRenderRegistry.acquire_render_lock(interval_instance.id):
+            return None
+        # the audio stack is imported only when audio is rendered, see tasks
+        from exercises.streaming_audio_renderer import StreamingAudioRenderer
+        chunks = StreamingAudioRenderer(interval_instance).stream()
+        if isinstance(request, ASGIRequest):
+            chunks = iterate_in_thread(chunks)
+        response = StreamingHttpResponse(chunks, content_type="audio/mpeg")
+        # the lock is released when the response is closed, even if streaming has never started,
+        # closers run in order, so the render is stopped first
+        response._resource_closers.append(lambda: AudioRenderRegistry.release_render_lock(interval_instance.id))
+        patch_cache_control(response, public=True, max_age=settings.AUDIO_CACHE_MAX_AGE, immutable=True)
+        return response
+
+
+class AudioServiceWorkerView(View):
+    # served from the root of the site, so that the service worker controls pages of all exercises
+    def get(self, request):
+        context = {
+            "audio_dir_name": AudioFilePathManager.get_render_config_hash(),
+            "audio_url_prefixes": [
+                AudioFilePathManager.get_audio_dir_url(),
+                AudioFilePathManager.get_render_through_audio_dir_url(),
+            ],
+            "max_num_cached_files": settings.AUDIO_CLIENT_CACHE_MAX_FILES,
+        }
+        return render(request, 'exercises/audio_service_worker.js', context=context, content_type="application/javascript")
+
+
 class ScaleDegreesQuestionView(View):
     def get(self, request):
         return render(request, 'exercises/coming_soon.html', {"exercise_name": "Scale Degrees"})